@@ -0,0 +1,353 @@
+import asyncio
+import time
+from pathlib import Path
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+from urllib.parse import urlsplit
+
+import httpx
+from playwright.async_api import Browser, BrowserContext, Error, Page, async_playwright
+
+from app.ingestion.http_fetch import FetchMetadataStore, HttpFetchResult, create_http_client, fetch_http, record_validators
+from app.ingestion.scroll import (
+    DEFAULT_SCROLL_CONFIG,
+    HEIGHT_SCRIPT,
+    NetworkActivity,
+    ScrollConfig,
+    ScrollTracker,
+    resolve_scroll_config,
+)
+from app.utils import metrics
+from app.utils.paths import url_to_filename
+
+DEFAULT_OUTPUT_DIR = "./app/data"
+
+PageCallback = Callable[[str, str], Awaitable[None]]
+
+
+async def scroll_until_stable_async(page: Page, config: ScrollConfig = DEFAULT_SCROLL_CONFIG) -> ScrollTracker:
+    """
+    Асинхронный аналог scroll_until_stable.
+    """
+    network = NetworkActivity(page)
+    try:
+        tracker = ScrollTracker(config, time.monotonic() * 1000, await page.evaluate(HEIGHT_SCRIPT))
+        while True:
+            await page.keyboard.press("End")
+            await page.wait_for_timeout(config.poll_interval_ms)
+            height = await page.evaluate(HEIGHT_SCRIPT)
+            if tracker.observe(height, network.in_flight, time.monotonic() * 1000):
+                return tracker
+    finally:
+        network.detach()
+
+
+async def get_page_content_with_scroll_async(
+    page: Page,
+    url: str,
+    scroll_config: ScrollConfig = DEFAULT_SCROLL_CONFIG
+) -> Tuple[str, ScrollTracker]:
+    """
+    Асинхронный аналог get_page_content_with_scroll: переходит по URL,
+    адаптивно прокручивает страницу и возвращает HTML-код вместе с итогом прокрутки.
+    """
+    await page.goto(url, timeout=30000, wait_until="domcontentloaded")
+    tracker = await scroll_until_stable_async(page, scroll_config)
+    return await page.content(), tracker
+
+
+class HostRateLimiter:
+    """
+    Ограничивает нагрузку на каждый хост: не больше `per_host_concurrency`
+    одновременных запросов и не чаще одного старта запроса в `min_interval` секунд.
+    """
+
+    def __init__(self, per_host_concurrency: int = 2, min_interval: float = 0.5):
+        self.per_host_concurrency = per_host_concurrency
+        self.min_interval = min_interval
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self._last_start: Dict[str, float] = {}
+
+    def _host(self, url: str) -> str:
+        return urlsplit(url).netloc
+
+    async def acquire(self, url: str) -> None:
+        host = self._host(url)
+        semaphore = self._semaphores.setdefault(host, asyncio.Semaphore(self.per_host_concurrency))
+        await semaphore.acquire()
+        lock = self._locks.setdefault(host, asyncio.Lock())
+        async with lock:
+            wait = self._last_start.get(host, 0.0) + self.min_interval - time.monotonic()
+            if wait > 0:
+                await asyncio.sleep(wait)
+            self._last_start[host] = time.monotonic()
+
+    def release(self, url: str) -> None:
+        self._semaphores[self._host(url)].release()
+
+
+class PagePool:
+    """
+    Пул страниц поверх одного браузера Chromium.
+
+    Браузер запускается один раз на весь обход; каждая страница живет в
+    своем контексте (изолированные cookies) и переиспользуется для
+    следующих URL. Страница, на которой произошла ошибка, пересоздается.
+    """
+
+    def __init__(self, browser: Browser, size: int):
+        self.browser = browser
+        self.size = size
+        self._queue: "asyncio.Queue[Page]" = asyncio.Queue()
+        self._contexts: List[BrowserContext] = []
+
+    async def _new_page(self) -> Page:
+        context = await self.browser.new_context()
+        self._contexts.append(context)
+        return await context.new_page()
+
+    async def start(self) -> None:
+        for _ in range(self.size):
+            self._queue.put_nowait(await self._new_page())
+
+    async def acquire(self) -> Page:
+        return await self._queue.get()
+
+    async def release(self, page: Page, broken: bool = False) -> None:
+        if broken:
+            context = page.context
+            await context.close()
+            self._contexts.remove(context)
+            page = await self._new_page()
+        self._queue.put_nowait(page)
+
+    async def close(self) -> None:
+        for context in self._contexts:
+            await context.close()
+        self._contexts.clear()
+
+
+class LazyBrowserPool:
+    """
+    Запускает Chromium и пул страниц только при первой необходимости:
+    если все страницы отдались обычным HTTP, браузер не стартует вовсе.
+    """
+
+    def __init__(self, size: int):
+        self.size = size
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._browser: Optional[Browser] = None
+        self._pool: Optional[PagePool] = None
+
+    async def get(self) -> PagePool:
+        async with self._lock:
+            if self._pool is None:
+                self._playwright = await async_playwright().start()
+                self._browser = await self._playwright.chromium.launch(headless=True)
+                self._pool = PagePool(self._browser, self.size)
+                await self._pool.start()
+        return self._pool
+
+    async def close(self) -> None:
+        # Повторный close ничего не делает: браузер останавливается один раз.
+        async with self._lock:
+            pool, browser, playwright = self._pool, self._browser, self._playwright
+            self._pool = self._browser = self._playwright = None
+            if pool is not None:
+                await pool.close()
+            if browser is not None:
+                await browser.close()
+            if playwright is not None:
+                await playwright.stop()
+
+
+async def crawl(
+    urls: List[str],
+    concurrency: int = 8,
+    per_host_concurrency: int = 2,
+    min_interval: float = 0.5,
+    on_page: Optional[PageCallback] = None,
+    scroll_config: ScrollConfig = DEFAULT_SCROLL_CONFIG,
+    scroll_overrides: Optional[Dict[str, ScrollConfig]] = None,
+    scroll_rounds: Optional[Dict[str, int]] = None,
+    http_first: bool = True,
+    browser_url_prefixes: Optional[List[str]] = None,
+    metadata_store: Optional[FetchMetadataStore] = None,
+    revalidate: Optional[Callable[[str], bool]] = None,
+    not_modified: Optional[List[str]] = None
+) -> Dict[str, str]:
+    """
+    Параллельно скачивает полный HTML страниц: сначала обычным HTTP,
+    затем, если нужно, одним общим браузером с пулом страниц.
+
+    Args:
+        urls (List[str]): Адреса страниц.
+        concurrency (int, optional): Общий параллелизм и размер пула страниц.
+            Defaults to 8.
+        per_host_concurrency (int, optional): Максимум одновременных запросов
+            к одному хосту. Defaults to 2.
+        min_interval (float, optional): Минимальный интервал между стартами
+            запросов к одному хосту, в секундах. Defaults to 0.5.
+        on_page (PageCallback, optional): Корутина, вызываемая с (url, html)
+            для каждой успешно скачанной (и изменившейся) страницы.
+        scroll_config (ScrollConfig, optional): Параметры адаптивной прокрутки.
+        scroll_overrides (Dict[str, ScrollConfig], optional): Параметры прокрутки
+            для отдельных префиксов URL.
+        scroll_rounds (Dict[str, int], optional): Если передан, заполняется
+            числом раундов прокрутки, которое понадобилось каждой странице.
+        http_first (bool, optional): Пробовать ли сначала обычный HTTP-запрос
+            с условной ревалидацией. Defaults to True.
+        browser_url_prefixes (List[str], optional): Префиксы URL, которые
+            всегда рендерятся в браузере.
+        metadata_store (FetchMetadataStore, optional): Хранилище ETag/Last-Modified.
+            По умолчанию — ./app/cache/fetch_meta.json.
+        revalidate (Callable[[str], bool], optional): Можно ли для URL
+            отправлять условные заголовки (например, только если локальная
+            копия страницы существует). По умолчанию — всегда.
+        not_modified (List[str], optional): Если передан, пополняется адресами
+            страниц, ответивших 304.
+
+    Returns:
+        Dict[str, str]: HTML успешно скачанных измененных страниц по URL.
+            Страницы с ошибками пропускаются (ошибка печатается), как и в
+            get_full_page_html; страницы с ответом 304 в результат не входят.
+            Если передан on_page, страницы передаются только ему и не
+            накапливаются в памяти: результат пуст.
+    """
+    results: Dict[str, str] = {}
+    limiter = HostRateLimiter(per_host_concurrency, min_interval)
+    browser = LazyBrowserPool(size=max(1, min(concurrency, len(urls))))
+    store = metadata_store or FetchMetadataStore()
+    prefixes = tuple(browser_url_prefixes or ())
+    global_limit = asyncio.Semaphore(max(1, concurrency))
+
+    async def render(url: str) -> Optional[str]:
+        pool = await browser.get()
+        page = await pool.acquire()
+        broken = False
+        try:
+            print(f"Перехожу на страницу: {url}")
+            config = resolve_scroll_config(url, scroll_overrides, scroll_config)
+            with metrics.span("fetch.browser"):
+                html, tracker = await get_page_content_with_scroll_async(page, url, config)
+        except Error as e:
+            metrics.inc("fetch_pages", result="browser_error")
+            print(f"Произошла ошибка Playwright на {url}: {e}")
+            broken = True
+            return None
+        finally:
+            await pool.release(page, broken=broken)
+        print(f"{url}: раундов прокрутки {tracker.rounds} ({tracker.stop_reason})")
+        metrics.inc("scroll_rounds", tracker.rounds)
+        if scroll_rounds is not None:
+            scroll_rounds[url] = tracker.rounds
+        return html
+
+    async def fetch(client: Optional[httpx.AsyncClient], url: str) -> None:
+        async with global_limit:
+            await limiter.acquire(url)
+            try:
+                html: Optional[str] = None
+                result: Optional[HttpFetchResult] = None
+                if client is not None:
+                    try:
+                        with metrics.span("fetch.http"):
+                            result = await fetch_http(
+                                client,
+                                url,
+                                store,
+                                revalidate=revalidate(url) if revalidate is not None else True,
+                                force_browser=url.startswith(prefixes) if prefixes else False
+                            )
+                    except Exception as e:
+                        # Ошибка HTTP-пути (TLS, протокол, декодирование) — не повод
+                        # пропускать страницу: ее скачает браузер.
+                        print(f"{url}: ошибка HTTP-запроса ({e!r}), перехожу на браузер")
+                        metrics.inc("fetch_pages", result="http_fallback")
+                        store.clear_validators(url)
+                if result is not None:
+                    if result.not_modified:
+                        print(f"{url}: не изменилась (304), пропускаю")
+                        metrics.inc("fetch_pages", result="not_modified")
+                        if not_modified is not None:
+                            not_modified.append(url)
+                        return
+                    if result.status >= 400:
+                        print(f"{url}: HTTP {result.status}, пропускаю")
+                        metrics.inc("fetch_pages", result="http_error")
+                        return
+                    if not result.needs_browser:
+                        html = result.html
+                        metrics.inc("fetch_pages", result="http")
+                if html is None:
+                    html = await render(url)
+                    if html is not None:
+                        metrics.inc("fetch_pages", result="browser")
+            except Exception as e:
+                print(f"Произошла непредвиденная ошибка на {url}: {e}")
+                metrics.inc("fetch_pages", result="error")
+                store.clear_validators(url)
+                return
+            finally:
+                limiter.release(url)
+        if html is None:
+            # Рендеринг не удался: без валидаторов страница будет скачана заново.
+            store.clear_validators(url)
+            return
+        if on_page is None:
+            results[url] = html
+        else:
+            try:
+                await on_page(url, html)
+            except BaseException:
+                store.clear_validators(url)
+                raise
+        # Валидаторы записываются только для страницы, которая уже обработана
+        # (отрендерена и передана в on_page, например сохранена на диск).
+        if result is not None:
+            record_validators(store, result)
+
+    client = create_http_client(max_connections=max(1, concurrency)) if http_first else None
+    try:
+        await asyncio.gather(*(fetch(client, url) for url in urls))
+    finally:
+        if client is not None:
+            await client.aclose()
+        await browser.close()
+        store.save()
+    return results
+
+
+async def crawl_and_save(
+    urls: List[str],
+    output_dir: str = DEFAULT_OUTPUT_DIR,
+    **crawl_kwargs
+) -> List[Path]:
+    """
+    Скачивает страницы через crawl и сохраняет каждую в отдельный HTML-файл.
+
+    Имя файла — закодированный URL (см. url_to_filename), поэтому исходный
+    адрес страницы можно восстановить по имени файла. Страницы, ответившие
+    304, не перезаписываются: их файлы (и время изменения) остаются прежними,
+    поэтому сплиттер берет их чанки из кэша.
+
+    Returns:
+        List[Path]: Пути сохраненных (измененных) файлов.
+    """
+    output_path = Path(output_dir)
+    output_path.mkdir(parents=True, exist_ok=True)
+    saved: List[Path] = []
+
+    async def save(url: str, html: str) -> None:
+        file_path = output_path / url_to_filename(url)
+        await asyncio.to_thread(file_path.write_text, html, encoding="utf-8")
+        saved.append(file_path)
+        print(f"Полный HTML страницы сохранен в файл {file_path}")
+
+    def has_local_copy(url: str) -> bool:
+        return (output_path / url_to_filename(url)).is_file()
+
+    crawl_kwargs.setdefault("revalidate", has_local_copy)
+    await crawl(urls, on_page=save, **crawl_kwargs)
+    return saved
@@ -1,27 +1,69 @@
 # scrapers.py
+import asyncio
+import re
 import time
+from pathlib import Path
+from typing import Dict, List, Optional
 from playwright.sync_api import sync_playwright, Page, Error
 from bs4 import BeautifulSoup
 from os import getenv
 import os
 from dotenv import load_dotenv
 
+from app.ingestion.crawler import DEFAULT_OUTPUT_DIR, crawl_and_save
+from app.ingestion.scroll import (
+    DEFAULT_SCROLL_CONFIG,
+    HEIGHT_SCRIPT,
+    NetworkActivity,
+    ScrollConfig,
+    ScrollTracker,
+    resolve_scroll_config,
+)
+
 load_dotenv()
 
-def get_page_content_with_scroll(page: Page, url: str) -> str:
+def scroll_until_stable(page: Page, config: ScrollConfig = DEFAULT_SCROLL_CONFIG) -> ScrollTracker:
+    """
+    Прокручивает страницу, пока высота документа и сеть не стабилизируются
+    (или не сработает один из жестких пределов).
+
+    Returns:
+        ScrollTracker: Итог прокрутки: число раундов и причина остановки.
+    """
+    network = NetworkActivity(page)
+    try:
+        tracker = ScrollTracker(config, time.monotonic() * 1000, page.evaluate(HEIGHT_SCRIPT))
+        while True:
+            page.keyboard.press("End")
+            page.wait_for_timeout(config.poll_interval_ms)
+            if tracker.observe(page.evaluate(HEIGHT_SCRIPT), network.in_flight, time.monotonic() * 1000):
+                return tracker
+    finally:
+        network.detach()
+
+
+def get_page_content_with_scroll(
+    page: Page,
+    url: str,
+    scroll_config: Optional[ScrollConfig] = None,
+    scroll_overrides: Optional[Dict[str, ScrollConfig]] = None
+) -> str:
     """
     Переходит по URL на уже существующей странице, прокручивает ее
     и возвращает HTML-код.
+
+    Прокрутка адаптивная: она прекращается, как только высота документа
+    и сетевая активность стабильны в течение окна из ScrollConfig.
+    scroll_overrides позволяет задать свои параметры для префиксов URL.
     """
     print(f"Перехожу на страницу: {url}")
 
     page.goto(url, timeout=30000, wait_until="domcontentloaded")
 
     print("Прокручиваю страницу для подгрузки всего контента...")
-    for _ in range(5):
-        page.keyboard.press("End")
-
-        page.wait_for_timeout(500)
+    config = resolve_scroll_config(url, scroll_overrides, scroll_config or DEFAULT_SCROLL_CONFIG)
+    tracker = scroll_until_stable(page, config)
+    print(f"Прокрутка завершена: раундов {tracker.rounds}, причина: {tracker.stop_reason}")
 
     print("Получаю финальный HTML...")
     return page.content()
@@ -51,15 +93,19 @@ def get_full_page_html(url: str) -> str:
     return html_content
 
 
-def save_to_html():
-    target_url = getenv('PAGES_URLS')
-
-    for url in target_url:
-    
-        full_html = get_full_page_html(url)
+def get_target_urls() -> List[str]:
+    """
+    Читает список адресов из переменной окружения PAGES_URLS
+    (через запятую или пробельные символы).
+    """
+    raw_urls = getenv('PAGES_URLS', '')
+    return [url for url in re.split(r"[,\s]+", raw_urls) if url]
 
-        if full_html:
 
-            with open(f"./app/data/{url}.html", "w", encoding="utf-8") as f:
-                f.write(full_html)
-            print("Полный HTML страницы сохранен в файл ./data/ai_page_content.html")
\ No newline at end of file
+def save_to_html(output_dir: str = DEFAULT_OUTPUT_DIR, **crawl_kwargs) -> List[Path]:
+    """
+    Скачивает все страницы из PAGES_URLS параллельно (один браузер, пул страниц)
+    и сохраняет их в output_dir.
+    """
+    target_urls = get_target_urls()
+    return asyncio.run(crawl_and_save(target_urls, output_dir=output_dir, **crawl_kwargs))
@@ -0,0 +1,188 @@
+import json
+import os
+import threading
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Dict, Optional
+
+import httpx
+from bs4 import BeautifulSoup
+
+DEFAULT_FETCH_METADATA_PATH = "./app/cache/fetch_meta.json"
+MIN_TEXT_CHARS = 200
+APP_ROOT_IDS = ("root", "app", "__next", "__nuxt")
+
+
+@dataclass
+class HttpFetchResult:
+    """
+    Результат HTTP-запроса страницы.
+
+    Attributes:
+        url: Адрес страницы.
+        status: HTTP-статус ответа.
+        html: Тело ответа (пусто для 304 и ошибок).
+        not_modified: Сервер ответил 304 — сохраненная копия актуальна.
+        needs_browser: Страницу нужно отрендерить в браузере.
+        etag: Валидатор ETag ответа (сохраняется, только когда страница записана).
+        last_modified: Валидатор Last-Modified ответа.
+    """
+    url: str
+    status: int
+    html: str = ""
+    not_modified: bool = False
+    needs_browser: bool = False
+    etag: Optional[str] = None
+    last_modified: Optional[str] = None
+
+
+class FetchMetadataStore:
+    """
+    Локальное хранилище валидаторов кэша (ETag, Last-Modified) и признака
+    "страница рендерится JavaScript" для каждого URL. Хранится в JSON-файле.
+    """
+
+    def __init__(self, path: str = DEFAULT_FETCH_METADATA_PATH):
+        self.path = Path(path)
+        self._lock = threading.Lock()
+        self._data: Dict[str, dict] = {}
+        if self.path.is_file():
+            try:
+                self._data = json.loads(self.path.read_text(encoding="utf-8"))
+            except (IOError, ValueError) as e:
+                print(f"Предупреждение: Не удалось прочитать метаданные загрузки '{self.path}': {e}")
+
+    def get(self, url: str) -> dict:
+        with self._lock:
+            return dict(self._data.get(url, {}))
+
+    def update(self, url: str, **fields) -> None:
+        with self._lock:
+            entry = self._data.setdefault(url, {})
+            entry.update({key: value for key, value in fields.items() if value is not None})
+
+    def clear_validators(self, url: str) -> None:
+        """
+        Забывает ETag/Last-Modified страницы: следующий запрос будет безусловным.
+        """
+        with self._lock:
+            entry = self._data.get(url)
+            if entry is not None:
+                entry.pop("etag", None)
+                entry.pop("last_modified", None)
+
+    def save(self) -> None:
+        with self._lock:
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp_path = self.path.with_suffix(".tmp")
+            tmp_path.write_text(json.dumps(self._data, indent=2, ensure_ascii=False), encoding="utf-8")
+            os.replace(tmp_path, self.path)
+
+
+def looks_js_rendered(html: str, min_text_chars: int = MIN_TEXT_CHARS) -> bool:
+    """
+    Эвристически определяет, что содержимое страницы строится JavaScript'ом.
+
+    Признаки: почти нет видимого текста без скриптов; пустой корневой
+    контейнер SPA (#root, #app, #__next, #__nuxt); <noscript> с просьбой
+    включить JavaScript при небольшом объеме текста.
+    """
+    soup = BeautifulSoup(html, "html.parser")
+    noscript_text = " ".join(tag.get_text(" ", strip=True) for tag in soup.find_all("noscript")).lower()
+    has_scripts = soup.find("script") is not None
+    for tag in soup(["script", "style", "noscript", "template"]):
+        tag.decompose()
+    text = soup.get_text(" ", strip=True)
+
+    if len(text) < min_text_chars:
+        return True
+    for root_id in APP_ROOT_IDS:
+        root = soup.find(id=root_id)
+        if root is not None and has_scripts and not root.get_text(strip=True):
+            return True
+    if "javascript" in noscript_text and len(text) < 5 * min_text_chars:
+        return True
+    return False
+
+
+def create_http_client(max_connections: int = 20, timeout: float = 30.0) -> httpx.AsyncClient:
+    """
+    Создает общий асинхронный HTTP-клиент с пулом keep-alive соединений.
+    """
+    return httpx.AsyncClient(
+        follow_redirects=True,
+        timeout=timeout,
+        limits=httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections),
+        headers={"User-Agent": "Mozilla/5.0 (compatible; itmo-qa-crawler)"},
+    )
+
+
+async def fetch_http(
+    client: httpx.AsyncClient,
+    url: str,
+    store: FetchMetadataStore,
+    revalidate: bool = True,
+    force_browser: bool = False
+) -> HttpFetchResult:
+    """
+    Скачивает страницу обычным HTTP-запросом с условной ревалидацией.
+
+    Если для URL сохранены ETag/Last-Modified и revalidate=True, запрос
+    отправляется с If-None-Match/If-Modified-Since, и ответ 304 означает,
+    что страницу не нужно ни сохранять, ни заново разбивать. Страницы,
+    похожие на JS-рендеринг (или помеченные force_browser), возвращаются
+    с needs_browser=True; признак запоминается для следующих запусков.
+
+    Валидаторы ответа не записываются в store здесь, а возвращаются в
+    результате: вызывающий сохраняет их (record_validators) только после
+    того, как страница отрендерена и записана. Иначе сбой рендеринга или
+    записи оставил бы ETag, и страница навсегда отвечала бы 304.
+
+    Args:
+        client (httpx.AsyncClient): Общий HTTP-клиент.
+        url (str): Адрес страницы.
+        store (FetchMetadataStore): Хранилище валидаторов и признаков страниц.
+        revalidate (bool, optional): Отправлять ли условные заголовки. Стоит
+            выключать, если локальная копия страницы потеряна. Defaults to True.
+        force_browser (bool, optional): Всегда рендерить страницу в браузере
+            (условная ревалидация при этом все равно выполняется). Defaults to False.
+
+    Returns:
+        HttpFetchResult: Результат запроса.
+    """
+    meta = store.get(url)
+    headers = {}
+    if revalidate:
+        if meta.get("etag"):
+            headers["If-None-Match"] = meta["etag"]
+        if meta.get("last_modified"):
+            headers["If-Modified-Since"] = meta["last_modified"]
+
+    response = await client.get(url, headers=headers)
+    if response.status_code == 304:
+        return HttpFetchResult(url=url, status=304, not_modified=True)
+    if response.status_code >= 400:
+        return HttpFetchResult(url=url, status=response.status_code)
+
+    html = response.text
+    # Признак JS-рендеринга "липкий": раз определив его, не пересчитываем эвристику.
+    js_rendered = meta.get("needs_js", False) or looks_js_rendered(html)
+    needs_browser = force_browser or js_rendered
+    store.update(url, needs_js=js_rendered)
+    return HttpFetchResult(
+        url=url,
+        status=response.status_code,
+        html=html,
+        needs_browser=needs_browser,
+        etag=response.headers.get("ETag"),
+        last_modified=response.headers.get("Last-Modified"),
+    )
+
+
+def record_validators(store: FetchMetadataStore, result: HttpFetchResult) -> None:
+    """
+    Запоминает валидаторы успешно обработанной страницы. Если сервер их не
+    прислал, старые стираются, чтобы не ревалидировать по чужому ответу.
+    """
+    store.clear_validators(result.url)
+    store.update(result.url, etag=result.etag, last_modified=result.last_modified)
@@ -0,0 +1,110 @@
+from dataclasses import dataclass
+from typing import Dict, Optional
+
+HEIGHT_SCRIPT = "document.documentElement.scrollHeight"
+
+
+@dataclass(frozen=True)
+class ScrollConfig:
+    """
+    Параметры адаптивной прокрутки страницы.
+
+    Attributes:
+        poll_interval_ms: Пауза между нажатиями End и замерами высоты.
+        stable_window_ms: Сколько высота документа и сеть должны быть
+            неизменны, чтобы прекратить прокрутку.
+        min_rounds: Минимальное число нажатий End (скрипты часто реагируют
+            не на первое событие scroll).
+        max_rounds: Жесткий предел числа нажатий.
+        max_duration_ms: Жесткий предел общего времени прокрутки.
+    """
+    poll_interval_ms: int = 100
+    stable_window_ms: int = 500
+    min_rounds: int = 3
+    max_rounds: int = 30
+    max_duration_ms: int = 15000
+
+
+DEFAULT_SCROLL_CONFIG = ScrollConfig()
+
+
+def resolve_scroll_config(
+    url: str,
+    overrides: Optional[Dict[str, ScrollConfig]] = None,
+    default: ScrollConfig = DEFAULT_SCROLL_CONFIG
+) -> ScrollConfig:
+    """
+    Выбирает параметры прокрутки для URL: самое длинное совпавшее
+    префиксное правило из overrides или параметры по умолчанию.
+    """
+    if not overrides:
+        return default
+    matches = [prefix for prefix in overrides if url.startswith(prefix)]
+    if not matches:
+        return default
+    return overrides[max(matches, key=len)]
+
+
+class ScrollTracker:
+    """
+    Решает, когда прекращать прокрутку.
+
+    После каждого раунда получает высоту документа и число незавершенных
+    сетевых запросов. Прокрутка прекращается, когда и то и другое стабильно
+    в течение stable_window_ms (и сделано не меньше min_rounds раундов),
+    либо при достижении max_rounds / max_duration_ms.
+    """
+
+    def __init__(self, config: ScrollConfig, start_ms: float, initial_height: int):
+        self.config = config
+        self.start_ms = start_ms
+        self.rounds = 0
+        self.stop_reason = ""
+        self._last_height = initial_height
+        self._stable_since_ms = start_ms
+
+    def observe(self, height: int, in_flight: int, now_ms: float) -> bool:
+        """
+        Учитывает результат очередного раунда и возвращает True, если пора остановиться.
+        """
+        self.rounds += 1
+        if height != self._last_height or in_flight > 0:
+            self._last_height = height
+            self._stable_since_ms = now_ms
+        elif (self.rounds >= self.config.min_rounds
+              and now_ms - self._stable_since_ms >= self.config.stable_window_ms):
+            self.stop_reason = "stable"
+            return True
+
+        if self.rounds >= self.config.max_rounds:
+            self.stop_reason = "max_rounds"
+            return True
+        if now_ms - self.start_ms >= self.config.max_duration_ms:
+            self.stop_reason = "max_duration"
+            return True
+        return False
+
+
+class NetworkActivity:
+    """
+    Считает незавершенные сетевые запросы страницы Playwright
+    (работает и с sync, и с async API: обработчики синхронные).
+    """
+
+    def __init__(self, page):
+        self.page = page
+        self.in_flight = 0
+        page.on("request", self._on_request)
+        page.on("requestfinished", self._on_done)
+        page.on("requestfailed", self._on_done)
+
+    def _on_request(self, _request) -> None:
+        self.in_flight += 1
+
+    def _on_done(self, _request) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+
+    def detach(self) -> None:
+        self.page.remove_listener("request", self._on_request)
+        self.page.remove_listener("requestfinished", self._on_done)
+        self.page.remove_listener("requestfailed", self._on_done)
@@ -0,0 +1,313 @@
+import argparse
+import asyncio
+import time
+from dataclasses import dataclass
+from pathlib import Path
+from typing import List, Optional
+
+from aiohttp import web
+from langchain.chains import RetrievalQA
+from langchain_community.vectorstores import FAISS
+
+from app.llm.answer_cache import AnswerCache
+from app.llm.qa_rag import aget_qa_answer, aget_qa_answers_batch
+from app.llm.rag_chain import build_retriever, create_qa_chain
+from app.processing.embedding_cache import get_embedding_model
+from app.processing.index_store import (
+    DEFAULT_INDEX_DIR,
+    find_index_version,
+    find_latest_index,
+    get_index_version,
+    load_or_build_bm25,
+    load_vector_store,
+)
+from app.utils import metrics
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8080
+MAX_BATCH_SIZE = 64
+WARMUP_QUERY = "Какие программы магистратуры есть в ИТМО?"
+
+
+@dataclass(frozen=True)
+class LoadedIndex:
+    """
+    Версия индекса вместе с собранной над ней цепочкой. Запросы берут
+    ссылку на текущий LoadedIndex один раз, поэтому замена индекса не
+    затрагивает уже начатые запросы.
+    """
+    path: Path
+    version: Optional[str]
+    vector_store: FAISS
+    chain: RetrievalQA
+    loaded_at: float
+
+
+class QAService:
+    """
+    Состояние сервиса: модель эмбеддингов, текущий индекс и кэш ответов.
+
+    Модель загружается один раз при старте. Новая версия индекса
+    открывается и прогревается в отдельном потоке, пока старая продолжает
+    обслуживать запросы, а затем подменяется одной операцией присваивания.
+
+    Args:
+        embedding_model_name (str): Модель эмбеддингов, которой построен индекс.
+        index_dir (str, optional): Корневая директория хранилища индексов.
+        llm_model_name (str, optional): Модель LLM.
+        hybrid (bool, optional): Использовать гибридный поиск FAISS + BM25.
+        max_context_tokens (int, optional): Бюджет контекста; None — без бюджета.
+        batch_concurrency (int, optional): Максимум одновременных запросов к LLM
+            внутри одного /ask/batch.
+        rerank (bool, optional): Переранжировать кандидатов кросс-энкодером.
+        answer_cache_similarity (float, optional): Порог семантических попаданий
+            кэша ответов (см. AnswerCache); None — только точные совпадения.
+    """
+
+    def __init__(
+        self,
+        embedding_model_name: str,
+        index_dir: str = DEFAULT_INDEX_DIR,
+        llm_model_name: str = "openai/gpt-4o-mini",
+        hybrid: bool = False,
+        max_context_tokens: Optional[int] = None,
+        batch_concurrency: int = 8,
+        rerank: bool = False,
+        answer_cache_similarity: Optional[float] = None
+    ):
+        self.embedding_model_name = embedding_model_name
+        self.index_dir = index_dir
+        self.llm_model_name = llm_model_name
+        self.hybrid = hybrid
+        self.max_context_tokens = max_context_tokens
+        self.batch_concurrency = batch_concurrency
+        self.rerank = rerank
+        self.answer_cache_similarity = answer_cache_similarity
+        self.embed_model = None
+        self.answer_cache: Optional[AnswerCache] = None
+        self.current: Optional[LoadedIndex] = None
+        self._reload_lock = asyncio.Lock()
+
+    @property
+    def ready(self) -> bool:
+        return self.current is not None
+
+    def _load(self, index_path: Path) -> LoadedIndex:
+        # Выполняется в отдельном потоке: чтение индекса и прогрев не блокируют event loop.
+        # Путь версии — символическая ссылка; данные и версия берутся по одному ее значению.
+        index_path = index_path.resolve()
+        vector_store = load_vector_store(index_path, self.embed_model)
+        retriever = build_retriever(
+            vector_store,
+            self.embed_model,
+            bm25=load_or_build_bm25(index_path, vector_store) if self.hybrid else None,
+            max_context_tokens=self.max_context_tokens,
+            rerank=self.rerank,
+            llm_model_name=self.llm_model_name
+        )
+        chain = create_qa_chain(vector_store, llm_model_name=self.llm_model_name, retriever=retriever)
+        # Прогрев: первый поиск подтягивает страницы memory-map индекса и
+        # инициализирует токенизаторы, чтобы первый настоящий запрос не платил за это.
+        retriever.invoke(WARMUP_QUERY)
+        return LoadedIndex(
+            path=Path(index_path),
+            version=get_index_version(index_path),
+            vector_store=vector_store,
+            chain=chain,
+            loaded_at=time.time()
+        )
+
+    async def start(self, index_path: Optional[Path] = None) -> None:
+        """
+        Загружает модель эмбеддингов и первую версию индекса.
+        """
+        self.embed_model = await asyncio.to_thread(get_embedding_model, self.embedding_model_name)
+        self.answer_cache = AnswerCache(self.embed_model, similarity_threshold=self.answer_cache_similarity)
+        await self.reload(index_path)
+
+    async def reload(self, index_path: Optional[Path] = None) -> LoadedIndex:
+        """
+        Открывает версию индекса (по умолчанию — самую свежую) и атомарно
+        переключает на нее сервис. При ошибке продолжает работать старая версия.
+
+        Raises:
+            FileNotFoundError: Если готовых версий индекса нет.
+        """
+        async with self._reload_lock:
+            if index_path is None:
+                index_path = find_latest_index(self.index_dir, self.embedding_model_name)
+                if index_path is None:
+                    raise FileNotFoundError(
+                        f"В '{self.index_dir}' нет готового индекса для модели '{self.embedding_model_name}'."
+                    )
+            print(f"Загрузка индекса {index_path}...")
+            loaded = await asyncio.to_thread(self._load, Path(index_path))
+            self.current = loaded
+            # Ответы, найденные по старому индексу, больше не валидны.
+            self.answer_cache.set_index_version(loaded.version)
+            print(f"Сервис переключен на индекс {loaded.version}")
+            return loaded
+
+
+SERVICE_KEY = web.AppKey("service", QAService)
+
+
+def _get_ready_index(request: web.Request) -> LoadedIndex:
+    current = request.app[SERVICE_KEY].current
+    if current is None:
+        raise web.HTTPServiceUnavailable(text="Индекс еще загружается.")
+    return current
+
+
+async def _read_json(request: web.Request) -> dict:
+    try:
+        payload = await request.json()
+    except ValueError:
+        raise web.HTTPBadRequest(text="Тело запроса должно быть JSON-объектом.")
+    if not isinstance(payload, dict):
+        raise web.HTTPBadRequest(text="Тело запроса должно быть JSON-объектом.")
+    return payload
+
+
+async def handle_health(request: web.Request) -> web.Response:
+    return web.json_response({"status": "ok"})
+
+
+async def handle_ready(request: web.Request) -> web.Response:
+    current = request.app[SERVICE_KEY].current
+    if current is None:
+        return web.json_response({"ready": False}, status=503)
+    return web.json_response({"ready": True, "index_version": current.version, "loaded_at": current.loaded_at})
+
+
+async def handle_ask(request: web.Request) -> web.Response:
+    current = _get_ready_index(request)
+    payload = await _read_json(request)
+    question = payload.get("question")
+    if not isinstance(question, str) or not question.strip():
+        raise web.HTTPBadRequest(text="Поле 'question' должно быть непустой строкой.")
+    metrics.inc("http_requests", endpoint="/ask")
+    answer = await aget_qa_answer(
+        current.chain, question, cache=request.app[SERVICE_KEY].answer_cache, index_version=current.version
+    )
+    return web.json_response({"answer": answer, "index_version": current.version})
+
+
+async def handle_ask_batch(request: web.Request) -> web.Response:
+    current = _get_ready_index(request)
+    service = request.app[SERVICE_KEY]
+    payload = await _read_json(request)
+    questions = payload.get("questions")
+    if (
+        not isinstance(questions, list)
+        or not questions
+        or not all(isinstance(question, str) and question.strip() for question in questions)
+    ):
+        raise web.HTTPBadRequest(text="Поле 'questions' должно быть непустым списком строк.")
+    if len(questions) > MAX_BATCH_SIZE:
+        raise web.HTTPRequestEntityTooLarge(max_size=MAX_BATCH_SIZE, actual_size=len(questions))
+    metrics.inc("http_requests", endpoint="/ask/batch")
+    answers = await aget_qa_answers_batch(
+        current.chain,
+        questions,
+        concurrency=service.batch_concurrency,
+        cache=service.answer_cache,
+        index_version=current.version
+    )
+    return web.json_response({"answers": answers, "index_version": current.version})
+
+
+async def handle_metrics(request: web.Request) -> web.Response:
+    registry = metrics.get_registry()
+    if registry is None:
+        raise web.HTTPNotFound(text="Метрики выключены (QA_METRICS).")
+    return web.Response(text=registry.to_prometheus(), content_type="text/plain", charset="utf-8")
+
+
+async def handle_reload(request: web.Request) -> web.Response:
+    service = request.app[SERVICE_KEY]
+    if service.embed_model is None:
+        raise web.HTTPServiceUnavailable(text="Модель эмбеддингов еще загружается.")
+    payload = await _read_json(request) if request.can_read_body else {}
+    if "index_path" in payload:
+        # Файлы индекса читаются через pickle: путь от клиента не принимается.
+        raise web.HTTPBadRequest(text="Поле 'index_path' не поддерживается, укажите 'index_version'.")
+    version = payload.get("index_version")
+    index_path = None
+    if version is not None:
+        if not isinstance(version, str):
+            raise web.HTTPBadRequest(text="Поле 'index_version' должно быть строкой.")
+        index_path = find_index_version(service.index_dir, service.embedding_model_name, version)
+        if index_path is None:
+            raise web.HTTPNotFound(text=f"Версия индекса '{version}' не найдена в '{service.index_dir}'.")
+    try:
+        loaded = await service.reload(index_path)
+    except FileNotFoundError as e:
+        raise web.HTTPNotFound(text=str(e))
+    return web.json_response({"index_version": loaded.version, "index_path": str(loaded.path)})
+
+
+def create_app(service: QAService, index_path: Optional[Path] = None) -> web.Application:
+    """
+    Создает приложение aiohttp. Сервер начинает принимать соединения сразу,
+    а модель и индекс загружаются в фоне; до их загрузки /ready отвечает 503.
+    """
+    app = web.Application()
+    app[SERVICE_KEY] = service
+
+    def report_startup(task: asyncio.Task) -> None:
+        if not task.cancelled() and task.exception() is not None:
+            print(f"Ошибка запуска сервиса: {task.exception()!r}; /ready будет отвечать 503, "
+                  f"индекс можно загрузить через /admin/reload")
+
+    async def start_service(app: web.Application):
+        task = asyncio.create_task(service.start(index_path))
+        task.add_done_callback(report_startup)
+        yield
+        task.cancel()
+
+    app.cleanup_ctx.append(start_service)
+    app.router.add_get("/health", handle_health)
+    app.router.add_get("/ready", handle_ready)
+    app.router.add_post("/ask", handle_ask)
+    app.router.add_post("/ask/batch", handle_ask_batch)
+    app.router.add_post("/admin/reload", handle_reload)
+    app.router.add_get("/metrics", handle_metrics)
+    return app
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="HTTP-сервис вопросов и ответов по сайту ИТМО.")
+    parser.add_argument("--host", default=DEFAULT_HOST)
+    parser.add_argument("--port", type=int, default=DEFAULT_PORT)
+    parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    parser.add_argument("--index-path", type=Path, help="Конкретная версия индекса (по умолчанию — самая свежая).")
+    parser.add_argument("--llm-model", default="openai/gpt-4o-mini")
+    parser.add_argument("--hybrid", action="store_true", help="Гибридный поиск FAISS + BM25.")
+    parser.add_argument("--rerank", action="store_true", help="Переранжирование кросс-энкодером.")
+    parser.add_argument("--max-context-tokens", type=int, default=None,
+                        help="Бюджет контекста в токенах LLM (например, 2000); по умолчанию не ограничен.")
+    parser.add_argument("--answer-cache-similarity", type=float, default=None,
+                        help="Порог семантических попаданий кэша ответов; включайте только с многоязычной "
+                             "моделью эмбеддингов. По умолчанию — только точные совпадения вопросов.")
+    parser.add_argument("--metrics", action="store_true", help="Собирать метрики для /metrics (см. также QA_METRICS).")
+    args = parser.parse_args(argv)
+
+    if metrics.enable_from_env() is None and args.metrics:
+        metrics.enable()
+
+    service = QAService(
+        args.embedding_model,
+        index_dir=args.index_dir,
+        llm_model_name=args.llm_model,
+        hybrid=args.hybrid,
+        max_context_tokens=args.max_context_tokens,
+        rerank=args.rerank,
+        answer_cache_similarity=args.answer_cache_similarity
+    )
+    web.run_app(create_app(service, args.index_path), host=args.host, port=args.port)
+
+
+if __name__ == "__main__":
+    main()
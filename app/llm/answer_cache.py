@@ -0,0 +1,191 @@
+import threading
+import time
+from collections import OrderedDict
+from typing import Optional
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+
+
+def normalize_question(question: str) -> str:
+    """
+    Нормализует вопрос для точного совпадения: регистр и пробельные символы.
+    """
+    return " ".join(question.lower().split())
+
+
+class AnswerCache:
+    """
+    Семантический кэш ответов перед цепочкой RetrievalQA.
+
+    Сначала ищется точное совпадение нормализованного вопроса, затем (если
+    задан similarity_threshold) — ранее заданный вопрос, чей эмбеддинг
+    близок к эмбеддингу нового. Семантический поиск по умолчанию выключен:
+    англоязычные модели вроде all-MiniLM-L6-v2 плохо различают русские
+    вопросы, и разные вопросы о программах получают близость выше 0.9 —
+    кэш отдал бы ответ на чужой вопрос. Порог стоит включать только с
+    многоязычной моделью, подобрав его на парах русских вопросов. Записи живут
+    ttl_seconds, при переполнении вытесняются по LRU, а при смене версии
+    индекса кэш очищается целиком: ответы, найденные по старому индексу,
+    могут быть неактуальны. Каждая запись помечена версией индекса, по
+    которому найден ответ: get и put принимают версию индекса запроса, и
+    запрос, начатый до смены версии, не попадет в кэш новой и не получит
+    из него ответ.
+
+    Args:
+        embed_model (Embeddings): Модель эмбеддингов запросов (лучше с
+            CachedEmbeddings — тогда повторные вопросы не доходят до модели).
+        similarity_threshold (float, optional): Порог косинусной близости
+            для семантического попадания; None — только точные совпадения.
+            Defaults to None.
+        ttl_seconds (float, optional): Время жизни записи. Defaults to 3600.
+        max_entries (int, optional): Максимальное число записей. Defaults to 1000.
+        index_version (str, optional): Версия индекса, для которой валидны ответы.
+    """
+
+    def __init__(
+        self,
+        embed_model: Embeddings,
+        similarity_threshold: Optional[float] = None,
+        ttl_seconds: float = 3600,
+        max_entries: int = 1000,
+        index_version: Optional[str] = None
+    ):
+        self.embed_model = embed_model
+        self.similarity_threshold = similarity_threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self.index_version = index_version
+        self._entries: "OrderedDict[str, dict]" = OrderedDict()
+        self._matrix: Optional[np.ndarray] = None
+        self._matrix_keys: list = []
+        self._lock = threading.Lock()
+        self.exact_hits = 0
+        self.semantic_hits = 0
+        self.misses = 0
+
+    def _embed(self, question: str) -> np.ndarray:
+        vector = np.asarray(self.embed_model.embed_query(question), dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, now: float) -> None:
+        expired = [key for key, entry in self._entries.items() if now - entry["created"] > self.ttl_seconds]
+        for key in expired:
+            del self._entries[key]
+        if expired:
+            self._matrix = None
+
+    def _semantic_lookup(self, vector: np.ndarray) -> Optional[str]:
+        if not self._entries:
+            return None
+        if self._matrix is None:
+            # Матрица эмбеддингов пересобирается лениво, только после изменений кэша.
+            self._matrix_keys = list(self._entries)
+            self._matrix = np.stack([self._entries[key]["embedding"] for key in self._matrix_keys])
+        scores = self._matrix @ vector
+        best = int(np.argmax(scores))
+        if scores[best] >= self.similarity_threshold:
+            return self._matrix_keys[best]
+        return None
+
+    def set_index_version(self, index_version: Optional[str]) -> None:
+        """
+        Сообщает кэшу текущую версию индекса; при смене версии кэш очищается.
+        """
+        with self._lock:
+            if index_version != self.index_version:
+                self._entries.clear()
+                self._matrix = None
+                self.index_version = index_version
+
+    def _current(self, index_version: Optional[str]) -> bool:
+        # None — версия запроса не указана: считается текущей.
+        return index_version is None or index_version == self.index_version
+
+    def get(self, question: str, index_version: Optional[str] = None) -> Optional[dict]:
+        """
+        Возвращает сохраненный результат ({"result": ..., "source_documents": ...})
+        для этого или семантически близкого вопроса либо None.
+
+        Args:
+            question (str): Вопрос.
+            index_version (str, optional): Версия индекса, по которой отвечает
+                запрос; если она уже не текущая, кэш не используется.
+        """
+        key = normalize_question(question)
+        now = time.monotonic()
+        with self._lock:
+            self._expire(now)
+            if not self._current(index_version):
+                self.misses += 1
+                return None
+            entry = self._entries.get(key)
+            if entry is not None and entry["index_version"] != self.index_version:
+                del self._entries[key]
+                self._matrix = None
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.exact_hits += 1
+                return entry["result"]
+            if not self._entries or self.similarity_threshold is None:
+                self.misses += 1
+                return None
+
+        vector = self._embed(question)
+        with self._lock:
+            match = self._semantic_lookup(vector)
+            if (
+                match is None
+                or match not in self._entries
+                or not self._current(index_version)
+                or self._entries[match]["index_version"] != self.index_version
+            ):
+                self.misses += 1
+                return None
+            self._entries.move_to_end(match)
+            self.semantic_hits += 1
+            return self._entries[match]["result"]
+
+    def put(self, question: str, result: dict, index_version: Optional[str] = None) -> None:
+        """
+        Сохраняет результат цепочки для вопроса.
+
+        Args:
+            question (str): Вопрос.
+            result (dict): Результат цепочки.
+            index_version (str, optional): Версия индекса, по которой найден
+                ответ. Если за время ответа версия сменилась, результат
+                отбрасывается.
+        """
+        key = normalize_question(question)
+        # Без семантического поиска эмбеддинг вопроса не нужен.
+        vector = self._embed(question) if self.similarity_threshold is not None else None
+        with self._lock:
+            if not self._current(index_version):
+                return
+            self._entries[key] = {
+                "result": result,
+                "embedding": vector,
+                "created": time.monotonic(),
+                "index_version": self.index_version,
+            }
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+            self._matrix = None
+
+    def stats(self) -> dict:
+        """
+        Возвращает счетчики попаданий и промахов и долю попаданий.
+        """
+        total = self.exact_hits + self.semantic_hits + self.misses
+        return {
+            "exact_hits": self.exact_hits,
+            "semantic_hits": self.semantic_hits,
+            "misses": self.misses,
+            "hit_rate": (self.exact_hits + self.semantic_hits) / total if total else 0.0,
+            "entries": len(self._entries),
+            "index_version": self.index_version,
+        }
@@ -0,0 +1,219 @@
+from functools import lru_cache
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import tiktoken
+from langchain_community.vectorstores.utils import maximal_marginal_relevance
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import Field, PrivateAttr
+
+from app.llm.vector_retrieval import retrieve_by_vector
+from app.utils import metrics
+
+DEFAULT_MAX_CONTEXT_TOKENS = 2000
+DEFAULT_CONTEXT_FETCH_K = 20
+# Минимальное перекрытие (в символах), при котором стык под-чанков считается общим текстом.
+MIN_OVERLAP_CHARS = 20
+
+
+@lru_cache(maxsize=4)
+def get_llm_encoding(llm_model_name: str) -> "tiktoken.Encoding":
+    """
+    Возвращает токенизатор tiktoken для модели LLM ("openai/gpt-4o-mini" -> "gpt-4o-mini").
+    Для неизвестных моделей используется кодировка o200k_base.
+    """
+    try:
+        return tiktoken.encoding_for_model(llm_model_name.split("/")[-1])
+    except KeyError:
+        return tiktoken.get_encoding("o200k_base")
+
+
+def count_llm_tokens(text: str, llm_model_name: str) -> int:
+    """
+    Считает токены текста токенизатором LLM.
+    """
+    return len(get_llm_encoding(llm_model_name).encode(text))
+
+
+def _section_key(document: Document) -> Tuple:
+    # Страница плюс полный путь заголовков ("Header 1" ... "Header 5") из splitter_func.
+    headers = tuple(sorted(
+        (key, value) for key, value in document.metadata.items() if key.startswith("Header ")
+    ))
+    return document.metadata.get("source"), headers
+
+
+def _join_overlapping(left: str, right: str) -> str:
+    # Соседние под-чанки enforce_token_limit перекрываются; общий текст берется один раз.
+    for size in range(min(len(left), len(right)), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return left + right[size:]
+    return left + "\n" + right
+
+
+def merge_adjacent_chunks(documents: List[Document]) -> List[Document]:
+    """
+    Склеивает соседние чанки одного раздела страницы.
+
+    Чанки с одинаковыми metadata["source"] и путем заголовков, чьи номера
+    частей (metadata["part"]) идут подряд, объединяются в один документ
+    без повторения перекрывающегося текста. Порядок результата — по
+    первому вхождению каждого объединенного фрагмента.
+    """
+    groups: Dict[Tuple, List[Document]] = {}
+    for document in documents:
+        groups.setdefault(_section_key(document), []).append(document)
+
+    merged: List[Document] = []
+    for group in groups.values():
+        if len(group) == 1:
+            merged.append(group[0])
+            continue
+        # Без номера части (старый кэш разбиения) склеивать нечего: сохраняем порядок выдачи.
+        if any("part" not in document.metadata for document in group):
+            merged.extend(group)
+            continue
+        run = None
+        for document in sorted(group, key=lambda d: d.metadata["part"]):
+            if run is not None and document.metadata["part"] == run.metadata["part_end"] + 1:
+                run.page_content = _join_overlapping(run.page_content, document.page_content)
+                run.metadata["part_end"] = document.metadata["part"]
+                continue
+            run = Document(
+                page_content=document.page_content,
+                metadata={**document.metadata, "part_end": document.metadata["part"]}
+            )
+            merged.append(run)
+
+    first_seen: Dict[Tuple, int] = {}
+    for i, document in enumerate(documents):
+        first_seen.setdefault(_section_key(document), i)
+    return sorted(merged, key=lambda d: first_seen[_section_key(d)])
+
+
+class BudgetedRetriever(BaseRetriever):
+    """
+    Сборка контекста для цепочки "stuff" в пределах бюджета токенов.
+
+    Базовый ретривер возвращает с запасом кандидатов, затем:
+    1. MMR (maximal marginal relevance) упорядочивает их так, чтобы
+       почти одинаковые чанки уходили в конец и отсекались бюджетом.
+       Векторы кандидатов берутся из индексов vector_stores
+       (index.reconstruct по id в docstore), а не считаются заново;
+       эмбеддятся только те, которых там нет (например, если индекс
+       IVF не поддерживает reconstruct);
+    2. соседние чанки одного раздела страницы склеиваются;
+    3. документы по порядку добавляются, пока помещаются в
+       max_context_tokens (токены считаются токенизатором LLM).
+    Для каждого запроса печатается размер собранного промпта в токенах.
+
+    Args:
+        base_retriever (BaseRetriever): Ретривер кандидатов (FAISS или гибридный).
+        embeddings (Embeddings): Модель эмбеддингов для MMR.
+        vector_stores (List[FAISS], optional): Хранилища, из которых получены
+            кандидаты (одно или шарды), — источник их готовых векторов.
+        max_context_tokens (int, optional): Бюджет контекста. Defaults to 2000.
+        max_documents (int, optional): Верхняя граница числа документов после MMR.
+        mmr_lambda (float, optional): Баланс релевантности и разнообразия MMR
+            (1 — только релевантность). Defaults to 0.5.
+        llm_model_name (str, optional): Модель LLM, чьим токенизатором меряется бюджет.
+    """
+
+    base_retriever: BaseRetriever
+    embeddings: Embeddings
+    vector_stores: List[FAISS] = Field(default_factory=list)
+    max_context_tokens: int = DEFAULT_MAX_CONTEXT_TOKENS
+    max_documents: Optional[int] = None
+    mmr_lambda: float = 0.5
+    llm_model_name: str = "openai/gpt-4o-mini"
+    _positions: Dict[int, Tuple[int, Dict[str, int]]] = PrivateAttr(default_factory=dict)
+
+    def _docstore_positions(self, vector_store: FAISS) -> Dict[str, int]:
+        # Обратное отображение id docstore -> позиция в индексе; пересчитывается,
+        # если хранилище изменилось (инкрементальное обновление).
+        mapping = vector_store.index_to_docstore_id
+        cached = self._positions.get(id(vector_store))
+        if cached is None or cached[0] != len(mapping):
+            cached = (len(mapping), {doc_id: position for position, doc_id in mapping.items()})
+            self._positions[id(vector_store)] = cached
+        return cached[1]
+
+    def _candidate_vectors(self, documents: List[Document]) -> List[List[float]]:
+        vectors: List[Optional[np.ndarray]] = [None] * len(documents)
+        for vector_store in self.vector_stores:
+            positions = self._docstore_positions(vector_store)
+            for i, document in enumerate(documents):
+                position = positions.get(document.id) if vectors[i] is None and document.id else None
+                if position is None:
+                    continue
+                try:
+                    vectors[i] = vector_store.index.reconstruct(position)
+                except RuntimeError:
+                    break  # Индекс не умеет восстанавливать векторы.
+        missing = [i for i, vector in enumerate(vectors) if vector is None]
+        metrics.inc("mmr_vectors", len(documents) - len(missing), source="index")
+        metrics.inc("mmr_vectors", len(missing), source="embedded")
+        if missing:
+            embedded = self.embeddings.embed_documents([documents[i].page_content for i in missing])
+            for i, vector in zip(missing, embedded):
+                vectors[i] = np.asarray(vector, dtype=np.float32)
+        return [vector.tolist() for vector in vectors]
+
+    def _mmr_order(
+        self, query: str, documents: List[Document], query_vector: Optional[List[float]] = None
+    ) -> List[Document]:
+        if len(documents) < 2:
+            return documents
+        if query_vector is None:
+            query_vector = self.embeddings.embed_query(query)
+        query_vector = np.asarray(query_vector, dtype=np.float32)
+        vectors = self._candidate_vectors(documents)
+        limit = min(self.max_documents or len(documents), len(documents))
+        selected = maximal_marginal_relevance(query_vector, vectors, lambda_mult=self.mmr_lambda, k=limit)
+        return [documents[i] for i in selected]
+
+    def _fit_budget(self, documents: List[Document]) -> Tuple[List[Document], int]:
+        encoding = get_llm_encoding(self.llm_model_name)
+        result: List[Document] = []
+        used = 0
+        for document in documents:
+            tokens = encoding.encode(document.page_content)
+            if used + len(tokens) <= self.max_context_tokens:
+                result.append(document)
+                used += len(tokens)
+            elif not result:
+                # Даже самый релевантный документ не влезает: берем его начало.
+                truncated = encoding.decode(tokens[:self.max_context_tokens])
+                result.append(Document(page_content=truncated, metadata=dict(document.metadata)))
+                used = self.max_context_tokens
+        return result, used
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        candidates = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self._assemble(query, candidates)
+
+    def get_relevant_documents_by_vector(self, query: str, vector: List[float]) -> List[Document]:
+        """
+        Сборка контекста по готовому эмбеддингу вопроса (см. retrieve_by_vector):
+        вектор используется и для поиска кандидатов, и для MMR.
+        """
+        return self._assemble(query, retrieve_by_vector(self.base_retriever, query, vector), vector)
+
+    def _assemble(
+        self, query: str, candidates: List[Document], query_vector: Optional[List[float]] = None
+    ) -> List[Document]:
+        with metrics.span("context.assemble"):
+            ordered = self._mmr_order(query, candidates, query_vector)
+            documents, context_tokens = self._fit_budget(merge_adjacent_chunks(ordered))
+        question_tokens = count_llm_tokens(query, self.llm_model_name)
+        metrics.inc("prompt_context_tokens", context_tokens)
+        print(f"Контекст: {len(candidates)} кандидатов -> {len(documents)} документов, "
+              f"промпт ~{context_tokens + question_tokens} токенов "
+              f"(контекст {context_tokens} из {self.max_context_tokens})")
+        return documents
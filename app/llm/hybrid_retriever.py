@@ -0,0 +1,60 @@
+from typing import Dict, List, Sequence
+
+import numpy as np
+from langchain_community.vectorstores import FAISS
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+
+from app.processing.bm25 import BM25Index
+from app.utils import metrics
+
+
+def reciprocal_rank_fusion(rankings: List[List[str]], rrf_k: int = 60) -> List[str]:
+    """
+    Объединяет несколько ранжированных списков id методом Reciprocal Rank Fusion:
+    оценка документа — сумма 1 / (rrf_k + позиция) по всем спискам.
+    """
+    scores: Dict[str, float] = {}
+    for ranking in rankings:
+        for rank, doc_id in enumerate(ranking, start=1):
+            scores[doc_id] = scores.get(doc_id, 0.0) + 1.0 / (rrf_k + rank)
+    return sorted(scores, key=scores.get, reverse=True)
+
+
+class HybridRetriever(BaseRetriever):
+    """
+    Гибридный ретривер: плотный поиск FAISS плюс лексический BM25.
+
+    Каждый из поисков возвращает fetch_k кандидатов, списки объединяются
+    через Reciprocal Rank Fusion, и в цепочку уходят первые k документов.
+    Лексическая часть находит точные совпадения (коды направлений,
+    фамилии, числа), которые плотные эмбеддинги часто пропускают.
+    """
+
+    vector_store: FAISS
+    bm25: BM25Index
+    k: int = 4
+    fetch_k: int = 20
+    rrf_k: int = 60
+
+    def _dense_ids(self, vector: Sequence[float]) -> List[str]:
+        with metrics.span("retrieve.search"):
+            _, indices = self.vector_store.index.search(np.asarray([vector], dtype=np.float32), self.fetch_k)
+        mapping = self.vector_store.index_to_docstore_id
+        return [mapping[i] for i in indices[0] if i != -1]
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return self.get_relevant_documents_by_vector(query, self.vector_store.embeddings.embed_query(query))
+
+    def get_relevant_documents_by_vector(self, query: str, vector: List[float]) -> List[Document]:
+        """
+        Гибридный поиск по готовому эмбеддингу вопроса (см. retrieve_by_vector).
+        """
+        dense = self._dense_ids(vector)
+        with metrics.span("retrieve.bm25"):
+            lexical = [doc_id for doc_id, _ in self.bm25.search(query, self.fetch_k)]
+        fused = reciprocal_rank_fusion([dense, lexical], self.rrf_k)[:self.k]
+        return [self.vector_store.docstore.search(doc_id) for doc_id in fused]
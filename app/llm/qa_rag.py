@@ -1,6 +1,74 @@
+import asyncio
+import random
+import threading
+import time
+from functools import lru_cache
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, Iterator, List, Optional, TypeVar
+from uuid import UUID
+
+import openai
 from langchain.chains import RetrievalQA
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.prompt_values import PromptValue
+from langchain_core.prompts import format_document
+
+from app.llm.answer_cache import AnswerCache
+from app.llm.vector_retrieval import find_query_embeddings, retrieve_by_vector
+from app.utils import metrics
+
+
+class _MetricsCallbackHandler(BaseCallbackHandler):
+    """
+    Замеряет поиск и генерацию внутри chain.invoke, где они не видны
+    снаружи: длительности идут в метрики "retrieve" и "generate", а
+    использованные LLM токены — в счетчик llm_tokens.
+    """
+
+    def __init__(self):
+        self._started: Dict[UUID, float] = {}
+        self._names: Dict[UUID, str] = {}
+
+    def on_retriever_start(self, serialized: Any, query: str, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+        # Ретриверы бывают вложенными (бюджет контекста поверх FAISS), поэтому метка — имя ретривера.
+        self._names[run_id] = kwargs.get("name") or "retriever"
+
+    def on_retriever_end(self, documents: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        name = self._names.pop(run_id, "retriever")
+        if started is not None:
+            metrics.observe("retrieve", time.perf_counter() - started, retriever=name)
+
+    def on_retriever_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+        self._names.pop(run_id, None)
+
+    def on_chat_model_start(self, serialized: Any, messages: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
+
+    def on_llm_start(self, serialized: Any, prompts: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started[run_id] = time.perf_counter()
 
-def get_qa_answer(chain: RetrievalQA, question: str) -> str:
+    def on_llm_end(self, response: Any, *, run_id: UUID, **kwargs: Any) -> None:
+        started = self._started.pop(run_id, None)
+        if started is not None:
+            metrics.observe("generate", time.perf_counter() - started)
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        metrics.inc("llm_tokens", usage.get("prompt_tokens", 0), kind="prompt")
+        metrics.inc("llm_tokens", usage.get("completion_tokens", 0), kind="completion")
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs: Any) -> None:
+        self._started.pop(run_id, None)
+
+
+def get_qa_answer(
+    chain: RetrievalQA,
+    question: str,
+    cache: Optional[AnswerCache] = None,
+    index_version: Optional[str] = None
+) -> str:
     """
     Принимает на вход созданную цепочку RetrievalQA и вопрос пользователя,
     а возвращает текстовый ответ от LLM.
@@ -8,15 +76,347 @@ def get_qa_answer(chain: RetrievalQA, question: str) -> str:
     Args:
         chain (RetrievalQA): Готовая цепочка для ответов на вопросы.
         question (str): Вопрос от пользователя.
+        cache (AnswerCache, optional): Семантический кэш ответов. Если вопрос
+            (или близкий по смыслу) уже задавался, ответ берется из кэша без
+            поиска и обращения к LLM.
+        index_version (str, optional): Версия индекса цепочки. По умолчанию —
+            текущая версия кэша на момент вызова: если индекс сменится, пока
+            ищется ответ, он не попадет в кэш новой версии.
 
     Returns:
         str: Ответ, сгенерированный LLM.
     """
     print(f"Поиск ответа на вопрос: '{question}'")
+
+    if cache is not None:
+        index_version = index_version or cache.index_version
+        cached = cache.get(question, index_version)
+        metrics.inc("answer_cache_lookups", result="miss" if cached is None else "hit")
+        if cached is not None:
+            print("Ответ найден в кэше")
+            return cached['result']
     
     # В новых версиях LangChain рекомендуется использовать .invoke()
     # Входные данные передаются в виде словаря.
-    result = chain.invoke({"query": question})
+    # Обработчик метрик подключается только при включенных метриках.
+    config = {"callbacks": [_MetricsCallbackHandler()]} if metrics.get_registry() is not None else None
+    with metrics.span("qa.answer"):
+        result = chain.invoke({"query": question}, config=config)
+
+    if cache is not None:
+        cache.put(question, result, index_version)
     
     # Ответ находится в ключе 'result'
     return result['result']
+
+
+T = TypeVar("T")
+
+
+@lru_cache(maxsize=1)
+def _background_loop() -> asyncio.AbstractEventLoop:
+    # Один долгоживущий event loop для синхронных оберток: общий AsyncClient
+    # привязан к циклу событий, и asyncio.run на каждый вызов ломал бы пул соединений.
+    loop = asyncio.new_event_loop()
+    threading.Thread(target=loop.run_forever, name="qa-async-loop", daemon=True).start()
+    return loop
+
+
+def _run_sync(coroutine: Awaitable[T]) -> T:
+    return asyncio.run_coroutine_threadsafe(coroutine, _background_loop()).result()
+
+
+def _is_transient(error: Exception) -> bool:
+    """
+    Временная ли ошибка LLM: лимит запросов, таймаут, обрыв соединения или
+    ошибка сервера (5xx). Ошибки ключа, запроса и валидации повторять бессмысленно.
+    """
+    if isinstance(error, (openai.RateLimitError, openai.APITimeoutError, openai.APIConnectionError)):
+        return True
+    return isinstance(error, openai.APIStatusError) and error.status_code >= 500
+
+
+async def _with_retries(call: Callable[[], Awaitable[T]], max_retries: int, base_delay: float) -> T:
+    """
+    Выполняет корутину с повторами и экспоненциальной задержкой (с джиттером).
+    Повторяются только временные ошибки (см. _is_transient), остальные
+    пробрасываются сразу.
+    """
+    for attempt in range(max_retries + 1):
+        try:
+            return await call()
+        except Exception as e:
+            if attempt == max_retries or not _is_transient(e):
+                raise
+            delay = base_delay * 2 ** attempt * (1 + random.random())
+            print(f"Ошибка обращения к LLM ({e}), повтор через {delay:.1f} с...")
+            await asyncio.sleep(delay)
+
+
+def _embed_queries(embeddings: Embeddings, questions: List[str]) -> List[List[float]]:
+    # Вопросы эмбеддятся как запросы, а не как документы: у асимметричных
+    # моделей (префиксы e5/bge) это разные векторы, и кэш у них тоже свой.
+    embed_queries = getattr(embeddings, "embed_queries", None)
+    if embed_queries is not None:
+        return embed_queries(questions)
+    return [embeddings.embed_query(question) for question in questions]
+
+
+async def _retrieve_batch(chain: RetrievalQA, questions: List[str]) -> List[List[Document]]:
+    """
+    Ищет контекст сразу для всех вопросов.
+
+    Эмбеддинги всех вопросов считаются один раз (как запросы, теми же
+    векторами, что и в get_qa_answer), и векторы передаются
+    по всей цепочке ретриверов (бюджет, переранжирование, гибридный и
+    шардированный поиск, см. retrieve_by_vector), так что ни один этап не
+    эмбеддит вопрос повторно. Если модель эмбеддингов ретривера определить
+    нельзя, используется его собственный пакетный abatch.
+    """
+    retriever = chain.retriever
+    embeddings = find_query_embeddings(retriever)
+    with metrics.span("retrieve", batch=len(questions)):
+        if embeddings is None:
+            return await retriever.abatch(questions)
+
+        with metrics.span("embed.query_batch"):
+            vectors = await asyncio.to_thread(_embed_queries, embeddings, questions)
+        with metrics.span("retrieve.search"):
+            return await asyncio.to_thread(
+                lambda: [retrieve_by_vector(retriever, question, vector) for question, vector in zip(questions, vectors)]
+            )
+
+
+async def _answer_with_context(
+    chain: RetrievalQA,
+    question: str,
+    documents: List[Document],
+    max_retries: int,
+    base_delay: float
+) -> dict:
+    with metrics.span("generate"):
+        output = await _with_retries(
+            lambda: chain.combine_documents_chain.ainvoke({"input_documents": documents, "question": question}),
+            max_retries,
+            base_delay
+        )
+    return {"query": question, "result": output["output_text"], "source_documents": documents}
+
+
+async def aget_qa_answers_batch(
+    chain: RetrievalQA,
+    questions: List[str],
+    concurrency: int = 8,
+    cache: Optional[AnswerCache] = None,
+    max_retries: int = 3,
+    retry_base_delay: float = 0.5,
+    index_version: Optional[str] = None
+) -> List[str]:
+    """
+    Асинхронно отвечает на пачку вопросов.
+
+    Вопросы из кэша отвечаются сразу; для остальных эмбеддинги считаются
+    одним батчем, поиск выполняется пакетно, а запросы к LLM идут
+    параллельно (не больше concurrency одновременно) с повторами при ошибках.
+
+    Args:
+        chain (RetrievalQA): Готовая цепочка для ответов на вопросы.
+        questions (List[str]): Вопросы.
+        concurrency (int, optional): Максимум одновременных запросов к LLM. Defaults to 8.
+        cache (AnswerCache, optional): Семантический кэш ответов.
+        max_retries (int, optional): Число повторов запроса к LLM. Defaults to 3.
+        retry_base_delay (float, optional): Базовая задержка перед повтором, с. Defaults to 0.5.
+        index_version (str, optional): Версия индекса цепочки (см. get_qa_answer).
+
+    Returns:
+        List[str]: Ответы в порядке вопросов.
+    """
+    if cache is not None:
+        index_version = index_version or cache.index_version
+    answers: List[Optional[str]] = [None] * len(questions)
+    pending: List[int] = []
+    for i, question in enumerate(questions):
+        cached = cache.get(question, index_version) if cache is not None else None
+        if cache is not None:
+            metrics.inc("answer_cache_lookups", result="miss" if cached is None else "hit")
+        if cached is not None:
+            answers[i] = cached["result"]
+        else:
+            pending.append(i)
+    if not pending:
+        return answers
+
+    contexts = await _retrieve_batch(chain, [questions[i] for i in pending])
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def answer(i: int, documents: List[Document]) -> None:
+        async with semaphore:
+            result = await _answer_with_context(chain, questions[i], documents, max_retries, retry_base_delay)
+        if cache is not None:
+            cache.put(questions[i], result, index_version)
+        answers[i] = result["result"]
+
+    await asyncio.gather(*(answer(i, documents) for i, documents in zip(pending, contexts)))
+    return answers
+
+
+async def aget_qa_answer(
+    chain: RetrievalQA,
+    question: str,
+    cache: Optional[AnswerCache] = None,
+    max_retries: int = 3,
+    retry_base_delay: float = 0.5,
+    index_version: Optional[str] = None
+) -> str:
+    """
+    Асинхронный аналог get_qa_answer с повторами запроса к LLM.
+    """
+    answers = await aget_qa_answers_batch(
+        chain, [question], concurrency=1, cache=cache,
+        max_retries=max_retries, retry_base_delay=retry_base_delay, index_version=index_version
+    )
+    return answers[0]
+
+
+def get_qa_answers_batch(
+    chain: RetrievalQA,
+    questions: List[str],
+    concurrency: int = 8,
+    cache: Optional[AnswerCache] = None,
+    max_retries: int = 3
+) -> List[str]:
+    """
+    Синхронная обертка над aget_qa_answers_batch (например, для прогона
+    набора вопросов для оценки качества).
+    """
+    return _run_sync(aget_qa_answers_batch(
+        chain, questions, concurrency=concurrency, cache=cache, max_retries=max_retries
+    ))
+
+
+def _build_prompt(chain: RetrievalQA, question: str, documents: List[Document]) -> PromptValue:
+    """
+    Собирает тот же промпт, что и "stuff"-цепочка, чтобы отправить его в LLM напрямую (со стримингом).
+    """
+    stuff_chain = chain.combine_documents_chain
+    context = stuff_chain.document_separator.join(
+        format_document(document, stuff_chain.document_prompt) for document in documents
+    )
+    return stuff_chain.llm_chain.prompt.format_prompt(
+        **{stuff_chain.document_variable_name: context, "question": question}
+    )
+
+
+class _StreamingAnswerBase:
+    def __init__(
+        self,
+        chain: RetrievalQA,
+        question: str,
+        cache: Optional[AnswerCache] = None,
+        index_version: Optional[str] = None
+    ):
+        self.chain = chain
+        self.question = question
+        self.cache = cache
+        self.index_version = index_version or (cache.index_version if cache is not None else None)
+        self.answer: Optional[str] = None
+        self.source_documents: List[Document] = []
+        self.time_to_first_token: Optional[float] = None
+        self._started = 0.0
+        self._parts: List[str] = []
+
+    def _on_token(self, token: str) -> None:
+        if self.time_to_first_token is None:
+            self.time_to_first_token = time.perf_counter() - self._started
+            metrics.observe("generate.first_token", self.time_to_first_token)
+        self._parts.append(token)
+
+    def _finish(self) -> None:
+        metrics.observe("qa.stream", time.perf_counter() - self._started)
+        self.answer = "".join(self._parts)
+        if self.cache is not None:
+            self.cache.put(self.question, {
+                "query": self.question,
+                "result": self.answer,
+                "source_documents": self.source_documents,
+            }, self.index_version)
+
+    def _from_cache(self) -> Optional[str]:
+        cached = self.cache.get(self.question, self.index_version) if self.cache is not None else None
+        if cached is None:
+            return None
+        self.answer = cached["result"]
+        self.source_documents = cached.get("source_documents", [])
+        self.time_to_first_token = time.perf_counter() - self._started
+        return self.answer
+
+
+class StreamingAnswer(_StreamingAnswerBase):
+    """
+    Ответ, который выдается по токенам по мере генерации.
+
+    Итерация возвращает токены; после ее завершения доступны полный
+    ответ (answer), найденные документы (source_documents) и время до
+    первого токена (time_to_first_token, в секундах).
+    """
+
+    def __iter__(self) -> Iterator[str]:
+        self._started = time.perf_counter()
+        cached = self._from_cache()
+        if cached is not None:
+            yield cached
+            return
+        with metrics.span("retrieve"):
+            self.source_documents = self.chain.retriever.invoke(self.question)
+        prompt = _build_prompt(self.chain, self.question, self.source_documents)
+        for chunk in self.chain.combine_documents_chain.llm_chain.llm.stream(prompt):
+            if chunk.content:
+                self._on_token(chunk.content)
+                yield chunk.content
+        self._finish()
+
+
+class AsyncStreamingAnswer(_StreamingAnswerBase):
+    """
+    Асинхронный аналог StreamingAnswer (async for token in answer).
+    """
+
+    async def __aiter__(self) -> AsyncIterator[str]:
+        self._started = time.perf_counter()
+        cached = self._from_cache()
+        if cached is not None:
+            yield cached
+            return
+        with metrics.span("retrieve"):
+            self.source_documents = await self.chain.retriever.ainvoke(self.question)
+        prompt = _build_prompt(self.chain, self.question, self.source_documents)
+        async for chunk in self.chain.combine_documents_chain.llm_chain.llm.astream(prompt):
+            if chunk.content:
+                self._on_token(chunk.content)
+                yield chunk.content
+        self._finish()
+
+
+def stream_qa_answer(chain: RetrievalQA, question: str, cache: Optional[AnswerCache] = None) -> StreamingAnswer:
+    """
+    Потоковый вариант get_qa_answer: токены ответа выдаются по мере генерации.
+
+    Пример:
+        answer = stream_qa_answer(chain, "Сколько стоит обучение?")
+        for token in answer:
+            print(token, end="", flush=True)
+        print(answer.source_documents, answer.time_to_first_token)
+
+    Returns:
+        StreamingAnswer: Итерируемый по токенам ответ.
+    """
+    print(f"Поиск ответа на вопрос: '{question}'")
+    return StreamingAnswer(chain, question, cache)
+
+
+def astream_qa_answer(chain: RetrievalQA, question: str, cache: Optional[AnswerCache] = None) -> AsyncStreamingAnswer:
+    """
+    Асинхронный потоковый вариант get_qa_answer (см. stream_qa_answer).
+    """
+    print(f"Поиск ответа на вопрос: '{question}'")
+    return AsyncStreamingAnswer(chain, question, cache)
@@ -1,12 +1,34 @@
 import os
+from functools import lru_cache
 from dotenv import load_dotenv
-from typing import List
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import httpx
 
-from langchain_community.vectorstores import FAISS
-from langchain_community.embeddings import SentenceTransformerEmbeddings
 from langchain_openai import ChatOpenAI
 from langchain.chains import RetrievalQA
+from langchain_community.vectorstores import FAISS
 from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+
+from app.processing.embedding_cache import DEFAULT_EMBEDDING_CACHE_DIR, CachedEmbeddings, get_embedding_model
+from app.processing.dedup import deduplicate_chunks
+from app.processing.embedding_engine import EmbeddingEngine
+from app.llm.context_budget import DEFAULT_CONTEXT_FETCH_K, BudgetedRetriever
+from app.llm.hybrid_retriever import HybridRetriever
+from app.llm.reranker import DEFAULT_RERANK_MODEL, DEFAULT_RERANK_TOP_N, RerankingRetriever
+from app.llm.sharded_retriever import ShardedRetriever
+from app.processing.bm25 import BM25Index
+from app.processing.incremental_index import get_incremental_index_path, update_incremental_index
+from app.processing.index_store import (
+    DEFAULT_INDEX_DIR,
+    get_index_path,
+    index_fingerprint,
+    load_or_build_bm25,
+    load_or_build_vector_store,
+)
+from app.processing.sharding import load_or_build_shards
 
 load_dotenv()
 
@@ -14,14 +36,32 @@ def create_rag_chain(
     documents: List[Document],
     embedding_model_name: str = 'all-MiniLM-L6-v2',
     llm_model_name: str = "openai/gpt-4o-mini",
-    temperature: float = 0.0
+    temperature: float = 0.0,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    incremental: bool = False,
+    embedding_cache_dir: Optional[str] = DEFAULT_EMBEDDING_CACHE_DIR,
+    embedding_batch_size: int = 64,
+    embedding_workers: int = 1,
+    deduplicate: bool = True,
+    index_type: str = "flat",
+    index_params: Optional[dict] = None,
+    hybrid: bool = False,
+    retrieval_k: int = 4,
+    max_context_tokens: Optional[int] = None,
+    context_fetch_k: int = DEFAULT_CONTEXT_FETCH_K,
+    rerank: bool = False,
+    rerank_top_n: int = DEFAULT_RERANK_TOP_N,
+    mmap_docstore: bool = False,
+    shard_by: Optional[str] = None,
+    shard_prefixes: Sequence[str] = ()
 ) -> RetrievalQA:
     """
     Создает и настраивает цепочку для вопросно-ответной системы с использованием RAG.
 
     Эта функция выполняет следующие шаги:
     1. Инициализирует модель для создания эмбеддингов (векторных представлений) текста.
-    2. Создает векторное хранилище FAISS из предоставленных документов.
+    2. Открывает сохраненный индекс FAISS или, если корпус изменился,
+       создает его из предоставленных документов и сохраняет на диск.
     3. Инициализирует языковую модель (LLM) через OpenRouter.
     4. Собирает все компоненты в единую цепочку RetrievalQA.
 
@@ -33,13 +73,61 @@ def create_rag_chain(
                                       Defaults to "openai/gpt-4o-mini".
         temperature (float, optional): "Температура" модели для контроля креативности ответов.
                                      0.0 для наиболее детерминированных ответов. Defaults to 0.0.
+        index_dir (str, optional): Директория хранилища версий индекса FAISS.
+                                 Defaults to "./app/index".
+        incremental (bool, optional): Обновлять индекс инкрементально, пересчитывая
+                                    эмбеддинги только новых и измененных чанков.
+                                    Defaults to False.
+        embedding_cache_dir (str, optional): Директория дискового кэша эмбеддингов;
+                                           None отключает кэш. Defaults to "./app/cache/embeddings".
+        embedding_batch_size (int, optional): Размер батча при эмбеддинге корпуса.
+                                            Defaults to 64.
+        embedding_workers (int, optional): Число процессов для эмбеддинга корпуса;
+                                         1 — в текущем процессе. Defaults to 1.
+        deduplicate (bool, optional): Удалять точные дубли чанков (меню, футеры) с
+                                    одинаковыми заголовками перед индексацией. Defaults to True.
+        index_type (str, optional): Тип индекса FAISS: "flat", "ivf", "hnsw", "ivfpq", "pq",
+                                  "sqfp16" или "sq8" (векторы float16/int8 вместо float32).
+                                  Инкрементальный режим всегда использует "flat". Defaults to "flat".
+        index_params (dict, optional): Параметры индекса (nlist, hnsw_m, pq_m, nprobe, ef_search).
+        hybrid (bool, optional): Дополнять плотный поиск лексическим BM25 (с объединением
+                               через Reciprocal Rank Fusion). Defaults to False.
+        retrieval_k (int, optional): Сколько документов передавать в LLM, если бюджет
+                                   контекста отключен. Defaults to 4.
+        max_context_tokens (int, optional): Бюджет контекста в токенах LLM: кандидаты
+                                          проходят MMR, склейку соседних чанков и
+                                          отсечение по бюджету (см. BudgetedRetriever).
+                                          None — передавать retrieval_k документов как есть;
+                                          типичный бюджет — 2000. Defaults to None.
+        context_fetch_k (int, optional): Число кандидатов для сборки контекста
+                                       и переранжирования. Defaults to 20.
+        rerank (bool, optional): Переранжировать кандидатов локальным кросс-энкодером
+                               и оставлять только rerank_top_n лучших. Defaults to False.
+        rerank_top_n (int, optional): Сколько документов оставлять после
+                                    переранжирования. Defaults to 4.
+        mmap_docstore (bool, optional): Хранить тексты и метаданные чанков на диске и
+                                      читать их через memory-map по мере обращения, а не
+                                      держать все Document в памяти процесса. Defaults to False.
+        shard_by (str, optional): Разбить индекс на шарды: "host" (по сайту) или "prefix"
+                                (по префиксам URL из shard_prefixes). Шарды хранятся и
+                                пересобираются независимо, поиск идет по ним параллельно.
+                                Несовместимо с incremental и hybrid. None — один индекс.
+                                Поиск идет по всем шардам из списка шардов, как у
+                                `ask --shards`; пул потоков поиска освобождает
+                                close_retriever(chain.retriever).
+        shard_prefixes (Sequence[str], optional): Префиксы URL для shard_by="prefix",
+                                                например адреса из PAGES_URLS.
 
     Returns:
         RetrievalQA: Готовая к использованию цепочка LangChain для ответов на вопросы.
         
     Raises:
-        ValueError: Если ключи API для OpenRouter не найдены в переменных окружения.
+        ValueError: Если ключи API для OpenRouter не найдены в переменных окружения
+                    или шардирование запрошено вместе с incremental или hybrid.
     """
+    if shard_by is not None and (incremental or hybrid):
+        raise ValueError("Шардирование не поддерживает инкрементальный и гибридный режимы.")
+
     # --- Шаг 1: Проверка наличия ключей API ---
     openrouter_api_key = os.getenv('OPENROUTER_API_KEY')
     openrouter_base_url = os.getenv('OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1")
@@ -51,22 +139,211 @@ def create_rag_chain(
     # --- Шаг 2: Создание модели для эмбеддингов ---
     # Эта модель будет работать локально на вашем CPU/GPU
     print("Инициализация модели эмбеддингов...")
-    embed_model = SentenceTransformerEmbeddings(model_name=embedding_model_name)
+    # Векторы одинаковых текстов (футеры, меню, повторные вопросы) берутся из кэша.
+    embed_model = get_embedding_model(embedding_model_name, cache_dir=embedding_cache_dir)
 
     # --- Шаг 3: Создание векторного хранилища ---
-    # Документы преобразуются в векторы и сохраняются в быстрой in-memory базе FAISS
-    # для семантического поиска.
-    print(f"Создание векторного хранилища FAISS из {len(documents)} документов...")
-    vector_store = FAISS.from_documents(documents, embed_model)
+    # Повторяющийся на всех страницах шаблонный текст индексируется один раз.
+    # Шарды дедуплицируются каждый отдельно, чтобы не зависеть друг от друга.
+    if deduplicate and shard_by is None:
+        documents = deduplicate_chunks(documents)
+
+    # Документы преобразуются в векторы только если для этой модели и этого корпуса
+    # еще нет сохраненного индекса; иначе индекс просто открывается с диска.
+    engine = EmbeddingEngine(
+        embed_model,
+        embedding_model_name,
+        batch_size=embedding_batch_size,
+        workers=embedding_workers
+    )
+    shards = None
+    if shard_by is not None:
+        shards = load_or_build_shards(
+            documents,
+            embed_model,
+            embedding_model_name=embedding_model_name,
+            index_dir=index_dir,
+            shard_by=shard_by,
+            prefixes=shard_prefixes,
+            engine=engine,
+            index_type=index_type,
+            index_params=index_params,
+            mmap_docstore=mmap_docstore,
+            deduplicate=deduplicate
+        )
+        vector_store = next(iter(shards.values()))
+    elif incremental:
+        vector_store, _ = update_incremental_index(
+            documents,
+            embed_model,
+            embedding_model_name=embedding_model_name,
+            index_dir=index_dir,
+            engine=engine,
+            mmap_docstore=mmap_docstore
+        )
+    else:
+        vector_store = load_or_build_vector_store(
+            documents,
+            embed_model,
+            embedding_model_name=embedding_model_name,
+            index_dir=index_dir,
+            engine=engine,
+            index_type=index_type,
+            index_params=index_params,
+            mmap_docstore=mmap_docstore
+        )
+    if isinstance(embed_model, CachedEmbeddings):
+        embed_model.save()
+        print(f"Кэш эмбеддингов: {embed_model.stats()}")
+
+    # --- Шаг 4: Ретривер ---
+    bm25 = None
+    if hybrid:
+        if incremental:
+            index_path = get_incremental_index_path(index_dir, embedding_model_name)
+        else:
+            index_path = get_index_path(
+                index_dir,
+                embedding_model_name,
+                index_fingerprint(documents, index_type, index_params)
+            )
+        bm25 = load_or_build_bm25(index_path, vector_store)
+    retriever = build_retriever(
+        vector_store,
+        embed_model,
+        bm25=bm25,
+        retrieval_k=retrieval_k,
+        max_context_tokens=max_context_tokens,
+        context_fetch_k=context_fetch_k,
+        rerank=rerank,
+        rerank_top_n=rerank_top_n,
+        llm_model_name=llm_model_name,
+        shards=shards
+    )
+
+    # --- Шаги 5-6: LLM и цепочка RetrievalQA ---
+    return create_qa_chain(
+        vector_store,
+        llm_model_name=llm_model_name,
+        temperature=temperature,
+        retriever=retriever
+    )
+
+
+def build_retriever(
+    vector_store: FAISS,
+    embed_model: Embeddings,
+    bm25: Optional[BM25Index] = None,
+    retrieval_k: int = 4,
+    max_context_tokens: Optional[int] = None,
+    context_fetch_k: int = DEFAULT_CONTEXT_FETCH_K,
+    rerank: bool = False,
+    rerank_top_n: int = DEFAULT_RERANK_TOP_N,
+    rerank_model_name: str = DEFAULT_RERANK_MODEL,
+    llm_model_name: str = "openai/gpt-4o-mini",
+    shards: Optional[Dict[str, FAISS]] = None
+) -> BaseRetriever:
+    """
+    Собирает ретривер из этапов: поиск кандидатов (FAISS, параллельно по
+    шардам, если переданы shards, или, если передан bm25, гибридный) -> переранжирование кросс-энкодером -> сборка контекста
+    в пределах бюджета токенов. Последние два этапа необязательны.
+
+    Returns:
+        BaseRetriever: Ретривер для цепочки RetrievalQA.
+
+    Raises:
+        ValueError: Если переданы и shards, и bm25: гибридный поиск по шардам не поддерживается.
+    """
+    if shards and bm25 is not None:
+        raise ValueError("Гибридный поиск (BM25) не поддерживается вместе с шардами.")
+    # Если за поиском идут переранжирование или бюджет, кандидатов берется с запасом:
+    # лишнее отсекут следующие этапы.
+    fetch_k = retrieval_k if max_context_tokens is None and not rerank else context_fetch_k
+    if shards:
+        retriever = ShardedRetriever(shards=shards, embeddings=embed_model, k=fetch_k)
+    elif bm25 is not None:
+        retriever = HybridRetriever(vector_store=vector_store, bm25=bm25, k=fetch_k, fetch_k=max(20, fetch_k))
+    else:
+        retriever = vector_store.as_retriever(search_kwargs={"k": fetch_k})
+    if rerank:
+        retriever = RerankingRetriever(base_retriever=retriever, model_name=rerank_model_name, top_n=rerank_top_n)
+    if max_context_tokens is not None:
+        retriever = BudgetedRetriever(
+            base_retriever=retriever,
+            embeddings=embed_model,
+            vector_stores=list(shards.values()) if shards else [vector_store],
+            max_context_tokens=max_context_tokens,
+            llm_model_name=llm_model_name
+        )
+    return retriever
+
+
+def close_retriever(retriever: BaseRetriever) -> None:
+    """
+    Освобождает ресурсы ретривера из build_retriever (пул потоков поиска
+    по шардам), проходя по вложенным ретриверам.
+    """
+    while retriever is not None:
+        if isinstance(retriever, ShardedRetriever):
+            retriever.close()
+        retriever = getattr(retriever, "base_retriever", None)
+
+
+@lru_cache(maxsize=1)
+def get_llm_http_clients(max_connections: int = 32) -> Tuple[httpx.Client, httpx.AsyncClient]:
+    """
+    Возвращает общие для процесса HTTP-клиенты (синхронный и асинхронный)
+    с пулом keep-alive соединений для обращений к LLM.
+    """
+    limits = httpx.Limits(max_connections=max_connections, max_keepalive_connections=max_connections)
+    timeout = httpx.Timeout(60.0, connect=10.0)
+    return httpx.Client(limits=limits, timeout=timeout), httpx.AsyncClient(limits=limits, timeout=timeout)
+
+
+def create_qa_chain(
+    vector_store: FAISS,
+    llm_model_name: str = "openai/gpt-4o-mini",
+    temperature: float = 0.0,
+    retriever: Optional[BaseRetriever] = None
+) -> RetrievalQA:
+    """
+    Собирает цепочку RetrievalQA поверх уже готового векторного хранилища
+    (например, построенного потоковым пайплайном или загруженного с диска).
+
+    Args:
+        vector_store (FAISS): Векторное хранилище для поиска контекста.
+        llm_model_name (str, optional): Название модели LLM, доступной через OpenRouter.
+                                      Defaults to "openai/gpt-4o-mini".
+        temperature (float, optional): "Температура" модели. Defaults to 0.0.
+        retriever (BaseRetriever, optional): Ретривер для поиска контекста.
+                                           По умолчанию — vector_store.as_retriever().
+
+    Returns:
+        RetrievalQA: Готовая к использованию цепочка LangChain для ответов на вопросы.
+
+    Raises:
+        ValueError: Если ключи API для OpenRouter не найдены в переменных окружения.
+    """
+    openrouter_api_key = os.getenv('OPENROUTER_API_KEY')
+    openrouter_base_url = os.getenv('OPENROUTER_BASE_URL', "https://openrouter.ai/api/v1")
+
+    if not openrouter_api_key:
+        raise ValueError("Переменная окружения OPENROUTER_API_KEY не установлена. "
+                         "Пожалуйста, добавьте ее в ваш .env файл.")
 
     # --- Шаг 4: Инициализация языковой модели (LLM) ---
     # Используем OpenRouter для доступа к различным моделям
     print(f"Инициализация LLM: {llm_model_name}...")
+    # Клиенты HTTP общие для всех цепочек процесса: соединения с OpenRouter
+    # переиспользуются, а не открываются заново для каждого запроса.
+    http_client, http_async_client = get_llm_http_clients()
     qa_model = ChatOpenAI(
         model=llm_model_name,
         temperature=temperature,
         api_key=openrouter_api_key,
-        base_url=openrouter_base_url
+        base_url=openrouter_base_url,
+        http_client=http_client,
+        http_async_client=http_async_client
     )
 
     # --- Шаг 5: Сборка цепочки RetrievalQA ---
@@ -77,7 +354,7 @@ def create_rag_chain(
     qa_chain = RetrievalQA.from_chain_type(
         llm=qa_model,
         chain_type="stuff",
-        retriever=vector_store.as_retriever()
+        retriever=retriever or vector_store.as_retriever()
     )
     
     print("Цепочка успешно создана!")
@@ -0,0 +1,157 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Optional
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from pydantic import Field
+
+from app.llm.answer_cache import normalize_question
+from app.llm.vector_retrieval import retrieve_by_vector
+from app.utils import metrics
+
+if TYPE_CHECKING:
+    from sentence_transformers import CrossEncoder
+
+# Многоязычная модель (обучена на mMARCO): тексты сайта и вопросы — на русском.
+DEFAULT_RERANK_MODEL = "cross-encoder/mmarco-mMiniLMv2-L12-H384-v1"
+DEFAULT_RERANK_TOP_N = 4
+
+
+@lru_cache(maxsize=2)
+def get_cross_encoder(model_name: str = DEFAULT_RERANK_MODEL) -> "CrossEncoder":
+    """
+    Загружает (один раз на процесс) кросс-энкодер для переранжирования на CPU.
+    """
+    # Импорт здесь: sentence_transformers тянет torch, а переранжирование включается не всегда.
+    from sentence_transformers import CrossEncoder
+    return CrossEncoder(model_name, device="cpu", max_length=512)
+
+
+class ScoreCache:
+    """
+    LRU-кэш оценок кросс-энкодера по паре (вопрос, текст чанка).
+
+    Повторные и популярные вопросы (а чанки у них часто общие) не
+    пересчитываются. Ключ — хэш нормализованного вопроса и текста чанка.
+
+    Args:
+        max_entries (int, optional): Емкость кэша. Defaults to 10000.
+    """
+
+    def __init__(self, max_entries: int = 10_000):
+        self.max_entries = max_entries
+        self._scores: "OrderedDict[str, float]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def key(query: str, text: str) -> str:
+        digest = hashlib.blake2b(digest_size=16)
+        digest.update(normalize_question(query).encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(text.encode("utf-8"))
+        return digest.hexdigest()
+
+    def get(self, key: str) -> Optional[float]:
+        with self._lock:
+            score = self._scores.get(key)
+            if score is None:
+                self.misses += 1
+                return None
+            self._scores.move_to_end(key)
+            self.hits += 1
+            return score
+
+    def put(self, key: str, score: float) -> None:
+        with self._lock:
+            self._scores[key] = score
+            self._scores.move_to_end(key)
+            while len(self._scores) > self.max_entries:
+                self._scores.popitem(last=False)
+
+    def stats(self) -> dict:
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._scores),
+        }
+
+
+class RerankingRetriever(BaseRetriever):
+    """
+    Переранжирование кандидатов кросс-энкодером.
+
+    Базовый ретривер возвращает широкий набор кандидатов (например, 20),
+    кросс-энкодер оценивает пары (вопрос, чанк) батчами на CPU, и в
+    цепочку уходят только top_n лучших. Несколько миллисекунд локальных
+    вычислений окупаются заметно более коротким промптом. Оценка
+    записывается в metadata["rerank_score"] копии документа.
+
+    Args:
+        base_retriever (BaseRetriever): Ретривер кандидатов.
+        model_name (str, optional): Модель кросс-энкодера.
+        top_n (int, optional): Сколько документов оставить. Defaults to 4.
+        batch_size (int, optional): Размер батча кросс-энкодера. Defaults to 32.
+        score_cache (ScoreCache, optional): Кэш оценок (общий для всех запросов).
+    """
+
+    base_retriever: BaseRetriever
+    model_name: str = DEFAULT_RERANK_MODEL
+    top_n: int = DEFAULT_RERANK_TOP_N
+    batch_size: int = 32
+    score_cache: ScoreCache = Field(default_factory=ScoreCache)
+
+    def score(self, query: str, documents: List[Document]) -> List[float]:
+        """
+        Оценивает релевантность документов вопросу (с кэшем).
+        """
+        keys = [ScoreCache.key(query, document.page_content) for document in documents]
+        scores = [self.score_cache.get(key) for key in keys]
+        missing = [i for i, score in enumerate(scores) if score is None]
+        metrics.inc("rerank_pairs", len(documents) - len(missing), result="cached")
+        metrics.inc("rerank_pairs", len(missing), result="scored")
+        if missing:
+            with metrics.span("rerank.predict", pairs=len(missing)):
+                predicted = get_cross_encoder(self.model_name).predict(
+                    [(query, documents[i].page_content) for i in missing],
+                    batch_size=self.batch_size,
+                    show_progress_bar=False
+                )
+            for i, value in zip(missing, predicted):
+                scores[i] = float(value)
+                self.score_cache.put(keys[i], scores[i])
+        return scores
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        candidates = self.base_retriever.invoke(query, config={"callbacks": run_manager.get_child()})
+        return self._rerank(query, candidates)
+
+    def get_relevant_documents_by_vector(self, query: str, vector: List[float]) -> List[Document]:
+        """
+        Переранжирование кандидатов, найденных по готовому эмбеддингу вопроса
+        (см. retrieve_by_vector).
+        """
+        return self._rerank(query, retrieve_by_vector(self.base_retriever, query, vector))
+
+    def _rerank(self, query: str, candidates: List[Document]) -> List[Document]:
+        if not candidates:
+            return []
+        scores = self.score(query, candidates)
+        ranked = sorted(range(len(candidates)), key=lambda i: scores[i], reverse=True)[:self.top_n]
+        return [
+            Document(
+                id=candidates[i].id,
+                page_content=candidates[i].page_content,
+                metadata={**candidates[i].metadata, "rerank_score": scores[i]}
+            )
+            for i in ranked
+        ]
@@ -0,0 +1,97 @@
+import heapq
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Iterable, List, Tuple
+
+from langchain_community.vectorstores import FAISS
+from langchain_community.vectorstores.utils import DistanceStrategy
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from pydantic import Field
+
+from app.utils import metrics
+
+
+def merge_top_k(
+    results: Iterable[List[Tuple[Document, float]]],
+    k: int,
+    higher_is_better: bool = False
+) -> List[Tuple[Document, float]]:
+    """
+    Объединяет выдачи шардов в общий top-k по оценке.
+
+    Оценки разных шардов сравнимы: все шарды построены одной моделью
+    эмбеддингов и одной метрикой. Для L2-расстояния лучше меньшее значение,
+    для скалярного произведения — большее.
+    """
+    candidates = [pair for result in results for pair in result]
+    select = heapq.nlargest if higher_is_better else heapq.nsmallest
+    return select(k, candidates, key=lambda pair: pair[1])
+
+
+def _default_executor() -> ThreadPoolExecutor:
+    return ThreadPoolExecutor(max_workers=os.cpu_count() or 4, thread_name_prefix="shard-search")
+
+
+class ShardedRetriever(BaseRetriever):
+    """
+    Поиск по нескольким индексам FAISS (шардам) одновременно.
+
+    Вопрос эмбеддится один раз, каждый шард ищет свои k ближайших в пуле
+    потоков (FAISS отпускает GIL на время поиска, поэтому шарды
+    обрабатываются на разных ядрах), и выдачи сливаются в общий top-k.
+
+    Args:
+        shards (Dict[str, FAISS]): Шарды по именам (см. app.processing.sharding).
+        embeddings (Embeddings): Модель эмбеддингов, которой построены шарды.
+        k (int, optional): Сколько документов вернуть. Defaults to 4.
+        executor (ThreadPoolExecutor, optional): Пул потоков для поиска по шардам.
+            Пул по умолчанию принадлежит ретриверу и останавливается close().
+    """
+
+    shards: Dict[str, FAISS]
+    embeddings: Embeddings
+    k: int = 4
+    executor: ThreadPoolExecutor = Field(default_factory=_default_executor)
+
+    def close(self) -> None:
+        """
+        Останавливает пул потоков поиска. После этого ретривер использовать нельзя.
+        """
+        self.executor.shutdown(wait=True)
+
+    def search_with_scores(self, query: str) -> List[Tuple[Document, float]]:
+        """
+        Возвращает top-k документов всех шардов вместе с оценками FAISS.
+        """
+        if not self.shards:
+            return []
+        return self.search_with_scores_by_vector(self.embeddings.embed_query(query))
+
+    def search_with_scores_by_vector(self, vector: List[float]) -> List[Tuple[Document, float]]:
+        """
+        То же, что search_with_scores, по готовому эмбеддингу вопроса.
+        """
+        if not self.shards:
+            return []
+        with metrics.span("retrieve.shards", shards=len(self.shards)):
+            futures = [
+                self.executor.submit(store.similarity_search_with_score_by_vector, vector, self.k)
+                for store in self.shards.values()
+            ]
+            results = [future.result() for future in futures]
+        strategy = next(iter(self.shards.values())).distance_strategy
+        return merge_top_k(results, self.k, higher_is_better=strategy == DistanceStrategy.MAX_INNER_PRODUCT)
+
+    def _get_relevant_documents(
+        self, query: str, *, run_manager: CallbackManagerForRetrieverRun
+    ) -> List[Document]:
+        return [document for document, _ in self.search_with_scores(query)]
+
+    def get_relevant_documents_by_vector(self, query: str, vector: List[float]) -> List[Document]:
+        """
+        Поиск по шардам по готовому эмбеддингу вопроса (см. retrieve_by_vector).
+        """
+        return [document for document, _ in self.search_with_scores_by_vector(vector)]
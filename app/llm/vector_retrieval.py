@@ -0,0 +1,48 @@
+from typing import List, Optional
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+from langchain_core.vectorstores import VectorStoreRetriever
+
+
+def retrieve_by_vector(retriever: BaseRetriever, query: str, vector: List[float]) -> List[Document]:
+    """
+    Ищет документы по заранее посчитанному эмбеддингу вопроса.
+
+    Ретриверы приложения (бюджет контекста, переранжирование, гибридный,
+    шардированный) принимают вектор методом get_relevant_documents_by_vector
+    и передают его дальше по цепочке, поэтому вопрос эмбеддится один раз.
+    VectorStoreRetriever с поиском "similarity" ищет прямо по хранилищу;
+    остальные ретриверы получают текст вопроса.
+
+    Args:
+        retriever (BaseRetriever): Ретривер.
+        query (str): Текст вопроса (нужен BM25, кросс-энкодеру и бюджету).
+        vector (List[float]): Эмбеддинг вопроса моделью, которой построен индекс.
+
+    Returns:
+        List[Document]: Найденные документы.
+    """
+    by_vector = getattr(retriever, "get_relevant_documents_by_vector", None)
+    if by_vector is not None:
+        return by_vector(query, vector)
+    if isinstance(retriever, VectorStoreRetriever) and retriever.search_type == "similarity":
+        return retriever.vectorstore.similarity_search_by_vector(vector, **retriever.search_kwargs)
+    return retriever.invoke(query)
+
+
+def find_query_embeddings(retriever: BaseRetriever) -> Optional[Embeddings]:
+    """
+    Находит модель, которой ретривер эмбеддит вопрос (с учетом вложенных
+    ретриверов), или None, если поиск по вектору ему не подходит.
+    """
+    while retriever is not None:
+        if isinstance(retriever, VectorStoreRetriever):
+            return retriever.vectorstore.embeddings if retriever.search_type == "similarity" else None
+        for owner in (retriever, getattr(retriever, "vector_store", None)):
+            embeddings = getattr(owner, "embeddings", None)
+            if isinstance(embeddings, Embeddings):
+                return embeddings
+        retriever = getattr(retriever, "base_retriever", None)
+    return None
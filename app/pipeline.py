@@ -0,0 +1,264 @@
+import asyncio
+import hashlib
+import queue
+import threading
+import time
+from pathlib import Path
+from typing import Callable, List, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.ingestion.crawler import crawl
+from app.processing.dedup import ChunkDeduplicator
+from app.processing.embedding_cache import CachedEmbeddings
+from app.processing.incremental_index import chunk_hash
+from app.processing.index_store import DEFAULT_INDEX_DIR, get_index_path, prune_index_versions, save_vector_store
+from app.processing.splitter import splitter_func
+from app.processing.token_splitter import DEFAULT_MAX_CHUNK_TOKENS
+from app.utils.paths import url_to_filename
+
+# Маркер конца потока: каждая стадия передает его дальше, когда ее вход исчерпан.
+_DONE = object()
+
+
+class PipelineError(RuntimeError):
+    """
+    Ошибка одной из стадий потокового пайплайна.
+    """
+
+
+class _Stage(threading.Thread):
+    """
+    Поток-стадия: запускает target и запоминает исключение, чтобы
+    пайплайн мог его пробросить, а соседние стадии — не зависнуть.
+    """
+
+    def __init__(self, name: str, target: Callable[[], None], on_error: Callable[[], None]):
+        super().__init__(name=name, daemon=True)
+        self._target_fn = target
+        self._on_error = on_error
+        self.error: Optional[BaseException] = None
+
+    def run(self) -> None:
+        try:
+            self._target_fn()
+        except BaseException as e:
+            self.error = e
+            self._on_error()
+
+
+def _put(q: "queue.Queue", item, stop: threading.Event) -> None:
+    # Блокирующий put с периодической проверкой остановки: так реализуется
+    # обратное давление, но упавшая стадия не оставляет остальные висеть.
+    while not stop.is_set():
+        try:
+            q.put(item, timeout=0.1)
+            return
+        except queue.Full:
+            continue
+
+
+def _get(q: "queue.Queue", stop: threading.Event):
+    while not stop.is_set():
+        try:
+            return q.get(timeout=0.1)
+        except queue.Empty:
+            continue
+    return _DONE
+
+
+def run_streaming_pipeline(
+    urls: List[str],
+    embed_model: Embeddings,
+    embedding_model_name: str,
+    output_dir: Optional[str] = None,
+    index_dir: Optional[str] = DEFAULT_INDEX_DIR,
+    page_buffer: int = 16,
+    chunk_buffer: int = 512,
+    embedding_batch_size: int = 64,
+    split_workers: int = 2,
+    max_chunk_tokens: Optional[int] = DEFAULT_MAX_CHUNK_TOKENS,
+    **crawl_kwargs
+) -> Tuple[FAISS, dict]:
+    """
+    Потоковый пайплайн: загрузка -> разбиение -> эмбеддинг -> индексация.
+
+    Стадии работают одновременно в отдельных потоках и соединены
+    ограниченными очередями. Когда очередь заполнена, предыдущая стадия
+    ждет (обратное давление), поэтому пиковая память определяется
+    размерами буферов, а не размером корпуса, а эмбеддинг идет параллельно
+    с обходом сайта.
+
+    Args:
+        urls (List[str]): Адреса страниц.
+        embed_model (Embeddings): Модель эмбеддингов.
+        embedding_model_name (str): Имя модели эмбеддингов (ключ версии индекса).
+        output_dir (str, optional): Если задан, HTML страниц также сохраняется туда.
+            Тогда страницы с локальной копией ревалидируются (ETag/Last-Modified),
+            и на ответ 304 в индекс идет сохраненная копия. Без output_dir
+            страницы всегда скачиваются целиком: индекс строится с нуля и
+            должен получить каждую страницу.
+        index_dir (str, optional): Куда сохранить готовый индекс; None — не сохранять.
+            Defaults to "./app/index".
+        page_buffer (int, optional): Емкость очереди страниц. Defaults to 16.
+        chunk_buffer (int, optional): Емкость очереди чанков. Defaults to 512.
+        embedding_batch_size (int, optional): Размер батча эмбеддинга. Defaults to 64.
+        split_workers (int, optional): Число потоков разбиения HTML. Defaults to 2.
+        max_chunk_tokens (int, optional): Бюджет токенов на чанк (по токенизатору
+            embedding_model_name); None — не ограничивать. Defaults to 256.
+        **crawl_kwargs: Дополнительные параметры crawl (параллелизм, лимиты и т.д.).
+
+    Returns:
+        Tuple[FAISS, dict]: Векторное хранилище и статистика по стадиям.
+
+    Raises:
+        PipelineError: Если одна из стадий завершилась с ошибкой.
+        ValueError: Если не удалось получить ни одного чанка.
+    """
+    pages: "queue.Queue" = queue.Queue(maxsize=page_buffer)
+    chunks: "queue.Queue" = queue.Queue(maxsize=chunk_buffer)
+    batches: "queue.Queue" = queue.Queue(maxsize=4)
+    stop = threading.Event()
+    stats = {"pages": 0, "not_modified": 0, "chunks": 0, "duplicate_chunks": 0, "embedded": 0}
+    deduplicator = ChunkDeduplicator()
+    stats_lock = threading.Lock()
+    state = {"vector_store": None, "hashes": set()}
+    output_path = Path(output_dir) if output_dir else None
+    if output_path is not None:
+        output_path.mkdir(parents=True, exist_ok=True)
+
+    user_revalidate = crawl_kwargs.pop("revalidate", None)
+
+    def revalidate(url: str) -> bool:
+        # Условный запрос допустим только при наличии локальной копии:
+        # ответ 304 не содержит тела, и страницу берем с диска.
+        if output_path is None or not (output_path / url_to_filename(url)).is_file():
+            return False
+        return user_revalidate is None or user_revalidate(url)
+
+    def crawl_stage() -> None:
+        not_modified: List[str] = []
+
+        async def on_page(url: str, html: str) -> None:
+            if output_path is not None:
+                await asyncio.to_thread((output_path / url_to_filename(url)).write_text, html, encoding="utf-8")
+            await asyncio.to_thread(_put, pages, (url, html), stop)
+            with stats_lock:
+                stats["pages"] += 1
+
+        try:
+            asyncio.run(crawl(urls, on_page=on_page, revalidate=revalidate, not_modified=not_modified, **crawl_kwargs))
+            for url in not_modified:
+                html = (output_path / url_to_filename(url)).read_text(encoding="utf-8")
+                _put(pages, (url, html), stop)
+                with stats_lock:
+                    stats["pages"] += 1
+                    stats["not_modified"] += 1
+        finally:
+            for _ in range(split_workers):
+                _put(pages, _DONE, stop)
+
+    def split_stage() -> None:
+        try:
+            while True:
+                item = _get(pages, stop)
+                if item is _DONE:
+                    return
+                url, html = item
+                documents = splitter_func(
+                    html_string=html, max_chunk_tokens=max_chunk_tokens, tokenizer_model=embedding_model_name
+                )
+                for document in documents:
+                    document.metadata["source"] = url
+                    _put(chunks, document, stop)
+        finally:
+            _put(chunks, _DONE, stop)
+
+    def embed_stage() -> None:
+        finished_splitters = 0
+        batch: List[Tuple[Document, str]] = []
+        seen = state["hashes"]
+
+        def flush() -> None:
+            if not batch:
+                return
+            vectors = embed_model.embed_documents([document.page_content for document, _ in batch])
+            _put(batches, (list(batch), vectors), stop)
+            batch.clear()
+
+        try:
+            while finished_splitters < split_workers:
+                document = _get(chunks, stop)
+                if document is _DONE:
+                    finished_splitters += 1
+                    continue
+                with stats_lock:
+                    stats["chunks"] += 1
+                if not deduplicator.add(document):
+                    with stats_lock:
+                        stats["duplicate_chunks"] += 1
+                    continue
+                document_hash = chunk_hash(document)
+                seen.add(document_hash)
+                batch.append((document, document_hash))
+                if len(batch) >= embedding_batch_size:
+                    flush()
+            flush()
+        finally:
+            _put(batches, _DONE, stop)
+
+    def index_stage() -> None:
+        while True:
+            item = _get(batches, stop)
+            if item is _DONE:
+                return
+            batch, vectors = item
+            text_embeddings = [(document.page_content, vector) for (document, _), vector in zip(batch, vectors)]
+            metadatas = [document.metadata for document, _ in batch]
+            ids = [document_hash for _, document_hash in batch]
+            if state["vector_store"] is None:
+                state["vector_store"] = FAISS.from_embeddings(
+                    text_embeddings, embed_model, metadatas=metadatas, ids=ids
+                )
+            else:
+                state["vector_store"].add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+            with stats_lock:
+                stats["embedded"] += len(batch)
+
+    started = time.perf_counter()
+    stages = [_Stage("crawl", crawl_stage, stop.set)]
+    stages += [_Stage(f"split-{i}", split_stage, stop.set) for i in range(split_workers)]
+    stages += [_Stage("embed", embed_stage, stop.set), _Stage("index", index_stage, stop.set)]
+    for stage in stages:
+        stage.start()
+    for stage in stages:
+        stage.join()
+
+    errors = [stage for stage in stages if stage.error is not None]
+    if errors:
+        raise PipelineError(f"Стадия '{errors[0].name}' завершилась с ошибкой: {errors[0].error}") from errors[0].error
+
+    vector_store = state["vector_store"]
+    if vector_store is None:
+        raise ValueError("Пайплайн не получил ни одного чанка для индексации.")
+
+    stats["seconds"] = time.perf_counter() - started
+    stats["dedup"] = dict(deduplicator.stats)
+    print(deduplicator.report())
+    print(f"Пайплайн завершен: страниц {stats['pages']}, чанков {stats['chunks']} "
+          f"(дубликатов {stats['duplicate_chunks']}), за {stats['seconds']:.1f} с")
+
+    if isinstance(embed_model, CachedEmbeddings):
+        embed_model.save()
+    if index_dir is not None:
+        # Порядок чанков зависит от порядка загрузки страниц, поэтому версия
+        # индекса считается по отсортированному набору хэшей, а не по потоку.
+        fingerprint = hashlib.sha256("".join(sorted(state["hashes"])).encode("utf-8")).hexdigest()
+        index_path = get_index_path(index_dir, embedding_model_name, fingerprint)
+        save_vector_store(vector_store, index_path, embedding_model_name, fingerprint, extra={"streaming": True})
+        prune_index_versions(index_dir, embedding_model_name, current=index_path)
+        stats["index_path"] = str(index_path)
+        print(f"Индекс сохранен в {index_path}")
+    return vector_store, stats
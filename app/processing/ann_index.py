@@ -0,0 +1,208 @@
+import math
+import time
+from typing import Dict, List, Optional
+
+import faiss
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+INDEX_TYPES = ("flat", "ivf", "hnsw", "ivfpq", "pq", "sqfp16", "sq8")
+PQ_TRAINING_POINTS = 256 * 39
+DEFAULT_TRAIN_SAMPLE = 50_000
+
+
+def default_nlist(num_vectors: int) -> int:
+    """
+    Число кластеров IVF: около 4*sqrt(N), но так, чтобы на кластер
+    приходилось не меньше 39 обучающих точек (иначе FAISS предупреждает).
+    """
+    return max(1, min(int(4 * math.sqrt(num_vectors)), num_vectors // 39))
+
+
+def default_pq_m(dim: int) -> int:
+    """
+    Число подпространств PQ: наибольший делитель размерности, дающий
+    не меньше 8 измерений на подпространство.
+    """
+    for m in range(dim // 8, 0, -1):
+        if dim % m == 0:
+            return m
+    return 1
+
+
+def factory_string(index_type: str, dim: int, num_vectors: int, params: Optional[dict] = None) -> str:
+    """
+    Строит строку faiss.index_factory для типа индекса.
+
+    Args:
+        index_type (str): "flat", "ivf", "hnsw", "ivfpq", "pq", "sqfp16"
+            (векторы во float16, вдвое компактнее) или "sq8" (скалярное
+            квантование в int8, вчетверо компактнее).
+        dim (int): Размерность векторов.
+        num_vectors (int): Размер корпуса (для выбора nlist по умолчанию).
+        params (dict, optional): nlist, hnsw_m, pq_m.
+
+    Returns:
+        str: Описание индекса для faiss.index_factory.
+    """
+    params = params or {}
+    nlist = params.get("nlist") or default_nlist(num_vectors)
+    pq_m = params.get("pq_m") or default_pq_m(dim)
+    if index_type == "flat":
+        return "Flat"
+    if index_type == "ivf":
+        return f"IVF{nlist},Flat"
+    if index_type == "hnsw":
+        return f"HNSW{params.get('hnsw_m', 32)}"
+    if index_type == "ivfpq":
+        return f"IVF{nlist},PQ{pq_m}"
+    if index_type == "pq":
+        return f"PQ{pq_m}"
+    if index_type == "sqfp16":
+        return "SQfp16"
+    if index_type == "sq8":
+        return "SQ8"
+    raise ValueError(f"Неизвестный тип индекса '{index_type}'. Допустимые: {', '.join(INDEX_TYPES)}.")
+
+
+def set_search_params(index: "faiss.Index", nprobe: Optional[int] = None, ef_search: Optional[int] = None) -> None:
+    """
+    Настраивает параметры поиска: nprobe для IVF и efSearch для HNSW.
+    Параметры, не применимые к индексу, игнорируются.
+    """
+    if nprobe is not None:
+        ivf = faiss.try_extract_index_ivf(index)
+        if ivf is not None:
+            ivf.nprobe = nprobe
+    if ef_search is not None and hasattr(index, "hnsw"):
+        index.hnsw.efSearch = ef_search
+
+
+def build_faiss_index(
+    vectors: np.ndarray,
+    index_type: str = "flat",
+    params: Optional[dict] = None,
+    train_sample: int = DEFAULT_TRAIN_SAMPLE,
+    seed: int = 0
+) -> "faiss.Index":
+    """
+    Создает, обучает на выборке и заполняет индекс FAISS.
+
+    Args:
+        vectors (np.ndarray): Матрица векторов float32 (N x d).
+        index_type (str, optional): Тип индекса из INDEX_TYPES. Defaults to "flat".
+        params (dict, optional): nlist, hnsw_m, pq_m, nprobe, ef_search.
+        train_sample (int, optional): Максимальный размер обучающей выборки.
+            Defaults to 50000.
+        seed (int, optional): Зерно выборки. Defaults to 0.
+
+    Returns:
+        faiss.Index: Готовый к поиску индекс. Если корпус слишком мал для
+            обучения PQ, строится плоский индекс (с предупреждением).
+    """
+    params = params or {}
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    num_vectors, dim = vectors.shape
+    if index_type in ("ivfpq", "pq") and num_vectors < PQ_TRAINING_POINTS:
+        print(f"Предупреждение: для обучения PQ нужно не меньше {PQ_TRAINING_POINTS} векторов, "
+              f"а их {num_vectors}; строю плоский индекс.")
+        index_type = "flat"
+
+    index = faiss.index_factory(dim, factory_string(index_type, dim, num_vectors, params))
+    if not index.is_trained:
+        rng = np.random.default_rng(seed)
+        sample_size = min(num_vectors, train_sample)
+        sample = vectors[rng.choice(num_vectors, size=sample_size, replace=False)]
+        index.train(sample)
+    index.add(vectors)
+    set_search_params(index, nprobe=params.get("nprobe"), ef_search=params.get("ef_search"))
+    return index
+
+
+def vector_store_from_index(
+    index: "faiss.Index",
+    documents: List[Document],
+    ids: List[str],
+    embed_model: Embeddings
+) -> FAISS:
+    """
+    Оборачивает готовый индекс FAISS в векторное хранилище LangChain.
+    Документы должны идти в том же порядке, что и векторы в индексе.
+    """
+    # id в самом документе нужен тем, кто по нему находит вектор (см. BudgetedRetriever).
+    documents = [
+        Document(id=doc_id, page_content=document.page_content, metadata=document.metadata)
+        for doc_id, document in zip(ids, documents)
+    ]
+    docstore = InMemoryDocstore(dict(zip(ids, documents)))
+    return FAISS(
+        embedding_function=embed_model,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=dict(enumerate(ids)),
+    )
+
+
+def recall_latency_report(
+    vectors: np.ndarray,
+    configs: Dict[str, dict],
+    queries: Optional[np.ndarray] = None,
+    k: int = 4,
+    num_queries: int = 200,
+    seed: int = 0
+) -> List[dict]:
+    """
+    Сравнивает конфигурации индексов с плоским (точным) поиском.
+
+    Для каждой конфигурации считается recall@k относительно IndexFlatL2
+    и латентность одиночного запроса (p50 и p95, мс), а также размер
+    индекса в байтах.
+
+    Args:
+        vectors (np.ndarray): Векторы корпуса.
+        configs (Dict[str, dict]): Имя конфигурации -> {"index_type": ..., **params}.
+        queries (np.ndarray, optional): Векторы запросов; по умолчанию —
+            случайная выборка векторов корпуса.
+        k (int, optional): Число соседей. Defaults to 4.
+        num_queries (int, optional): Размер выборки запросов. Defaults to 200.
+        seed (int, optional): Зерно выборки. Defaults to 0.
+
+    Returns:
+        List[dict]: Строки отчета, по одной на конфигурацию (плюс "flat").
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    if queries is None:
+        rng = np.random.default_rng(seed)
+        queries = vectors[rng.choice(len(vectors), size=min(num_queries, len(vectors)), replace=False)]
+    queries = np.ascontiguousarray(queries, dtype=np.float32)
+
+    exact = faiss.IndexFlatL2(vectors.shape[1])
+    exact.add(vectors)
+    _, truth = exact.search(queries, k)
+
+    rows = []
+    for name, config in {"flat": {"index_type": "flat"}, **configs}.items():
+        params = {key: value for key, value in config.items() if key != "index_type"}
+        index = build_faiss_index(vectors, config.get("index_type", "flat"), params, seed=seed)
+        latencies = []
+        found = np.empty_like(truth)
+        for i, query in enumerate(queries):
+            started = time.perf_counter()
+            _, found[i:i + 1] = index.search(query[None, :], k)
+            latencies.append((time.perf_counter() - started) * 1000)
+        recall = np.mean([len(set(truth[i]) & set(found[i])) / k for i in range(len(queries))])
+        latencies.sort()
+        rows.append({
+            "name": name,
+            "recall_at_k": float(recall),
+            "p50_ms": latencies[len(latencies) // 2],
+            "p95_ms": latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))],
+            "index_bytes": faiss.serialize_index(index).nbytes,
+        })
+        print(f"{name:>16}: recall@{k}={rows[-1]['recall_at_k']:.3f}, "
+              f"p50={rows[-1]['p50_ms']:.3f} мс, p95={rows[-1]['p95_ms']:.3f} мс, "
+              f"размер={rows[-1]['index_bytes']} байт")
+    return rows
@@ -0,0 +1,148 @@
+import heapq
+import math
+import os
+import pickle
+import re
+from collections import Counter
+from pathlib import Path
+from typing import Dict, Iterable, List, Mapping, Tuple
+
+# Слова, а также коды с точками/дефисами/слэшами ("09.03.01", "Б1.В-12") как единый токен.
+_TOKEN_RE = re.compile(r"\w+(?:[./-]\w+)*", re.UNICODE)
+BM25_FILE = "bm25.pkl"
+
+
+def tokenize(text: str) -> List[str]:
+    """
+    Разбивает текст на токены для лексического поиска (в нижнем регистре).
+    """
+    return _TOKEN_RE.findall(text.lower())
+
+
+class BM25Index:
+    """
+    Инвертированный индекс с ранжированием BM25 (Okapi).
+
+    Хранит для каждого термина постинг-лист {id документа: частота},
+    поэтому поиск просматривает только документы, содержащие термины
+    запроса. Для каждого документа хранится и список его терминов, так
+    что удаление затрагивает только его постинги, а не весь словарь.
+    Документы можно добавлять и удалять по одному, что позволяет
+    обновлять индекс инкрементально вместе с индексом FAISS.
+
+    Args:
+        k1 (float, optional): Насыщение частоты термина. Defaults to 1.5.
+        b (float, optional): Нормализация по длине документа. Defaults to 0.75.
+    """
+
+    def __init__(self, k1: float = 1.5, b: float = 0.75):
+        self.k1 = k1
+        self.b = b
+        self.postings: Dict[str, Dict[str, int]] = {}
+        self.doc_lengths: Dict[str, int] = {}
+        self.doc_terms: Dict[str, List[str]] = {}
+        self.total_length = 0
+
+    def __len__(self) -> int:
+        return len(self.doc_lengths)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self.doc_lengths
+
+    def add(self, doc_id: str, text: str) -> None:
+        """
+        Добавляет документ (повторное добавление заменяет старую версию).
+        """
+        if doc_id in self.doc_lengths:
+            self.remove(doc_id)
+        counts = Counter(tokenize(text))
+        for term, count in counts.items():
+            self.postings.setdefault(term, {})[doc_id] = count
+        self.doc_terms[doc_id] = list(counts)
+        length = sum(counts.values())
+        self.doc_lengths[doc_id] = length
+        self.total_length += length
+
+    def remove(self, doc_id: str) -> None:
+        """
+        Удаляет документ из индекса (отсутствующий id игнорируется).
+        """
+        self.remove_many([doc_id])
+
+    def remove_many(self, doc_ids: Iterable[str]) -> None:
+        """
+        Удаляет несколько документов, затрагивая только постинги их терминов.
+        """
+        for doc_id in doc_ids:
+            if doc_id not in self.doc_lengths:
+                continue
+            self.total_length -= self.doc_lengths.pop(doc_id)
+            for term in self.doc_terms.pop(doc_id):
+                docs = self.postings[term]
+                del docs[doc_id]
+                if not docs:
+                    del self.postings[term]
+
+    def search(self, query: str, k: int = 10) -> List[Tuple[str, float]]:
+        """
+        Возвращает до k пар (id документа, BM25-оценка) по убыванию оценки.
+        """
+        num_docs = len(self.doc_lengths)
+        if num_docs == 0:
+            return []
+        avg_length = self.total_length / num_docs
+        scores: Dict[str, float] = {}
+        for term in set(tokenize(query)):
+            docs = self.postings.get(term)
+            if not docs:
+                continue
+            df = len(docs)
+            idf = math.log(1 + (num_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in docs.items():
+                norm = self.k1 * (1 - self.b + self.b * self.doc_lengths[doc_id] / avg_length)
+                scores[doc_id] = scores.get(doc_id, 0.0) + idf * tf * (self.k1 + 1) / (tf + norm)
+        return heapq.nlargest(k, scores.items(), key=lambda item: item[1])
+
+    def sync(self, documents: Mapping[str, str]) -> Tuple[int, int]:
+        """
+        Приводит индекс к заданному набору документов {id: текст}:
+        добавляет новые id и удаляет исчезнувшие. Тексты читаются только
+        для новых id, поэтому documents может загружать их лениво.
+
+        Returns:
+            Tuple[int, int]: Число добавленных и удаленных документов.
+        """
+        to_remove = [doc_id for doc_id in self.doc_lengths if doc_id not in documents]
+        self.remove_many(to_remove)
+        to_add = [doc_id for doc_id in documents if doc_id not in self.doc_lengths]
+        for doc_id in to_add:
+            self.add(doc_id, documents[doc_id])
+        return len(to_add), len(to_remove)
+
+    def save(self, path: Path) -> None:
+        """
+        Атомарно сохраняет индекс в файл.
+        """
+        path = Path(path)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as f:
+            pickle.dump(self.__dict__, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path: Path) -> "BM25Index":
+        """
+        Загружает индекс, сохраненный методом save.
+        """
+        index = cls()
+        # Файл создается нами же в save, поэтому pickle здесь допустим.
+        with open(path, "rb") as f:
+            index.__dict__.update(pickle.load(f))
+        if len(index.doc_terms) != len(index.doc_lengths):
+            # Файл старого формата, без списков терминов документов.
+            index.doc_terms = {}
+            for term, docs in index.postings.items():
+                for doc_id in docs:
+                    index.doc_terms.setdefault(doc_id, []).append(term)
+        return index
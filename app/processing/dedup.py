@@ -0,0 +1,210 @@
+import hashlib
+import itertools
+import json
+import re
+from typing import Dict, List, Optional, Tuple
+
+from langchain_core.documents import Document
+
+SIMHASH_BITS = 64
+# Сколько блоков SimHash составляют ключ одной таблицы LSH (см. ChunkDeduplicator).
+KEY_BLOCKS = 2
+# Рекомендуемый порог для поиска почти-дублей; по умолчанию он выключен.
+DEFAULT_MAX_DISTANCE = 3
+DEFAULT_MIN_WORDS = 8
+SHINGLE_SIZE = 3
+# Поля метаданных, не отличающие один чанк от другого: адрес страницы.
+SOURCE_KEYS = ("source", "sources")
+
+_WORD_RE = re.compile(r"\w+", re.UNICODE)
+_NUMBER_RE = re.compile(r"\d+(?:[.,]\d+)*")
+
+
+def _normalize(text: str) -> str:
+    return " ".join(text.lower().split())
+
+
+def _hash64(value: str) -> int:
+    return int.from_bytes(hashlib.blake2b(value.encode("utf-8"), digest_size=8).digest(), "big")
+
+
+def simhash(text: str) -> int:
+    """
+    Вычисляет 64-битный SimHash текста по шинглам из трех слов.
+
+    У почти одинаковых текстов (отличающихся датой, счетчиком, парой
+    слов) SimHash отличается в немногих битах.
+    """
+    words = _WORD_RE.findall(text.lower())
+    if len(words) < SHINGLE_SIZE:
+        shingles = [" ".join(words)]
+    else:
+        shingles = [" ".join(words[i:i + SHINGLE_SIZE]) for i in range(len(words) - SHINGLE_SIZE + 1)]
+
+    weights = [0] * SIMHASH_BITS
+    for shingle in shingles:
+        value = _hash64(shingle)
+        for bit in range(SIMHASH_BITS):
+            weights[bit] += 1 if value >> bit & 1 else -1
+
+    fingerprint = 0
+    for bit, weight in enumerate(weights):
+        if weight > 0:
+            fingerprint |= 1 << bit
+    return fingerprint
+
+
+def hamming_distance(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def _exact_key(text: str, metadata: dict) -> str:
+    # Заголовки (метаданные HTMLHeaderTextSplitter) входят в ключ: одна и та
+    # же таблица под заголовками разных программ — разные чанки.
+    headers = {key: value for key, value in metadata.items() if key not in SOURCE_KEYS}
+    raw = text + "\x00" + json.dumps(headers, sort_keys=True, ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+
+class ChunkDeduplicator:
+    """
+    Потоковый дедупликатор чанков: точные дубли по хэшу нормализованного
+    текста и заголовков и (если задан max_distance) почти-дубли по SimHash.
+
+    Почти-дубли — это только чанки с теми же заголовками и теми же числами:
+    страницы программ, отличающиеся ценой, датой или кодом, не склеиваются.
+    Кандидаты на почти-дубль ищутся по перестановочным таблицам (Manku и
+    др.): 64-битный SimHash делится на max_distance + 2 блока, и для каждой
+    пары блоков заводится таблица с ключом из битов этой пары. Чанки с
+    совпадающим ключом сравниваются по расстоянию Хэмминга. У SimHash,
+    отличающихся не более чем в max_distance битах, по принципу Дирихле
+    хотя бы два блока совпадают целиком, поэтому поиск точный, а не
+    вероятностный, при любом пороге.
+
+    Источники дублей (metadata["source"]) собираются в sources_of(), а не в
+    метаданные канонического чанка: от метаданных зависит chunk_hash, и
+    появление дубля иначе заставляло бы заново эмбеддить неизменившийся чанк.
+
+    Args:
+        max_distance (int, optional): Максимальное расстояние Хэмминга между
+            SimHash почти-дублей (например, DEFAULT_MAX_DISTANCE = 3); None —
+            удалять только точные дубли. Defaults to None.
+        min_words (int, optional): Более короткие чанки проверяются только
+            на точное совпадение: их SimHash слишком шумный. Defaults to 8.
+    """
+
+    def __init__(self, max_distance: Optional[int] = None, min_words: int = DEFAULT_MIN_WORDS):
+        if max_distance is not None and not 0 <= max_distance <= SIMHASH_BITS - KEY_BLOCKS:
+            raise ValueError(f"max_distance должен быть от 0 до {SIMHASH_BITS - KEY_BLOCKS}.")
+        self.max_distance = max_distance
+        self.min_words = min_words
+        self._exact: Dict[str, Document] = {}
+        self._sources: Dict[str, List[str]] = {}
+        self._table_masks = self._build_table_masks(max_distance + KEY_BLOCKS) if max_distance is not None else []
+        self._tables: List[Dict[int, List[Tuple[int, tuple, str]]]] = [{} for _ in self._table_masks]
+        self.stats = {
+            "input_chunks": 0,
+            "kept_chunks": 0,
+            "exact_duplicates": 0,
+            "near_duplicates": 0,
+            "removed_bytes": 0,
+        }
+
+    @staticmethod
+    def _build_table_masks(blocks: int) -> List[int]:
+        # Блоки почти равной ширины; маска таблицы покрывает биты KEY_BLOCKS блоков.
+        bounds = [SIMHASH_BITS * i // blocks for i in range(blocks + 1)]
+        block_masks = [((1 << (end - start)) - 1) << start for start, end in zip(bounds, bounds[1:])]
+        return [sum(combination) for combination in itertools.combinations(block_masks, KEY_BLOCKS)]
+
+    def _table_keys(self, fingerprint: int) -> List[int]:
+        return [fingerprint & mask for mask in self._table_masks]
+
+    def _find_near(self, fingerprint: int, facts: tuple = ()) -> Optional[str]:
+        # facts — заголовки и числа чанка: почти-дубль должен совпадать с ними точно.
+        for table, key in enumerate(self._table_keys(fingerprint)):
+            for candidate_fingerprint, candidate_facts, exact_key in self._tables[table].get(key, ()):
+                if candidate_facts == facts and hamming_distance(fingerprint, candidate_fingerprint) <= self.max_distance:
+                    return exact_key
+        return None
+
+    def _merge_source(self, exact_key: str, duplicate: Document) -> None:
+        sources = self._sources[exact_key]
+        source = duplicate.metadata.get("source")
+        if source is not None and source not in sources:
+            sources.append(source)
+
+    def sources_of(self, document: Document) -> List[str]:
+        """
+        Страницы, на которых встречался канонический чанк (он сам и его дубли).
+        """
+        return list(self._sources.get(_exact_key(_normalize(document.page_content), document.metadata), ()))
+
+    def add(self, document: Document) -> bool:
+        """
+        Регистрирует чанк.
+
+        Returns:
+            bool: True, если чанк канонический и его нужно индексировать;
+                False, если это дубль (его источник добавлен канону).
+        """
+        self.stats["input_chunks"] += 1
+        text = _normalize(document.page_content)
+        exact_key = _exact_key(text, document.metadata)
+
+        canonical = exact_key if exact_key in self._exact else None
+        kind = "exact_duplicates"
+        fingerprint = None
+        facts = ()
+        if canonical is None and self.max_distance is not None and len(text.split()) >= self.min_words:
+            fingerprint = simhash(text)
+            headers = sorted((key, str(value)) for key, value in document.metadata.items() if key not in SOURCE_KEYS)
+            facts = (tuple(headers), tuple(_NUMBER_RE.findall(text)))
+            canonical = self._find_near(fingerprint, facts)
+            kind = "near_duplicates"
+
+        if canonical is not None:
+            self._merge_source(canonical, document)
+            self.stats[kind] += 1
+            self.stats["removed_bytes"] += len(document.page_content.encode("utf-8"))
+            return False
+
+        self._exact[exact_key] = document
+        source = document.metadata.get("source")
+        self._sources[exact_key] = [source] if source is not None else []
+        if fingerprint is not None:
+            for table, key in enumerate(self._table_keys(fingerprint)):
+                self._tables[table].setdefault(key, []).append((fingerprint, facts, exact_key))
+        self.stats["kept_chunks"] += 1
+        return True
+
+    def report(self) -> str:
+        removed = self.stats["exact_duplicates"] + self.stats["near_duplicates"]
+        return (f"Дедупликация: удалено {removed} из {self.stats['input_chunks']} чанков "
+                f"(точных {self.stats['exact_duplicates']}, почти-дублей {self.stats['near_duplicates']}), "
+                f"{self.stats['removed_bytes']} байт")
+
+
+def deduplicate_chunks(
+    documents: List[Document],
+    max_distance: Optional[int] = None,
+    min_words: int = DEFAULT_MIN_WORDS
+) -> List[Document]:
+    """
+    Удаляет точные (и, если задан max_distance, почти-) дубли чанков перед
+    эмбеддингом, сохраняя порядок. Метаданные чанков не меняются.
+
+    Args:
+        documents (List[Document]): Чанки после разбиения.
+        max_distance (int, optional): Порог расстояния Хэмминга SimHash;
+            None — только точные дубли. Defaults to None.
+        min_words (int, optional): Минимальная длина чанка в словах для
+            поиска почти-дублей. Defaults to 8.
+
+    Returns:
+        List[Document]: Канонические чанки.
+    """
+    deduplicator = ChunkDeduplicator(max_distance=max_distance, min_words=min_words)
+    result = [document for document in documents if deduplicator.add(document)]
+    print(deduplicator.report())
+    return result
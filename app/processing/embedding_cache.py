@@ -0,0 +1,336 @@
+import atexit
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Iterator, List, Optional
+
+import numpy as np
+from langchain_community.embeddings import SentenceTransformerEmbeddings
+from langchain_core.embeddings import Embeddings
+
+from app.utils import metrics
+from app.utils.paths import model_slug
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка недоступна
+    fcntl = None
+
+DEFAULT_EMBEDDING_CACHE_DIR = "./app/cache/embeddings"
+VECTORS_FILE = "vectors.f32"
+TAGS_FILE = "tags.bin"
+KEYS_FILE = "keys.json"
+LOCK_FILE = "cache.lock"
+CACHE_FORMAT_VERSION = 2
+TAG_SIZE = 16
+
+
+def _key_tag(key: str) -> bytes:
+    return bytes.fromhex(key[:2 * TAG_SIZE])
+
+
+def normalize_text(text: str) -> str:
+    """
+    Нормализует текст для ключа кэша: схлопывает пробельные символы.
+    """
+    return " ".join(text.split())
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Кэширующая обертка над моделью эмбеддингов.
+
+    Векторы хранятся по ключу (имя модели, хэш нормализованного текста) в
+    memory-mapped массиве float32 фиксированной емкости, а порядок LRU и
+    соответствие ключ -> слот — в небольшом JSON-индексе рядом. При
+    переполнении вытесняется давно не использованный вектор. Кэш
+    обслуживает и документы, и поисковые запросы, поэтому повторный
+    вопрос вообще не доходит до модели.
+
+    Рядом с каждым слотом хранится метка его ключа, и чтение сверяет ее:
+    если индекс ключей устарел (процесс упал до save() или слот занял
+    другой процесс с тем же кэшем), чтение считается промахом, а не
+    возвращает чужой вектор. Запись в слоты и сохранение индекса между
+    процессами сериализуются файловой блокировкой.
+
+    Args:
+        base (Embeddings): Исходная модель эмбеддингов.
+        model_name (str): Имя модели (часть ключа и имя поддиректории кэша).
+        cache_dir (str, optional): Корневая директория кэша.
+            Defaults to "./app/cache/embeddings".
+        max_entries (int, optional): Максимальное число векторов в кэше.
+            Defaults to 100000.
+    """
+
+    def __init__(
+        self,
+        base: Embeddings,
+        model_name: str,
+        cache_dir: str = DEFAULT_EMBEDDING_CACHE_DIR,
+        max_entries: int = 100_000
+    ):
+        self.base = base
+        self.model_name = model_name
+        self.max_entries = max_entries
+        self.path = Path(cache_dir) / model_slug(model_name)
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._slots: "OrderedDict[str, int]" = OrderedDict()
+        self._free_slots: List[int] = []
+        self._vectors: Optional[np.memmap] = None
+        self._tags: Optional[np.memmap] = None
+        self._dim: Optional[int] = None
+        self._load()
+
+    # --- Хранилище ---
+
+    def _load(self) -> None:
+        keys_path = self.path / KEYS_FILE
+        vectors_path = self.path / VECTORS_FILE
+        if not keys_path.is_file() or not vectors_path.is_file():
+            return
+        try:
+            meta = json.loads(keys_path.read_text(encoding="utf-8"))
+        except (IOError, ValueError) as e:
+            print(f"Предупреждение: Не удалось прочитать индекс кэша эмбеддингов '{keys_path}': {e}")
+            return
+        if not self._compatible(meta):
+            # Емкость, модель или формат поменялись — старый кэш не переиспользуем.
+            return
+        self._open(meta["dim"], mode="r+")
+        self._adopt_slots(meta)
+
+    def _adopt_slots(self, meta: dict) -> None:
+        self._slots = OrderedDict((key, slot) for key, slot in meta["slots"])
+        used = set(self._slots.values())
+        self._free_slots = [slot for slot in range(self.max_entries - 1, -1, -1) if slot not in used]
+
+    def _compatible(self, meta: dict) -> bool:
+        return (
+            meta.get("format_version") == CACHE_FORMAT_VERSION
+            and meta.get("model_name") == self.model_name
+            and meta.get("capacity") == self.max_entries
+            and (self.path / TAGS_FILE).is_file()
+        )
+
+    def _read_meta(self) -> Optional[dict]:
+        try:
+            return json.loads((self.path / KEYS_FILE).read_text(encoding="utf-8"))
+        except (IOError, ValueError):
+            return None
+
+    def _open(self, dim: int, mode: str) -> None:
+        self.path.mkdir(parents=True, exist_ok=True)
+        self._dim = dim
+        self._vectors = np.memmap(
+            self.path / VECTORS_FILE,
+            dtype=np.float32,
+            mode=mode,
+            shape=(self.max_entries, dim)
+        )
+        self._tags = np.memmap(
+            self.path / TAGS_FILE,
+            dtype=np.uint8,
+            mode=mode,
+            shape=(self.max_entries, TAG_SIZE)
+        )
+        if mode == "w+":
+            self._slots = OrderedDict()
+            self._free_slots = list(range(self.max_entries - 1, -1, -1))
+
+    def _open_for_write(self, dim: int) -> None:
+        # Вызывается под файловой блокировкой: кэш мог создать другой процесс
+        # уже после нашего старта — тогда открываем его, а не затираем.
+        meta = self._read_meta()
+        if meta is not None and self._compatible(meta) and meta.get("dim") == dim:
+            self._open(dim, mode="r+")
+            self._adopt_slots(meta)
+        else:
+            self._open(dim, mode="w+")
+
+    @contextmanager
+    def _file_lock(self) -> Iterator[None]:
+        """
+        Эксклюзивная блокировка кэша между процессами (на платформах с fcntl).
+        """
+        self.path.mkdir(parents=True, exist_ok=True)
+        with open(self.path / LOCK_FILE, "a") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def save(self) -> None:
+        """
+        Сбрасывает векторы на диск и атомарно перезаписывает индекс ключей.
+        """
+        with self._lock, self._file_lock():
+            if self._vectors is None:
+                return
+            self._vectors.flush()
+            self._tags.flush()
+            # Ключи, сохраненные другими процессами, не теряются: берутся те,
+            # чья метка все еще совпадает и чей слот не занят нами.
+            slots: "OrderedDict[str, int]" = OrderedDict()
+            meta = self._read_meta()
+            if meta is not None and self._compatible(meta):
+                used = set(self._slots.values())
+                for key, slot in meta["slots"]:
+                    if key not in self._slots and slot not in used and self._tag_matches(key, slot):
+                        slots[key] = slot
+            slots.update(self._slots)
+            meta = {
+                "format_version": CACHE_FORMAT_VERSION,
+                "model_name": self.model_name,
+                "dim": self._dim,
+                "capacity": self.max_entries,
+                "slots": list(slots.items()),
+            }
+            tmp_path = self.path / f"{KEYS_FILE}.{os.getpid()}.tmp"
+            tmp_path.write_text(json.dumps(meta), encoding="utf-8")
+            os.replace(tmp_path, self.path / KEYS_FILE)
+
+    # --- Операции с ключами ---
+
+    def _key(self, text: str, kind: str) -> str:
+        # Запросы и документы разделены: некоторые модели эмбеддят их по-разному.
+        raw = f"{self.model_name}\x00{kind}\x00{normalize_text(text)}"
+        return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+    def _tag_matches(self, key: str, slot: int) -> bool:
+        return self._tags[slot].tobytes() == _key_tag(key)
+
+    def _get(self, key: str) -> Optional[List[float]]:
+        slot = self._slots.get(key)
+        if slot is None:
+            return None
+        # Метка проверяется до и после чтения: слот мог перезаписать другой процесс.
+        vector = self._vectors[slot].tolist() if self._tag_matches(key, slot) else None
+        if vector is None or not self._tag_matches(key, slot):
+            # Слот занят другим ключом; он больше не наш, в свободные не возвращаем.
+            del self._slots[key]
+            return None
+        self._slots.move_to_end(key)
+        return vector
+
+    def _put(self, key: str, vector: List[float]) -> None:
+        if self._vectors is None:
+            self._open_for_write(len(vector))
+        if key in self._slots:
+            slot = self._slots[key]
+            self._slots.move_to_end(key)
+        elif self._free_slots:
+            slot = self._free_slots.pop()
+            self._slots[key] = slot
+        else:
+            # Вытесняем самый давно использованный вектор и занимаем его слот.
+            _, slot = self._slots.popitem(last=False)
+            self._slots[key] = slot
+        # Сначала метка стирается, затем пишется вектор и только потом новая
+        # метка: читатель никогда не примет наполовину записанный слот.
+        self._tags[slot] = 0
+        self._vectors[slot] = np.asarray(vector, dtype=np.float32)
+        self._tags[slot] = np.frombuffer(_key_tag(key), dtype=np.uint8)
+
+    def lookup(self, texts: List[str], kind: str = "doc") -> List[Optional[List[float]]]:
+        """
+        Возвращает закэшированные векторы (None для промахов), обновляя счетчики.
+        """
+        with self._lock:
+            result = [self._get(self._key(text, kind)) for text in texts]
+            found = sum(vector is not None for vector in result)
+            self.hits += found
+            self.misses += len(texts) - found
+        metrics.inc("embedding_cache_lookups", found, result="hit")
+        metrics.inc("embedding_cache_lookups", len(texts) - found, result="miss")
+        return result
+
+    def store(self, texts: List[str], vectors: List[List[float]], kind: str = "doc") -> None:
+        """
+        Кладет в кэш векторы, посчитанные вне обертки (например, в пуле процессов).
+        """
+        with self._lock, self._file_lock():
+            for text, vector in zip(texts, vectors):
+                self._put(self._key(text, kind), vector)
+
+    # --- Интерфейс Embeddings ---
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        vectors = self.lookup(texts)
+        missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+        if missing:
+            computed = dict(zip(missing, self.base.embed_documents(missing)))
+            self.store(missing, [computed[text] for text in missing])
+            vectors = [vector if vector is not None else computed[text]
+                       for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        with metrics.span("embed.query"):
+            vector = self.lookup([text], kind="query")[0]
+            if vector is None:
+                vector = self.base.embed_query(text)
+                self.store([text], [vector], kind="query")
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """
+        Эмбеддинги нескольких запросов: то же, что embed_query для каждого
+        (тот же ключ кэша и те же векторы), но с одним поиском по кэшу.
+        """
+        with metrics.span("embed.query", batch=len(texts)):
+            vectors = self.lookup(texts, kind="query")
+            missing = list(dict.fromkeys(text for text, vector in zip(texts, vectors) if vector is None))
+            if missing:
+                computed = {text: self.base.embed_query(text) for text in missing}
+                self.store(missing, [computed[text] for text in missing], kind="query")
+                vectors = [vector if vector is not None else computed[text]
+                           for text, vector in zip(texts, vectors)]
+        return vectors
+
+    def stats(self) -> dict:
+        """
+        Возвращает счетчики попаданий/промахов и текущий размер кэша.
+        """
+        total = self.hits + self.misses
+        return {
+            "hits": self.hits,
+            "misses": self.misses,
+            "hit_rate": self.hits / total if total else 0.0,
+            "entries": len(self._slots),
+            "capacity": self.max_entries,
+        }
+
+
+def get_embedding_model(
+    model_name: str,
+    cache_dir: Optional[str] = DEFAULT_EMBEDDING_CACHE_DIR,
+    max_entries: int = 100_000
+) -> Embeddings:
+    """
+    Создает модель эмбеддингов Sentence Transformers, по умолчанию с дисковым кэшем.
+
+    Args:
+        model_name (str): Название модели эмбеддингов от Sentence Transformers.
+        cache_dir (str, optional): Директория кэша эмбеддингов; None отключает кэш.
+            Defaults to "./app/cache/embeddings".
+        max_entries (int, optional): Емкость кэша в векторах. Defaults to 100000.
+
+    Returns:
+        Embeddings: Модель эмбеддингов (кэширующая обертка, если кэш включен).
+    """
+    base = SentenceTransformerEmbeddings(model_name=model_name)
+    if cache_dir is None:
+        return base
+    cached = CachedEmbeddings(base, model_name, cache_dir=cache_dir, max_entries=max_entries)
+    # Эмбеддинги запросов накапливаются в течение всей работы процесса.
+    atexit.register(cached.save)
+    return cached
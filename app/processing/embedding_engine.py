@@ -0,0 +1,224 @@
+import os
+import time
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from typing import Callable, Iterator, List, Optional, Tuple
+
+import numpy as np
+from langchain_community.embeddings import SentenceTransformerEmbeddings
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.processing.embedding_cache import CachedEmbeddings
+from app.utils import metrics
+
+# Модель в процессе-воркере: создается один раз в инициализаторе пула.
+_WORKER_MODEL: Optional[Embeddings] = None
+
+
+def _init_worker(model_name: str, threads_per_worker: int) -> None:
+    global _WORKER_MODEL
+    try:
+        import torch
+        # Без ограничения каждый воркер займет все ядра, и пул будет только мешать сам себе.
+        torch.set_num_threads(threads_per_worker)
+    except ImportError:
+        pass
+    _WORKER_MODEL = SentenceTransformerEmbeddings(model_name=model_name)
+
+
+def _embed_in_worker(texts: List[str]) -> List[List[float]]:
+    return _WORKER_MODEL.embed_documents(texts)
+
+
+class EmbeddingEngine:
+    """
+    Пакетный движок эмбеддингов для построения индекса.
+
+    Чанки сортируются по длине, чтобы в одном батче оказывались тексты
+    похожего размера и на паддинг тратилось меньше вычислений, затем
+    эмбеддятся батчами заданного размера — в текущем процессе или в пуле
+    процессов (по копии модели на воркер). Готовые батчи сразу
+    передаются в индекс, не дожидаясь окончания всего корпуса.
+
+    Args:
+        embed_model (Embeddings): Модель эмбеддингов (может быть CachedEmbeddings).
+        model_name (str): Имя модели Sentence Transformers для воркеров пула.
+        batch_size (int, optional): Размер батча. Defaults to 64.
+        workers (int, optional): Число процессов; 1 — считать в текущем процессе.
+            Defaults to 1.
+    """
+
+    def __init__(
+        self,
+        embed_model: Embeddings,
+        model_name: str,
+        batch_size: int = 64,
+        workers: int = 1
+    ):
+        if batch_size < 1:
+            raise ValueError("batch_size должен быть положительным.")
+        self.embed_model = embed_model
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.workers = max(1, workers)
+        self.last_stats: dict = {}
+
+    def count_tokens(self, texts: List[str]) -> int:
+        """
+        Считает токены токенизатором модели, если он доступен, иначе — по словам.
+        """
+        base = self.embed_model.base if isinstance(self.embed_model, CachedEmbeddings) else self.embed_model
+        tokenizer = getattr(getattr(base, "client", None), "tokenizer", None)
+        if tokenizer is None:
+            return sum(len(text.split()) for text in texts)
+        return sum(len(ids) for ids in tokenizer(texts, add_special_tokens=True)["input_ids"])
+
+    def _batches(self, texts: List[str]) -> List[List[int]]:
+        order = sorted(range(len(texts)), key=lambda i: len(texts[i]))
+        return [order[i:i + self.batch_size] for i in range(0, len(order), self.batch_size)]
+
+    def embed_batches(self, texts: List[str]) -> Iterator[Tuple[List[int], List[List[float]]]]:
+        """
+        Эмбеддит тексты батчами и отдает их по мере готовности.
+
+        Args:
+            texts (List[str]): Тексты для эмбеддинга.
+
+        Yields:
+            Tuple[List[int], List[List[float]]]: Индексы текстов во входном списке
+                и их векторы. Порядок батчей не гарантирован.
+        """
+        started = time.perf_counter()
+        tokens = self.count_tokens(texts)
+        batches = self._batches(texts)
+
+        if self.workers == 1:
+            for batch in batches:
+                with metrics.span("embed.batch"):
+                    vectors = self.embed_model.embed_documents([texts[i] for i in batch])
+                yield batch, vectors
+        else:
+            yield from self._embed_in_pool(texts, batches)
+
+        elapsed = max(time.perf_counter() - started, 1e-9)
+        metrics.inc("embed_chunks", len(texts))
+        metrics.inc("embed_tokens", tokens)
+        metrics.observe("embed.total", elapsed, workers=self.workers)
+        self.last_stats = {
+            "chunks": len(texts),
+            "tokens": tokens,
+            "seconds": elapsed,
+            "chunks_per_sec": len(texts) / elapsed,
+            "tokens_per_sec": tokens / elapsed,
+            "batch_size": self.batch_size,
+            "workers": self.workers,
+        }
+        print(f"Эмбеддинги: {len(texts)} чанков за {elapsed:.1f} с "
+              f"({self.last_stats['chunks_per_sec']:.1f} чанков/с, "
+              f"{self.last_stats['tokens_per_sec']:.0f} токенов/с)")
+
+    def _embed_in_pool(
+        self,
+        texts: List[str],
+        batches: List[List[int]]
+    ) -> Iterator[Tuple[List[int], List[List[float]]]]:
+        cache = self.embed_model if isinstance(self.embed_model, CachedEmbeddings) else None
+        pending_batches = []
+        for batch in batches:
+            batch_texts = [texts[i] for i in batch]
+            if cache is None:
+                pending_batches.append(batch)
+                continue
+            # Попадания в кэш отдаются сразу, в пул уходят только промахи.
+            cached = cache.lookup(batch_texts)
+            hit = [i for i, vector in zip(batch, cached) if vector is not None]
+            if hit:
+                yield hit, [vector for vector in cached if vector is not None]
+            miss = [i for i, vector in zip(batch, cached) if vector is None]
+            if miss:
+                pending_batches.append(miss)
+        if not pending_batches:
+            return
+
+        threads_per_worker = max(1, (os.cpu_count() or 1) // self.workers)
+        with ProcessPoolExecutor(
+            max_workers=self.workers,
+            initializer=_init_worker,
+            initargs=(self.model_name, threads_per_worker)
+        ) as pool:
+            # Держим в полете не больше двух батчей на воркер, чтобы не копить результаты в памяти.
+            queue = iter(pending_batches)
+            in_flight = {}
+            for batch in queue:
+                in_flight[pool.submit(_embed_in_worker, [texts[i] for i in batch])] = batch
+                if len(in_flight) >= 2 * self.workers:
+                    break
+            while in_flight:
+                done, _ = wait(in_flight, return_when=FIRST_COMPLETED)
+                for future in done:
+                    batch = in_flight.pop(future)
+                    vectors = future.result()
+                    if cache is not None:
+                        cache.store([texts[i] for i in batch], vectors)
+                    yield batch, vectors
+                    next_batch = next(queue, None)
+                    if next_batch is not None:
+                        in_flight[pool.submit(_embed_in_worker, [texts[i] for i in next_batch])] = next_batch
+
+    def embed_matrix(self, texts: List[str]) -> np.ndarray:
+        """
+        Эмбеддит тексты и собирает векторы в матрицу float32 в исходном порядке
+        (нужна, например, для обучения IVF/PQ-индексов).
+        """
+        matrix: Optional[np.ndarray] = None
+        for batch, vectors in self.embed_batches(texts):
+            if matrix is None:
+                matrix = np.empty((len(texts), len(vectors[0])), dtype=np.float32)
+            matrix[batch] = np.asarray(vectors, dtype=np.float32)
+        if matrix is None:
+            raise ValueError("Нечего эмбеддить: список текстов пуст.")
+        return matrix
+
+    def add_documents(
+        self,
+        documents: List[Document],
+        vector_store: Optional[FAISS] = None,
+        ids: Optional[List[str]] = None,
+        on_batch: Optional[Callable[[int], None]] = None
+    ) -> FAISS:
+        """
+        Эмбеддит документы и потоково добавляет их в векторное хранилище.
+
+        Args:
+            documents (List[Document]): Документы для индексации.
+            vector_store (FAISS, optional): Существующее хранилище; если не
+                задано, оно создается из первого готового батча.
+            ids (List[str], optional): Идентификаторы документов в docstore.
+            on_batch (Callable[[int], None], optional): Вызывается с числом
+                проиндексированных документов после каждого батча.
+
+        Returns:
+            FAISS: Векторное хранилище с добавленными документами.
+
+        Raises:
+            ValueError: Если хранилища еще нет, а список документов пуст.
+        """
+        if vector_store is None and not documents:
+            raise ValueError("Нельзя создать индекс FAISS из пустого списка документов.")
+        texts = [document.page_content for document in documents]
+        indexed = 0
+        for batch, vectors in self.embed_batches(texts):
+            text_embeddings = [(texts[i], vector) for i, vector in zip(batch, vectors)]
+            metadatas = [documents[i].metadata for i in batch]
+            batch_ids = [ids[i] for i in batch] if ids is not None else None
+            if vector_store is None:
+                vector_store = FAISS.from_embeddings(
+                    text_embeddings, self.embed_model, metadatas=metadatas, ids=batch_ids
+                )
+            else:
+                vector_store.add_embeddings(text_embeddings, metadatas=metadatas, ids=batch_ids)
+            indexed += len(batch)
+            if on_batch is not None:
+                on_batch(indexed)
+        return vector_store
@@ -0,0 +1,127 @@
+import hashlib
+import json
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.processing.embedding_engine import EmbeddingEngine
+from app.processing.index_store import (
+    DEFAULT_INDEX_DIR,
+    chunk_hash,
+    load_vector_store,
+    read_manifest,
+    save_vector_store,
+)
+from app.utils import metrics
+from app.utils.paths import model_slug
+
+CHUNKS_MANIFEST_FILE = "chunks.json"
+INCREMENTAL_DIR_NAME = "incremental"
+
+
+def get_incremental_index_path(index_dir: str, embedding_model_name: str) -> Path:
+    """
+    Возвращает постоянную директорию инкрементального индекса для модели.
+    """
+    return Path(index_dir) / model_slug(embedding_model_name) / INCREMENTAL_DIR_NAME
+
+
+def read_chunks_manifest(index_path: Path) -> Dict[str, str]:
+    """
+    Читает манифест "хэш чанка -> id вектора". Отсутствующий манифест — пустой словарь.
+    """
+    manifest_path = Path(index_path) / CHUNKS_MANIFEST_FILE
+    if not manifest_path.is_file():
+        return {}
+    try:
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (IOError, ValueError) as e:
+        print(f"Предупреждение: Не удалось прочитать манифест чанков '{manifest_path}': {e}")
+        return {}
+
+
+def update_incremental_index(
+    documents: List[Document],
+    embed_model: Embeddings,
+    embedding_model_name: str,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    engine: Optional[EmbeddingEngine] = None,
+    mmap_docstore: bool = False
+) -> Tuple[FAISS, Dict[str, int]]:
+    """
+    Обновляет сохраненный индекс FAISS, пересчитывая эмбеддинги только для изменившихся чанков.
+
+    Каждый чанк хэшируется; новые хэши эмбеддятся и добавляются в индекс,
+    векторы исчезнувших хэшей удаляются, а остальные остаются нетронутыми.
+    Стоимость ночного обновления пропорциональна диффу, а не всему корпусу.
+
+    Args:
+        documents (List[Document]): Актуальный полный набор чанков.
+        embed_model (Embeddings): Модель эмбеддингов.
+        embedding_model_name (str): Имя модели эмбеддингов.
+        index_dir (str, optional): Корневая директория хранилища индексов.
+            Defaults to "./app/index".
+        engine (EmbeddingEngine, optional): Движок пакетного эмбеддинга для
+            новых чанков. По умолчанию — однопроцессный с батчем 64.
+        mmap_docstore (bool, optional): Сохранять docstore в формате MmapDocstore.
+            Сам индекс обновляется в памяти. Defaults to False.
+
+    Returns:
+        Tuple[FAISS, Dict[str, int]]: Обновленное векторное хранилище и статистика
+            изменений с ключами "added", "deleted" и "unchanged".
+
+    Raises:
+        ValueError: Если индекса еще нет, а список документов пуст.
+    """
+    index_path = get_incremental_index_path(index_dir, embedding_model_name)
+    manifest = read_chunks_manifest(index_path)
+
+    vector_store = None
+    store_manifest = read_manifest(index_path)
+    if manifest and store_manifest is not None:
+        # Индекс изменяется на месте, поэтому memory-map (только чтение) здесь не подходит.
+        vector_store = load_vector_store(index_path, embed_model, mmap=False)
+    else:
+        manifest = {}
+
+    # Одинаковые чанки внутри корпуса сворачиваются в один вектор.
+    current: Dict[str, Document] = {}
+    for document in documents:
+        current.setdefault(chunk_hash(document), document)
+
+    to_add = [h for h in current if h not in manifest]
+    to_delete = [h for h in manifest if h not in current]
+    stats = {
+        "added": len(to_add),
+        "deleted": len(to_delete),
+        "unchanged": len(current) - len(to_add),
+    }
+    print(f"Инкрементальная индексация: +{stats['added']} / -{stats['deleted']} "
+          f"/ без изменений {stats['unchanged']}")
+    for change, count in stats.items():
+        metrics.inc("index_chunks", count, change=change)
+
+    engine = engine or EmbeddingEngine(embed_model, embedding_model_name)
+    with metrics.span("index.update"):
+        if vector_store is not None and to_delete:
+            vector_store.delete(ids=[manifest[h] for h in to_delete])
+        if vector_store is None or to_add:
+            vector_store = engine.add_documents([current[h] for h in to_add], vector_store, ids=to_add)
+
+    format_changed = store_manifest is not None and (store_manifest.get("docstore") == "mmap") != mmap_docstore
+    if to_add or to_delete or not manifest or format_changed:
+        new_manifest = {h: h for h in current}
+        version = hashlib.sha256("".join(sorted(new_manifest)).encode("utf-8")).hexdigest()
+        save_vector_store(
+            vector_store,
+            index_path,
+            embedding_model_name,
+            fingerprint=version,
+            extra={"incremental": True},
+            extra_files={CHUNKS_MANIFEST_FILE: json.dumps(new_manifest)},
+            mmap_docstore=mmap_docstore
+        )
+    return vector_store, stats
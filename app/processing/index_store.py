@@ -0,0 +1,624 @@
+import hashlib
+import json
+import os
+import pickle
+import shutil
+import tempfile
+import time
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+
+try:
+    import fcntl
+except ImportError:  # Windows: межпроцессная блокировка недоступна
+    fcntl = None
+
+import faiss
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.processing.ann_index import build_faiss_index, set_search_params, vector_store_from_index
+from app.processing.bm25 import BM25_FILE, BM25Index
+from app.processing.embedding_engine import EmbeddingEngine
+from app.processing.mmap_docstore import MmapDocstore, write_mmap_docstore
+from app.utils import metrics
+from app.utils.paths import model_slug
+
+DEFAULT_INDEX_DIR = "./app/index"
+INDEX_FILE = "index.faiss"
+DOCSTORE_FILE = "index.pkl"
+MANIFEST_FILE = "manifest.json"
+STORE_FORMAT_VERSION = 1
+# Файлы версий лежат в скрытой директории, а путь версии — символическая
+# ссылка на них: замена версии сводится к атомарной подмене ссылки.
+VERSIONS_DATA_DIR = ".data"
+DEFAULT_KEEP_VERSIONS = 3
+# Недописанные данные старше этого срока считаются остатками упавших сборок,
+# если их сборка не держит блокировку BUILD_LOCK_FILE.
+ORPHAN_MAX_AGE_SECONDS = 3600
+BUILD_LOCK_FILE = ".building"
+
+
+def chunk_hash(document: Document) -> str:
+    """
+    Вычисляет хэш содержимого чанка: SHA-256 от текста и метаданных.
+
+    Хэш используется одновременно как ключ манифеста и как id вектора
+    в docstore, поэтому одинаковые чанки всегда получают одинаковый id.
+    """
+    digest = hashlib.sha256()
+    digest.update(document.page_content.encode("utf-8"))
+    digest.update(b"\x00")
+    digest.update(json.dumps(document.metadata, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+    return digest.hexdigest()
+
+
+def content_ids(documents: List[Document]) -> List[str]:
+    """
+    Стабильные id чанков для docstore: хэш содержимого (chunk_hash), у
+    повторов одного чанка — с порядковым суффиксом. Одинаковые чанки разных
+    версий индекса получают одинаковые id, поэтому, например, BM25
+    переносится между версиями без переиндексации неизменившихся чанков.
+    """
+    seen: Dict[str, int] = {}
+    ids = []
+    for document in documents:
+        document_hash = chunk_hash(document)
+        count = seen.get(document_hash, 0)
+        seen[document_hash] = count + 1
+        ids.append(document_hash if count == 0 else f"{document_hash}-{count}")
+    return ids
+
+
+def corpus_fingerprint(documents: List[Document]) -> str:
+    """
+    Вычисляет отпечаток корпуса: SHA-256 от текста и метаданных всех документов.
+
+    Порядок документов учитывается, так как от него зависит
+    порядок векторов в индексе.
+
+    Args:
+        documents (List[Document]): Документы, из которых строится индекс.
+
+    Returns:
+        str: Шестнадцатеричная строка отпечатка.
+    """
+    digest = hashlib.sha256()
+    for document in documents:
+        digest.update(document.page_content.encode("utf-8"))
+        digest.update(b"\x00")
+        digest.update(json.dumps(document.metadata, sort_keys=True, ensure_ascii=False).encode("utf-8"))
+        digest.update(b"\x01")
+    return digest.hexdigest()
+
+
+def index_fingerprint(documents: List[Document], index_type: str = "flat", index_params: Optional[dict] = None) -> str:
+    """
+    Отпечаток версии индекса: корпус плюс (для приближенных индексов) их конфигурация.
+    """
+    fingerprint = corpus_fingerprint(documents)
+    if index_type != "flat":
+        # Разные типы индекса над одним корпусом — разные версии.
+        config = json.dumps({"index_type": index_type, **(index_params or {})}, sort_keys=True)
+        fingerprint = hashlib.sha256((fingerprint + config).encode("utf-8")).hexdigest()
+    return fingerprint
+
+
+def get_index_path(index_dir: str, embedding_model_name: str, fingerprint: str) -> Path:
+    """
+    Возвращает путь к версии индекса для пары (модель, отпечаток корпуса).
+    """
+    return Path(index_dir) / model_slug(embedding_model_name) / fingerprint[:16]
+
+
+def read_manifest(index_path: Path) -> Optional[dict]:
+    """
+    Читает manifest.json версии индекса или возвращает None, если его нет.
+    """
+    manifest_path = Path(index_path) / MANIFEST_FILE
+    if not manifest_path.is_file():
+        return None
+    try:
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (IOError, ValueError) as e:
+        print(f"Предупреждение: Не удалось прочитать манифест '{manifest_path}': {e}")
+        return None
+
+
+def get_index_version(index_path: Path) -> Optional[str]:
+    """
+    Возвращает версию (отпечаток) сохраненного индекса, например для
+    инвалидации кэша ответов при переключении на новый индекс.
+    """
+    manifest = read_manifest(index_path)
+    return manifest.get("fingerprint") if manifest else None
+
+
+def find_latest_index(index_dir: str, embedding_model_name: str) -> Optional[Path]:
+    """
+    Находит самую свежую сохраненную версию индекса для модели (по времени
+    записи манифеста) или возвращает None, если готовых версий нет.
+    """
+    model_dir = Path(index_dir) / model_slug(embedding_model_name)
+    if not model_dir.is_dir():
+        return None
+    candidates = []
+    for index_path in model_dir.iterdir():
+        if index_path.name.startswith("."):
+            # Временные директории недописанных версий.
+            continue
+        manifest = read_manifest(index_path)
+        if (
+            manifest is not None
+            and manifest.get("format_version") == STORE_FORMAT_VERSION
+            and manifest.get("embedding_model_name") == embedding_model_name
+        ):
+            candidates.append(((index_path / MANIFEST_FILE).stat().st_mtime, index_path))
+    return max(candidates)[1] if candidates else None
+
+
+def find_index_version(index_dir: str, embedding_model_name: str, version: str) -> Optional[Path]:
+    """
+    Находит сохраненную версию индекса модели по ее версии (отпечатку из
+    манифеста, как его возвращает get_index_version) или возвращает None.
+
+    Путь строится только из содержимого index_dir, поэтому версию можно
+    принимать от клиента: открыть файлы вне хранилища через нее нельзя.
+    """
+    model_dir = Path(index_dir) / model_slug(embedding_model_name)
+    if not version or not model_dir.is_dir():
+        return None
+    for index_path in model_dir.iterdir():
+        if index_path.name.startswith("."):
+            continue
+        manifest = read_manifest(index_path)
+        if (
+            manifest is not None
+            and manifest.get("format_version") == STORE_FORMAT_VERSION
+            and manifest.get("embedding_model_name") == embedding_model_name
+            and manifest.get("fingerprint") == version
+        ):
+            return index_path
+    return None
+
+
+def save_vector_store(
+    vector_store: FAISS,
+    index_path: Path,
+    embedding_model_name: str,
+    fingerprint: str,
+    extra: Optional[dict] = None,
+    extra_files: Optional[Dict[str, str]] = None,
+    mmap_docstore: bool = False
+) -> None:
+    """
+    Сохраняет индекс FAISS и docstore в директорию версии.
+
+    Файлы пишутся в новую директорию внутри .data, а путь версии —
+    символическая ссылка на нее, которая подменяется одним os.replace.
+    Путь версии никогда не пропадает, и читатели никогда не увидят
+    наполовину записанный индекс; данные прежнего содержимого удаляются
+    после подмены.
+
+    Args:
+        vector_store (FAISS): Векторное хранилище для сохранения.
+        index_path (Path): Директория версии индекса.
+        embedding_model_name (str): Имя модели эмбеддингов.
+        fingerprint (str): Отпечаток корпуса.
+        extra (dict, optional): Дополнительные поля манифеста.
+        extra_files (Dict[str, str], optional): Дополнительные текстовые файлы
+            версии (имя файла -> содержимое), записываемые атомарно вместе с индексом.
+        mmap_docstore (bool, optional): Сохранить docstore в формате MmapDocstore
+            (для чтения через memory-map) вместо pickle. Defaults to False.
+    """
+    index_path = Path(index_path)
+    data_dir = index_path.parent / VERSIONS_DATA_DIR
+    data_dir.mkdir(parents=True, exist_ok=True)
+    tmp_dir = Path(tempfile.mkdtemp(prefix=f"{index_path.name}-", dir=data_dir))
+    try:
+        with _build_lock(tmp_dir):
+            _write_version(vector_store, index_path, tmp_dir, embedding_model_name, fingerprint,
+                           extra, extra_files, mmap_docstore)
+    except BaseException:
+        shutil.rmtree(tmp_dir, ignore_errors=True)
+        raise
+
+
+@contextmanager
+def _build_lock(tmp_dir: Path) -> Iterator[None]:
+    """
+    Держит блокировку недописанной версии, пока она собирается: prune_index_versions
+    другого процесса не удалит ее данные, сколько бы ни шла сборка.
+    """
+    lock_path = tmp_dir / BUILD_LOCK_FILE
+    with open(lock_path, "w") as lock_file:
+        if fcntl is not None:
+            fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            # После подмены ссылки данные уже не сироты: файл блокировки больше не нужен.
+            lock_path.unlink(missing_ok=True)
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def _build_in_progress(data_path: Path) -> bool:
+    # Блокировку держит только живая сборка: у упавшей ее снимает ОС.
+    lock_path = data_path / BUILD_LOCK_FILE
+    if fcntl is None or not lock_path.is_file():
+        return False
+    try:
+        with open(lock_path, "r") as lock_file:
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                return True
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+    except FileNotFoundError:
+        # Сборка только что завершилась и удалила файл блокировки.
+        return True
+    return False
+
+
+def _write_version(
+    vector_store: FAISS,
+    index_path: Path,
+    tmp_dir: Path,
+    embedding_model_name: str,
+    fingerprint: str,
+    extra: Optional[dict],
+    extra_files: Optional[Dict[str, str]],
+    mmap_docstore: bool
+) -> None:
+    if mmap_docstore:
+        faiss.write_index(vector_store.index, str(tmp_dir / INDEX_FILE))
+        mapping = vector_store.index_to_docstore_id
+        write_mmap_docstore(tmp_dir, (
+            (mapping[i], vector_store.docstore.search(mapping[i]))
+            for i in range(vector_store.index.ntotal)
+        ))
+    else:
+        # save_local пишет index.faiss и index.pkl (docstore + index_to_docstore_id),
+        # поэтому сохраненный индекс можно открыть и стандартным FAISS.load_local.
+        vector_store.save_local(str(tmp_dir))
+    manifest = {
+        "format_version": STORE_FORMAT_VERSION,
+        "embedding_model_name": embedding_model_name,
+        "fingerprint": fingerprint,
+        "num_vectors": vector_store.index.ntotal,
+        "dimension": vector_store.index.d,
+        "docstore": "mmap" if mmap_docstore else "pickle",
+    }
+    if extra:
+        manifest.update(extra)
+    (tmp_dir / MANIFEST_FILE).write_text(json.dumps(manifest, indent=2), encoding="utf-8")
+    for file_name, content in (extra_files or {}).items():
+        (tmp_dir / file_name).write_text(content, encoding="utf-8")
+    if (index_path / BM25_FILE).is_file() and not (tmp_dir / BM25_FILE).exists():
+        # Лексический индекс копируется в новую версию: load_or_build_bm25
+        # досинхронизирует его по диффу, а не строит заново.
+        shutil.copy2(index_path / BM25_FILE, tmp_dir / BM25_FILE)
+    _swap_version_link(index_path, tmp_dir)
+
+
+def _swap_version_link(index_path: Path, target: Path) -> None:
+    previous = index_path.resolve() if index_path.is_symlink() else None
+    if index_path.is_dir() and not index_path.is_symlink():
+        # Версия в старом формате (обычная директория): однократно переносится в .data.
+        previous = target.parent / f"{index_path.name}-{uuid.uuid4().hex[:8]}"
+        os.replace(index_path, previous)
+    link = index_path.parent / f".tmp-link-{uuid.uuid4().hex}"
+    os.symlink(Path(VERSIONS_DATA_DIR) / target.name, link)
+    os.replace(link, index_path)
+    if previous is not None and previous != target.resolve():
+        # Процессы, уже открывшие файлы прежних данных, дочитают их: на POSIX
+        # удаление не закрывает открытые файлы и отображения.
+        shutil.rmtree(previous, ignore_errors=True)
+
+
+def _remove_version(index_path: Path) -> None:
+    if index_path.is_symlink():
+        target = index_path.resolve()
+        index_path.unlink()
+        shutil.rmtree(target, ignore_errors=True)
+    else:
+        shutil.rmtree(index_path, ignore_errors=True)
+
+
+def prune_index_versions(
+    index_dir: str,
+    embedding_model_name: str,
+    keep: int = DEFAULT_KEEP_VERSIONS,
+    current: Optional[Path] = None
+) -> List[Path]:
+    """
+    Удаляет старые версии индекса модели: остаются keep самых свежих
+    (по времени записи манифеста), текущая и инкрементальная. Заодно удаляются данные,
+    на которые не ссылается ни одна версия (остатки упавших сборок); данные
+    сборки, которая еще идет (держит блокировку BUILD_LOCK_FILE), не трогаются.
+
+    Args:
+        index_dir (str): Корневая директория хранилища индексов.
+        embedding_model_name (str): Имя модели эмбеддингов.
+        keep (int, optional): Сколько самых свежих версий оставить. Defaults to 3.
+        current (Path, optional): Версия, которая остается в любом случае.
+
+    Returns:
+        List[Path]: Пути удаленных версий.
+    """
+    model_dir = Path(index_dir) / model_slug(embedding_model_name)
+    if not model_dir.is_dir():
+        return []
+    versions = []
+    for index_path in model_dir.iterdir():
+        if index_path.name.startswith("."):
+            continue
+        manifest = read_manifest(index_path)
+        if manifest is None or manifest.get("incremental"):
+            # Инкрементальный индекс — одна постоянная версия, он не ротируется.
+            continue
+        versions.append(((index_path / MANIFEST_FILE).stat().st_mtime, index_path))
+    versions.sort(reverse=True)
+    keep_paths = {path for _, path in versions[:keep]}
+    if current is not None:
+        keep_paths.add(Path(current))
+    removed = []
+    for _, index_path in versions:
+        if index_path not in keep_paths:
+            _remove_version(index_path)
+            removed.append(index_path)
+
+    data_dir = model_dir / VERSIONS_DATA_DIR
+    if data_dir.is_dir():
+        referenced = {path.resolve() for path in model_dir.iterdir() if path.is_symlink()}
+        now = time.time()
+        for data_path in data_dir.iterdir():
+            if (
+                data_path.resolve() not in referenced
+                and now - data_path.stat().st_mtime > ORPHAN_MAX_AGE_SECONDS
+                and not _build_in_progress(data_path)
+            ):
+                shutil.rmtree(data_path, ignore_errors=True)
+    if removed:
+        print(f"Удалено старых версий индекса: {len(removed)}")
+    return removed
+
+
+def read_faiss_index(index_file: Path, mmap: bool = True) -> "faiss.Index":
+    """
+    Читает индекс FAISS с диска, по возможности через memory-map.
+
+    IO_FLAG_MMAP отображает инвертированные списки IVF-индексов, а
+    IO_FLAG_MMAP_IFC (новые версии FAISS) — коды плоских индексов.
+    Не все типы индексов это поддерживают, поэтому при ошибке индекс
+    читается в память обычным способом.
+    """
+    if mmap:
+        flags = faiss.IO_FLAG_MMAP | getattr(faiss, "IO_FLAG_MMAP_IFC", 0)
+        try:
+            return faiss.read_index(str(index_file), flags)
+        except RuntimeError as e:
+            print(f"Предупреждение: memory-map недоступен для '{index_file}', читаю в память: {e}")
+    return faiss.read_index(str(index_file))
+
+
+def load_vector_store(index_path: Path, embed_model: Embeddings, mmap: bool = True) -> FAISS:
+    """
+    Открывает сохраненную версию индекса без пересчета эмбеддингов.
+
+    Args:
+        index_path (Path): Директория версии индекса.
+        embed_model (Embeddings): Модель эмбеддингов для поисковых запросов.
+        mmap (bool, optional): Открывать ли индекс (и docstore в формате
+            MmapDocstore) через memory-map. Такой индекс доступен только
+            для чтения; при False docstore загружается в память. Defaults to True.
+
+    Returns:
+        FAISS: Векторное хранилище LangChain поверх загруженного индекса.
+    """
+    # Ссылка разыменовывается один раз: если версию пересохранят во время
+    # загрузки, индекс и docstore все равно будут прочитаны из одних данных.
+    index_path = Path(index_path).resolve()
+    index = read_faiss_index(index_path / INDEX_FILE, mmap=mmap)
+    manifest = read_manifest(index_path) or {}
+    if manifest.get("docstore") == "mmap":
+        docstore = MmapDocstore(index_path)
+        index_to_docstore_id = dict(enumerate(docstore.ids))
+        if not mmap:
+            docstore = docstore.to_in_memory()
+    else:
+        # Файл docstore создается нами же в save_vector_store, поэтому pickle здесь допустим.
+        with open(index_path / DOCSTORE_FILE, "rb") as f:
+            docstore, index_to_docstore_id = pickle.load(f)
+    return FAISS(
+        embedding_function=embed_model,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=index_to_docstore_id,
+    )
+
+
+def load_or_build_vector_store(
+    documents: List[Document],
+    embed_model: Embeddings,
+    embedding_model_name: str,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    mmap: bool = True,
+    engine: Optional[EmbeddingEngine] = None,
+    index_type: str = "flat",
+    index_params: Optional[dict] = None,
+    mmap_docstore: bool = False,
+    keep_versions: Optional[int] = DEFAULT_KEEP_VERSIONS
+) -> FAISS:
+    """
+    Открывает готовый индекс, если корпус не менялся, иначе строит и сохраняет новый.
+
+    Версия индекса определяется именем модели эмбеддингов и отпечатком
+    корпуса, поэтому смена модели или любого документа приводит к
+    пересборке, а повторный запуск на тех же данных — только к открытию файла.
+
+    Args:
+        documents (List[Document]): Документы для индексации.
+        embed_model (Embeddings): Модель эмбеддингов.
+        embedding_model_name (str): Имя модели эмбеддингов (часть ключа версии).
+        index_dir (str, optional): Корневая директория хранилища индексов.
+            Defaults to "./app/index".
+        mmap (bool, optional): Открывать ли готовый индекс через memory-map.
+            Defaults to True.
+        engine (EmbeddingEngine, optional): Движок пакетного эмбеддинга для
+            сборки индекса. По умолчанию — однопроцессный с батчем 64.
+        index_type (str, optional): Тип индекса FAISS: "flat" (точный поиск),
+            "ivf", "hnsw", "ivfpq" или "pq" (приближенный), "sqfp16" или "sq8"
+            (квантованные векторы float16/int8). Defaults to "flat".
+        index_params (dict, optional): Параметры индекса: nlist, hnsw_m, pq_m
+            (построение) и nprobe, ef_search (поиск).
+        mmap_docstore (bool, optional): Хранить docstore на диске и читать его
+            через memory-map (MmapDocstore) вместо загрузки всех документов
+            в память. Defaults to False.
+        keep_versions (int, optional): Сколько версий индекса модели хранить
+            после сборки новой (см. prune_index_versions); None — не удалять
+            старые версии. Defaults to 3.
+
+    Returns:
+        FAISS: Готовое к поиску векторное хранилище.
+    """
+    index_params = index_params or {}
+    fingerprint = index_fingerprint(documents, index_type, index_params)
+    index_path = get_index_path(index_dir, embedding_model_name, fingerprint)
+    manifest = read_manifest(index_path)
+
+    if (
+        manifest is not None
+        and manifest.get("format_version") == STORE_FORMAT_VERSION
+        and manifest.get("fingerprint") == fingerprint
+        and manifest.get("embedding_model_name") == embedding_model_name
+    ):
+        if (manifest.get("docstore") == "mmap") != mmap_docstore:
+            # Формат хранения не входит в отпечаток: версия пересохраняется
+            # в нужном формате без пересчета эмбеддингов.
+            print(f"Пересохраняю индекс {index_path} в формате docstore "
+                  f"'{'mmap' if mmap_docstore else 'pickle'}'...")
+            vector_store = load_vector_store(index_path, embed_model, mmap=False)
+            save_vector_store(
+                vector_store,
+                index_path,
+                embedding_model_name,
+                fingerprint,
+                extra={key: value for key, value in manifest.items() if key != "docstore"},
+                mmap_docstore=mmap_docstore
+            )
+        print(f"Загружаю готовый индекс FAISS из {index_path}...")
+        with metrics.span("index.load"):
+            vector_store = load_vector_store(index_path, embed_model, mmap=mmap)
+        set_search_params(
+            vector_store.index,
+            nprobe=index_params.get("nprobe"),
+            ef_search=index_params.get("ef_search")
+        )
+        return vector_store
+
+    print(f"Создание векторного хранилища FAISS ({index_type}) из {len(documents)} документов...")
+    engine = engine or EmbeddingEngine(embed_model, embedding_model_name)
+    with metrics.span("index.build", index_type=index_type):
+        ids = content_ids(documents)
+        if index_type == "flat":
+            vector_store = engine.add_documents(documents, ids=ids)
+        else:
+            # Приближенные индексы сначала обучаются, поэтому нужны все векторы сразу.
+            vectors = engine.embed_matrix([document.page_content for document in documents])
+            index = build_faiss_index(vectors, index_type, index_params)
+            vector_store = vector_store_from_index(index, documents, ids, embed_model)
+    save_vector_store(
+        vector_store,
+        index_path,
+        embedding_model_name,
+        fingerprint,
+        extra={"index_type": index_type, "index_params": index_params},
+        mmap_docstore=mmap_docstore
+    )
+    print(f"Индекс сохранен в {index_path}")
+    if keep_versions is not None:
+        prune_index_versions(index_dir, embedding_model_name, keep=keep_versions, current=index_path)
+    if mmap_docstore:
+        # Документы уже на диске: отпускаем копию в памяти процесса.
+        vector_store = load_vector_store(index_path, embed_model, mmap=mmap)
+        set_search_params(
+            vector_store.index,
+            nprobe=index_params.get("nprobe"),
+            ef_search=index_params.get("ef_search")
+        )
+    return vector_store
+
+
+class _DocstoreTexts(Mapping):
+    """
+    Тексты чанков хранилища по id; текст читается из docstore только при обращении.
+    """
+
+    def __init__(self, vector_store: FAISS):
+        self._vector_store = vector_store
+        self._ids = set(vector_store.index_to_docstore_id.values())
+
+    def __getitem__(self, doc_id: str) -> str:
+        if doc_id not in self._ids:
+            raise KeyError(doc_id)
+        return self._vector_store.docstore.search(doc_id).page_content
+
+    def __contains__(self, doc_id: object) -> bool:
+        return doc_id in self._ids
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._ids)
+
+    def __len__(self) -> int:
+        return len(self._ids)
+
+
+def _previous_bm25_path(index_path: Path) -> Optional[Path]:
+    # Самый свежий BM25 другой версии индекса той же модели.
+    if not index_path.parent.is_dir():
+        return None
+    candidates = [
+        path / BM25_FILE for path in index_path.parent.iterdir()
+        if not path.name.startswith(".") and path != index_path and (path / BM25_FILE).is_file()
+    ]
+    return max(candidates, key=lambda path: path.stat().st_mtime, default=None)
+
+
+def load_or_build_bm25(index_path: Path, vector_store: FAISS) -> BM25Index:
+    """
+    Открывает лексический индекс BM25, сохраненный рядом с индексом FAISS,
+    и синхронизирует его с docstore (BM25Index.sync): тексты индексируются
+    только для новых id, исчезнувшие id удаляются. Для новой версии
+    индекса за основу берется BM25 самой свежей другой версии: id чанков
+    стабильны (content_ids), поэтому переиндексируются только изменившиеся
+    чанки. У версий, собранных до перехода на content_ids, id случайные, и
+    их BM25 строится фактически с нуля.
+
+    Args:
+        index_path (Path): Директория версии индекса.
+        vector_store (FAISS): Векторное хранилище, с которым синхронизируется BM25.
+
+    Returns:
+        BM25Index: Актуальный лексический индекс.
+    """
+    index_path = Path(index_path)
+    bm25_path = index_path / BM25_FILE
+    source_path = bm25_path if bm25_path.is_file() else _previous_bm25_path(index_path)
+    bm25 = BM25Index()
+    if source_path is not None:
+        try:
+            bm25 = BM25Index.load(source_path)
+        except (IOError, pickle.UnpicklingError, EOFError) as e:
+            print(f"Предупреждение: Не удалось прочитать индекс BM25 '{source_path}', строю заново: {e}")
+
+    added, removed = bm25.sync(_DocstoreTexts(vector_store))
+    if added or removed or not bm25_path.is_file():
+        bm25.save(bm25_path)
+        print(f"Индекс BM25 обновлен: +{added} / -{removed} документов")
+    return bm25
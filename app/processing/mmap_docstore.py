@@ -0,0 +1,91 @@
+import json
+import mmap
+from pathlib import Path
+from typing import Iterable, List, Tuple, Union
+
+import numpy as np
+from langchain_community.docstore.base import Docstore
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+
+DOCSTORE_DATA_FILE = "docstore.bin"
+DOCSTORE_OFFSETS_FILE = "docstore_offsets.npy"
+DOCSTORE_IDS_FILE = "docstore_ids.json"
+
+
+def write_mmap_docstore(directory: Path, items: Iterable[Tuple[str, Document]]) -> int:
+    """
+    Записывает документы в формате MmapDocstore.
+
+    Каждый документ хранится записью JSON [page_content, metadata] в общем
+    файле docstore.bin; границы записей — в массиве смещений, id — в
+    отдельном списке в том же порядке (порядке векторов индекса).
+
+    Args:
+        directory (Path): Директория версии индекса.
+        items (Iterable[Tuple[str, Document]]): Пары (id, документ). Читаются
+            по одной, поэтому весь корпус в памяти не собирается.
+
+    Returns:
+        int: Число записанных документов.
+    """
+    directory = Path(directory)
+    ids: List[str] = []
+    offsets = [0]
+    with open(directory / DOCSTORE_DATA_FILE, "wb") as f:
+        for doc_id, document in items:
+            record = json.dumps([document.page_content, document.metadata], ensure_ascii=False).encode("utf-8")
+            f.write(record)
+            offsets.append(offsets[-1] + len(record))
+            ids.append(doc_id)
+    np.save(directory / DOCSTORE_OFFSETS_FILE, np.asarray(offsets, dtype=np.int64))
+    (directory / DOCSTORE_IDS_FILE).write_text(json.dumps(ids), encoding="utf-8")
+    return len(ids)
+
+
+class MmapDocstore(Docstore):
+    """
+    Docstore только для чтения поверх memory-map файла на диске.
+
+    Тексты и метаданные чанков не загружаются в память процесса: файл
+    отображается через mmap, и Document создается лениво при обращении
+    по id. Страницы файла лежат в page cache ОС, поэтому несколько
+    процессов сервиса, открывших одну версию индекса, делят одну копию.
+
+    Args:
+        directory (Path): Директория, куда docstore записан write_mmap_docstore.
+    """
+
+    def __init__(self, directory: Path):
+        directory = Path(directory)
+        self.directory = directory
+        self.ids: List[str] = json.loads((directory / DOCSTORE_IDS_FILE).read_text(encoding="utf-8"))
+        self._positions = {doc_id: i for i, doc_id in enumerate(self.ids)}
+        self._offsets = np.load(directory / DOCSTORE_OFFSETS_FILE, mmap_mode="r")
+        with open(directory / DOCSTORE_DATA_FILE, "rb") as f:
+            # mmap не умеет отображать пустой файл.
+            self._data = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) if self.ids else b""
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def __contains__(self, doc_id: str) -> bool:
+        return doc_id in self._positions
+
+    def search(self, search: str) -> Union[str, Document]:
+        """
+        Возвращает документ по id или, как InMemoryDocstore, строку-сообщение, если его нет.
+        """
+        position = self._positions.get(search)
+        if position is None:
+            return f"ID {search} not found."
+        start, end = int(self._offsets[position]), int(self._offsets[position + 1])
+        page_content, metadata = json.loads(self._data[start:end].decode("utf-8"))
+        return Document(id=search, page_content=page_content, metadata=metadata)
+
+    def to_in_memory(self) -> InMemoryDocstore:
+        """
+        Загружает все документы в изменяемый InMemoryDocstore
+        (например, для инкрементального обновления индекса).
+        """
+        return InMemoryDocstore({doc_id: self.search(doc_id) for doc_id in self.ids})
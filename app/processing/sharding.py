@@ -0,0 +1,216 @@
+import json
+import os
+import tempfile
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence
+from urllib.parse import urlsplit
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+
+from app.processing.dedup import deduplicate_chunks
+from app.processing.embedding_engine import EmbeddingEngine
+from app.processing.index_store import (
+    DEFAULT_INDEX_DIR,
+    get_index_path,
+    index_fingerprint,
+    load_or_build_vector_store,
+    load_vector_store,
+    prune_index_versions,
+)
+from app.utils import metrics
+from app.utils.paths import model_slug
+
+SHARD_BY = ("host", "prefix")
+SHARDS_DIR = "shards"
+UNKNOWN_SHARD = "_unknown"
+
+
+def shard_key(url: Optional[str], shard_by: str = "host", prefixes: Sequence[str] = ()) -> str:
+    """
+    Определяет шард страницы по ее адресу.
+
+    Args:
+        url (str, optional): Адрес страницы (metadata["source"] чанка).
+        shard_by (str, optional): "host" — шард на каждый сайт; "prefix" —
+            на каждый префикс URL из prefixes (например, адреса из PAGES_URLS),
+            при нескольких подходящих берется самый длинный. Страницы вне
+            всех префиксов попадают в шард своего хоста. Defaults to "host".
+        prefixes (Sequence[str], optional): Префиксы URL для shard_by="prefix".
+
+    Returns:
+        str: Имя шарда.
+
+    Raises:
+        ValueError: Если shard_by неизвестен.
+    """
+    if shard_by not in SHARD_BY:
+        raise ValueError(f"Неизвестный способ шардирования '{shard_by}'. Допустимые: {', '.join(SHARD_BY)}.")
+    if not url:
+        return UNKNOWN_SHARD
+    if shard_by == "prefix":
+        matches = [prefix for prefix in prefixes if url.startswith(prefix)]
+        if matches:
+            return max(matches, key=len)
+    return urlsplit(url).netloc or UNKNOWN_SHARD
+
+
+def group_by_shard(
+    documents: List[Document],
+    shard_by: str = "host",
+    prefixes: Sequence[str] = ()
+) -> Dict[str, List[Document]]:
+    """
+    Раскладывает чанки по шардам, сохраняя их порядок внутри шарда.
+    """
+    groups: Dict[str, List[Document]] = {}
+    for document in documents:
+        key = shard_key(document.metadata.get("source"), shard_by, prefixes)
+        groups.setdefault(key, []).append(document)
+    return groups
+
+
+def get_shard_index_dir(index_dir: str, shard: str) -> Path:
+    """
+    Корневая директория хранилища версий одного шарда.
+    """
+    return Path(index_dir) / SHARDS_DIR / model_slug(shard)
+
+
+def _shards_manifest_path(index_dir: str, embedding_model_name: str) -> Path:
+    return Path(index_dir) / SHARDS_DIR / f"{model_slug(embedding_model_name)}.json"
+
+
+def read_shards_manifest(index_dir: str, embedding_model_name: str) -> Dict[str, str]:
+    """
+    Читает список шардов (имя шарда -> путь к его текущей версии индекса).
+    """
+    manifest_path = _shards_manifest_path(index_dir, embedding_model_name)
+    if not manifest_path.is_file():
+        return {}
+    try:
+        return json.loads(manifest_path.read_text(encoding="utf-8"))
+    except (IOError, ValueError) as e:
+        print(f"Предупреждение: Не удалось прочитать список шардов '{manifest_path}': {e}")
+        return {}
+
+
+def _write_shards_manifest(index_dir: str, embedding_model_name: str, shards: Dict[str, str]) -> None:
+    manifest_path = _shards_manifest_path(index_dir, embedding_model_name)
+    manifest_path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_name = tempfile.mkstemp(prefix=".tmp-", dir=manifest_path.parent)
+    with os.fdopen(fd, "w", encoding="utf-8") as f:
+        json.dump(shards, f, indent=2, ensure_ascii=False)
+    os.replace(tmp_name, manifest_path)
+
+
+def load_or_build_shards(
+    documents: List[Document],
+    embed_model: Embeddings,
+    embedding_model_name: str,
+    index_dir: str = DEFAULT_INDEX_DIR,
+    shard_by: str = "host",
+    prefixes: Sequence[str] = (),
+    mmap: bool = True,
+    engine: Optional[EmbeddingEngine] = None,
+    index_type: str = "flat",
+    index_params: Optional[dict] = None,
+    mmap_docstore: bool = False,
+    deduplicate: bool = True,
+    prune_missing: bool = True
+) -> Dict[str, FAISS]:
+    """
+    Открывает или строит отдельный индекс FAISS для каждого шарда.
+
+    Каждый шард версионируется своим отпечатком (см.
+    load_or_build_vector_store), поэтому изменения на одном сайте
+    пересобирают только его шард. Дедупликация тоже идет внутри шарда:
+    иначе удаление общего текста с одного сайта сделало бы каноном копию
+    на другом и пересобрало бы чужой шард.
+
+    Шарды, чанков которых нет в documents (сайт пропал из обхода),
+    удаляются из списка шардов вместе с их версиями индекса. Чтобы
+    переиндексировать один сайт, передав только его чанки, нужно
+    выключить prune_missing: остальные шарды останутся как есть.
+
+    Args:
+        documents (List[Document]): Чанки с адресом страницы в metadata["source"].
+        embed_model (Embeddings): Модель эмбеддингов.
+        embedding_model_name (str): Имя модели эмбеддингов.
+        index_dir (str, optional): Корневая директория хранилища индексов.
+            Defaults to "./app/index".
+        shard_by (str, optional): "host" или "prefix" (см. shard_key). Defaults to "host".
+        prefixes (Sequence[str], optional): Префиксы URL для shard_by="prefix".
+        mmap (bool, optional): Открывать готовые индексы через memory-map. Defaults to True.
+        engine (EmbeddingEngine, optional): Движок пакетного эмбеддинга.
+        index_type (str, optional): Тип индекса FAISS каждого шарда. Defaults to "flat".
+        index_params (dict, optional): Параметры индекса.
+        mmap_docstore (bool, optional): Хранить docstore шардов в формате MmapDocstore.
+        deduplicate (bool, optional): Удалять дубли чанков внутри каждого шарда.
+            Defaults to True.
+        prune_missing (bool, optional): Удалять шарды, которых нет в documents.
+            Defaults to True.
+
+    Returns:
+        Dict[str, FAISS]: Все шарды из списка шардов по именам — те же, что
+            открывает load_shards.
+
+    Raises:
+        ValueError: Если список документов пуст.
+    """
+    if not documents:
+        raise ValueError("Нет документов для индексации.")
+    index_params = index_params or {}
+    groups = group_by_shard(documents, shard_by, prefixes)
+    shard_paths = read_shards_manifest(index_dir, embedding_model_name)
+    shards: Dict[str, FAISS] = {}
+    for shard, shard_documents in groups.items():
+        shard_index_dir = get_shard_index_dir(index_dir, shard)
+        if deduplicate:
+            shard_documents = deduplicate_chunks(shard_documents)
+        print(f"Шард '{shard}': {len(shard_documents)} чанков")
+        with metrics.span("index.shard", shard=shard):
+            shards[shard] = load_or_build_vector_store(
+                shard_documents,
+                embed_model,
+                embedding_model_name=embedding_model_name,
+                index_dir=str(shard_index_dir),
+                mmap=mmap,
+                engine=engine,
+                index_type=index_type,
+                index_params=index_params,
+                mmap_docstore=mmap_docstore
+            )
+        fingerprint = index_fingerprint(shard_documents, index_type, index_params)
+        shard_paths[shard] = str(get_index_path(str(shard_index_dir), embedding_model_name, fingerprint))
+
+    stale = [shard for shard in shard_paths if shard not in groups]
+    for shard in stale:
+        if prune_missing:
+            del shard_paths[shard]
+        else:
+            shards[shard] = load_vector_store(Path(shard_paths[shard]), embed_model, mmap=mmap)
+    _write_shards_manifest(index_dir, embedding_model_name, shard_paths)
+    if prune_missing:
+        # Версии удаляются после записи списка: он больше на них не ссылается.
+        for shard in stale:
+            print(f"Шард '{shard}' больше не встречается в корпусе, удаляю его индекс")
+            prune_index_versions(str(get_shard_index_dir(index_dir, shard)), embedding_model_name, keep=0)
+    return shards
+
+
+def load_shards(index_dir: str, embed_model: Embeddings, embedding_model_name: str, mmap: bool = True) -> Dict[str, FAISS]:
+    """
+    Открывает текущие версии всех шардов из списка шардов.
+
+    Raises:
+        FileNotFoundError: Если шардов для модели еще нет.
+    """
+    shard_paths = read_shards_manifest(index_dir, embedding_model_name)
+    if not shard_paths:
+        raise FileNotFoundError(f"В '{index_dir}' нет шардов для модели '{embedding_model_name}'.")
+    return {
+        shard: load_vector_store(Path(index_path), embed_model, mmap=mmap)
+        for shard, index_path in shard_paths.items()
+    }
@@ -1,12 +1,49 @@
-from typing import List, Tuple
+import json
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import lru_cache, partial
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
 from langchain.docstore.document import Document
 from langchain_text_splitters import HTMLHeaderTextSplitter # Примечание: Используем стандартный HTMLHeaderTextSplitter
-from utils.html_loader import get_file_contents_from_folder
+from app.processing.token_splitter import (
+    DEFAULT_MAX_CHUNK_TOKENS,
+    DEFAULT_TOKENIZER_MODEL,
+    chunk_length_report,
+    split_by_token_limit,
+)
+from app.utils import metrics
+from app.utils.html_loader import iter_files_in_folder, read_file_content
+from app.utils.paths import filename_to_url
+
+DEFAULT_SPLIT_CACHE_PATH = "./app/cache/split_cache.json"
+DEFAULT_HEADERS_TO_SPLIT_ON = [
+    ("h1", "Header 1"),
+    ("h2", "Header 2"),
+    ("h3", "Header 3"),
+    ("h4", "Header 4"),
+    ("h5", "Header 5"),
+]
+
+@lru_cache(maxsize=8)
+def _get_html_splitter(
+    headers_to_split_on: Tuple[Tuple[str, str], ...],
+    max_chunk_size: int
+) -> HTMLHeaderTextSplitter:
+    # Кэш живет в каждом процессе отдельно, поэтому воркер пула
+    # создает сплиттер один раз и переиспользует его для всех своих страниц.
+    return HTMLHeaderTextSplitter(
+        headers_to_split_on=list(headers_to_split_on),
+        max_chunk_size=max_chunk_size
+    )
+
 
 def splitter_func(
     html_string: str,
     max_chunk_size: int = 500,
-    headers_to_split_on: List[Tuple[str, str]] = None
+    headers_to_split_on: List[Tuple[str, str]] = None,
+    max_chunk_tokens: Optional[int] = None,
+    tokenizer_model: str = DEFAULT_TOKENIZER_MODEL
 ) -> List[Document]:
     """
     Разделяет HTML-строку на семантические чанки на основе заголовков.
@@ -24,51 +61,201 @@ def splitter_func(
         headers_to_split_on (List[Tuple[str, str]], optional): Список
             кортежей, определяющих, по каким тегам заголовков выполнять
             разделение и как называть их в метаданных. Defaults to h1-h5.
+        max_chunk_tokens (int, optional): Если задан, чанки длиннее этого
+            числа токенов (по токенизатору модели эмбеддингов) дополнительно
+            делятся с перекрытием, см. enforce_token_limit. Defaults to None.
+        tokenizer_model (str, optional): Модель эмбеддингов, чьим токенизатором
+            меряется max_chunk_tokens. Defaults to 'all-MiniLM-L6-v2'.
 
     Returns:
         List[Document]: Список объектов Document, где каждый объект содержит
                         часть текста (page_content) и метаданные с иерархией
                         заголовков (metadata).
     """
+    return _split_html(html_string, max_chunk_size, headers_to_split_on, max_chunk_tokens, tokenizer_model)[0]
+
+
+def _split_html(
+    html_string: str,
+    max_chunk_size: int = 500,
+    headers_to_split_on: List[Tuple[str, str]] = None,
+    max_chunk_tokens: Optional[int] = None,
+    tokenizer_model: str = DEFAULT_TOKENIZER_MODEL
+) -> Tuple[List[Document], Optional[List[int]]]:
+    # splitter_func вместе с длинами чанков в токенах (None без бюджета токенов).
     if headers_to_split_on is None:
-        headers_to_split_on = [
-            ("h1", "Header 1"),
-            ("h2", "Header 2"),
-            ("h3", "Header 3"),
-            ("h4", "Header 4"),
-            ("h5", "Header 5"),
-        ]
-
-    # Инициализируем сплиттер
-    # HTMLHeaderTextSplitter является стандартным и эффективным решением
-    # для этой задачи в LangChain.
-    html_splitter = HTMLHeaderTextSplitter(
-        headers_to_split_on=headers_to_split_on,
-        max_chunk_size=max_chunk_size
-    )
+        headers_to_split_on = DEFAULT_HEADERS_TO_SPLIT_ON
+
+    # Берем сплиттер из кэша процесса: HTMLHeaderTextSplitter является стандартным
+    # и эффективным решением для этой задачи в LangChain, но создавать его
+    # заново для каждой страницы незачем.
+    html_splitter = _get_html_splitter(tuple(map(tuple, headers_to_split_on)), max_chunk_size)
 
     # Выполняем разделение
     # Метод .split_text() принимает строку с HTML
     html_header_splits = html_splitter.split_text(html_string)
 
-    # Примечание: HTMLHeaderTextSplitter сам по себе не имеет chunk_size.
-    # Для дальнейшего разделения крупных чанков можно использовать
-    # RecursiveCharacterTextSplitter поверх этого результата.
-    # Пример:
-    # from langchain_text_splitters import RecursiveCharacterTextSplitter
-    # text_splitter = RecursiveCharacterTextSplitter(chunk_size=max_chunk_size, chunk_overlap=30)
-    # splits = text_splitter.split_documents(html_header_splits)
-    # return splits
+    # Примечание: HTMLHeaderTextSplitter сам по себе не ограничивает размер чанка,
+    # поэтому крупные разделы дополнительно режутся по бюджету токенов.
+    if max_chunk_tokens is not None:
+        return split_by_token_limit(html_header_splits, max_tokens=max_chunk_tokens, model_name=tokenizer_model)
+
+    return html_header_splits, None
+
+
+def _load_split_cache(cache_path: Optional[str]) -> Dict[str, dict]:
+    if cache_path is None or not Path(cache_path).is_file():
+        return {}
+    try:
+        return json.loads(Path(cache_path).read_text(encoding="utf-8"))
+    except (IOError, ValueError) as e:
+        print(f"Предупреждение: Не удалось прочитать кэш разбиения '{cache_path}': {e}")
+        return {}
+
+
+def _save_split_cache(cache_path: Optional[str], cache: Dict[str, dict]) -> None:
+    if cache_path is None:
+        return
+    path = Path(cache_path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    tmp_path = path.with_suffix(".tmp")
+    tmp_path.write_text(json.dumps(cache, ensure_ascii=False), encoding="utf-8")
+    os.replace(tmp_path, path)
+
 
-    return html_header_splits
+def _split_params(
+    headers_to_split_on: List[Tuple[str, str]],
+    max_chunk_tokens: Optional[int],
+    tokenizer_model: str
+) -> dict:
+    # Параметры, от которых зависят чанки файла: запись кэша с другими параметрами недействительна.
+    return {
+        "headers_to_split_on": [list(pair) for pair in headers_to_split_on],
+        "max_chunk_tokens": max_chunk_tokens,
+        "tokenizer_model": tokenizer_model if max_chunk_tokens is not None else None,
+    }
 
 
-def split_html_with_headers(folder_path):
-    html_pages = get_file_contents_from_folder(folder_path)
+def _split_file(
+    file_path: Path,
+    max_chunk_tokens: Optional[int] = None,
+    headers_to_split_on: List[Tuple[str, str]] = DEFAULT_HEADERS_TO_SPLIT_ON,
+    tokenizer_model: str = DEFAULT_TOKENIZER_MODEL
+) -> Optional[dict]:
+    """
+    Читает и разбивает один файл. Выполняется в воркере пула процессов,
+    поэтому файл читается уже в воркере, а не в родительском процессе.
+    """
+    stat = file_path.stat()
+    html_page = read_file_content(file_path)
+    if html_page is None:
+        return None
+    documents, token_counts = _split_html(
+        html_string=html_page,
+        headers_to_split_on=headers_to_split_on,
+        max_chunk_tokens=max_chunk_tokens,
+        tokenizer_model=tokenizer_model
+    )
+    return {
+        "mtime_ns": stat.st_mtime_ns,
+        "size": stat.st_size,
+        **_split_params(headers_to_split_on, max_chunk_tokens, tokenizer_model),
+        "chunks": [[document.page_content, document.metadata] for document in documents],
+        "tokens": token_counts,
+    }
+
+
+def split_html_with_headers(
+    folder_path: str,
+    cache_path: Optional[str] = DEFAULT_SPLIT_CACHE_PATH,
+    workers: Optional[int] = None,
+    dispatch_chunksize: int = 8,
+    max_chunk_tokens: Optional[int] = DEFAULT_MAX_CHUNK_TOKENS,
+    headers_to_split_on: Optional[List[Tuple[str, str]]] = None,
+    tokenizer_model: str = DEFAULT_TOKENIZER_MODEL
+) -> List[Document]:
+    """
+    Разбивает все HTML-файлы папки на чанки.
+
+    Файлы перечисляются лениво и читаются только там, где разбираются.
+    Чанки каждого файла кэшируются по (mtime, размер) вместе с параметрами
+    разбиения (заголовки, бюджет токенов, токенизатор): файлы, которые не
+    перезаписывались (например, страницы, ответившие краулеру 304),
+    повторно не разбираются. Остальные файлы распределяются по пулу
+    процессов порциями по dispatch_chunksize; результат не зависит от
+    числа воркеров и всегда упорядочен по именам файлов.
+
+    Args:
+        folder_path (str): Папка с HTML-файлами.
+        cache_path (str, optional): JSON-файл кэша разбиения; None отключает кэш.
+            Defaults to "./app/cache/split_cache.json".
+        workers (int, optional): Число процессов; по умолчанию — число ядер.
+            1 — разбирать в текущем процессе.
+        dispatch_chunksize (int, optional): Сколько файлов отправлять воркеру
+            за раз. Defaults to 8.
+        max_chunk_tokens (int, optional): Бюджет токенов на чанк; None —
+            не ограничивать. Defaults to 256.
+        headers_to_split_on (List[Tuple[str, str]], optional): Теги заголовков
+            для разбиения (см. splitter_func). Defaults to h1-h5.
+        tokenizer_model (str, optional): Модель эмбеддингов, чьим токенизатором
+            меряется max_chunk_tokens. Defaults to 'all-MiniLM-L6-v2'.
+
+    Returns:
+        List[Document]: Чанки всех страниц в порядке имен файлов; в
+                        metadata["source"] записан адрес страницы.
+    """
+    headers_to_split_on = headers_to_split_on or DEFAULT_HEADERS_TO_SPLIT_ON
+    params = _split_params(headers_to_split_on, max_chunk_tokens, tokenizer_model)
+    cache = _load_split_cache(cache_path)
+    entries: Dict[str, Optional[dict]] = {}
+    to_split: List[Path] = []
+
+    for file_path in iter_files_in_folder(folder_path):
+        stat = file_path.stat()
+        entry = cache.get(file_path.name)
+        if (entry
+                and entry["mtime_ns"] == stat.st_mtime_ns
+                and entry["size"] == stat.st_size
+                and all(entry.get(key) == value for key, value in params.items())):
+            entries[file_path.name] = entry
+        else:
+            entries[file_path.name] = None
+            to_split.append(file_path)
+
+    metrics.inc("split_files", len(entries) - len(to_split), source="cache")
+    metrics.inc("split_files", len(to_split), source="parsed")
+    split_file = partial(
+        _split_file,
+        max_chunk_tokens=max_chunk_tokens,
+        headers_to_split_on=headers_to_split_on,
+        tokenizer_model=tokenizer_model
+    )
+    workers = workers or os.cpu_count() or 1
+    with metrics.span("split", workers=workers):
+        if workers > 1 and len(to_split) > 1:
+            with ProcessPoolExecutor(max_workers=min(workers, len(to_split))) as pool:
+                # map сохраняет порядок входа независимо от того, какой воркер закончил первым.
+                split_results = list(pool.map(split_file, to_split, chunksize=dispatch_chunksize))
+        else:
+            split_results = [split_file(file_path) for file_path in to_split]
+    for file_path, entry in zip(to_split, split_results):
+        entries[file_path.name] = entry
+
+    new_cache: Dict[str, dict] = {}
     all_pages_html_documents = []
+    token_counts: List[int] = []
+    for file_name, entry in entries.items():
+        if entry is None:
+            continue
+        new_cache[file_name] = entry
+        # Адрес страницы восстанавливается из имени файла (см. url_to_filename).
+        source = filename_to_url(file_name)
+        all_pages_html_documents += [Document(page_content=content, metadata={**metadata, "source": source})
+                                     for content, metadata in entry["chunks"]]
+        token_counts += entry.get("tokens") or []
 
-    for html_page in html_pages:
-        html_documents = splitter_func(html_string=html_page)
-        all_pages_html_documents += html_documents
-    
-    return all_pages_html_documents
\ No newline at end of file
+    _save_split_cache(cache_path, new_cache)
+    metrics.inc("split_chunks", len(all_pages_html_documents))
+    if max_chunk_tokens is not None:
+        print(f"Распределение длин чанков (токены): {chunk_length_report(token_counts)}")
+    return all_pages_html_documents
@@ -0,0 +1,136 @@
+from functools import lru_cache
+from typing import TYPE_CHECKING, List, Tuple
+
+from langchain_core.documents import Document
+from langchain_text_splitters import RecursiveCharacterTextSplitter
+
+if TYPE_CHECKING:
+    from transformers import PreTrainedTokenizerBase
+
+DEFAULT_TOKENIZER_MODEL = 'all-MiniLM-L6-v2'
+# all-MiniLM-L6-v2 обрезает вход после 256 токенов: все, что длиннее, модель просто не увидит.
+DEFAULT_MAX_CHUNK_TOKENS = 256
+DEFAULT_CHUNK_OVERLAP_TOKENS = 32
+
+
+@lru_cache(maxsize=4)
+def get_tokenizer(model_name: str = DEFAULT_TOKENIZER_MODEL) -> "PreTrainedTokenizerBase":
+    """
+    Загружает (один раз на процесс) токенизатор модели эмбеддингов.
+
+    Короткие имена Sentence Transformers ("all-MiniLM-L6-v2") дополняются
+    префиксом "sentence-transformers/", как это делает сама библиотека.
+    """
+    # Импорт здесь: transformers нужен, только когда чанки ограничиваются по токенам.
+    from transformers import AutoTokenizer
+
+    hub_name = model_name if "/" in model_name else f"sentence-transformers/{model_name}"
+    return AutoTokenizer.from_pretrained(hub_name)
+
+
+def count_tokens(text: str, model_name: str = DEFAULT_TOKENIZER_MODEL) -> int:
+    """
+    Считает токены текста токенизатором модели эмбеддингов (без служебных токенов).
+    """
+    return len(get_tokenizer(model_name).encode(text, add_special_tokens=False))
+
+
+@lru_cache(maxsize=8)
+def _get_token_splitter(model_name: str, max_tokens: int, overlap_tokens: int) -> RecursiveCharacterTextSplitter:
+    return RecursiveCharacterTextSplitter.from_huggingface_tokenizer(
+        get_tokenizer(model_name),
+        chunk_size=max_tokens,
+        chunk_overlap=overlap_tokens
+    )
+
+
+def enforce_token_limit(
+    documents: List[Document],
+    max_tokens: int = DEFAULT_MAX_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_CHUNK_OVERLAP_TOKENS,
+    model_name: str = DEFAULT_TOKENIZER_MODEL
+) -> List[Document]:
+    """
+    Второй этап разбиения: режет чанки длиннее бюджета токенов.
+
+    HTMLHeaderTextSplitter не ограничивает размер чанка, поэтому большие
+    разделы страницы становятся огромными чанками. Здесь такие чанки
+    делятся RecursiveCharacterTextSplitter по границам абзацев/предложений,
+    а длина меряется токенизатором модели эмбеддингов, а не символами.
+    Метаданные заголовков копируются в каждый под-чанк, а его порядковый
+    номер внутри раздела записывается в metadata["part"].
+
+    Args:
+        documents (List[Document]): Чанки после разбиения по заголовкам.
+        max_tokens (int, optional): Максимальный размер чанка в токенах.
+            Defaults to 256.
+        overlap_tokens (int, optional): Перекрытие соседних под-чанков в токенах.
+            Defaults to 32.
+        model_name (str, optional): Модель, чей токенизатор используется.
+            Defaults to 'all-MiniLM-L6-v2'.
+
+    Returns:
+        List[Document]: Чанки, каждый не длиннее max_tokens токенов
+                        (кроме неделимых фрагментов).
+    """
+    return split_by_token_limit(documents, max_tokens, overlap_tokens, model_name)[0]
+
+
+def split_by_token_limit(
+    documents: List[Document],
+    max_tokens: int = DEFAULT_MAX_CHUNK_TOKENS,
+    overlap_tokens: int = DEFAULT_CHUNK_OVERLAP_TOKENS,
+    model_name: str = DEFAULT_TOKENIZER_MODEL
+) -> Tuple[List[Document], List[int]]:
+    """
+    То же, что enforce_token_limit, но вместе с длиной каждого итогового
+    чанка в токенах: длина, посчитанная для решения о разбиении, используется
+    повторно, и для статистики чанки заново не токенизируются.
+
+    Returns:
+        Tuple[List[Document], List[int]]: Чанки и их длины в токенах.
+
+    Raises:
+        ValueError: Если overlap_tokens не меньше max_tokens.
+    """
+    if overlap_tokens >= max_tokens:
+        raise ValueError("overlap_tokens должен быть меньше max_tokens.")
+
+    splitter = _get_token_splitter(model_name, max_tokens, overlap_tokens)
+    result: List[Document] = []
+    token_counts: List[int] = []
+    for document in documents:
+        tokens = count_tokens(document.page_content, model_name)
+        if tokens <= max_tokens:
+            result.append(document)
+            token_counts.append(tokens)
+        else:
+            parts = splitter.split_documents([document])
+            # Номер части нужен, чтобы при сборке контекста склеить соседние под-чанки.
+            for part, sub_document in enumerate(parts):
+                sub_document.metadata["part"] = part
+                token_counts.append(count_tokens(sub_document.page_content, model_name))
+            result.extend(parts)
+    return result, token_counts
+
+
+def chunk_length_report(token_counts: List[int]) -> dict:
+    """
+    Сводка распределения длин чанков в токенах: min / mean / p50 / p90 / p99 / max.
+    """
+    if not token_counts:
+        return {"count": 0}
+    ordered = sorted(token_counts)
+
+    def percentile(q: float) -> int:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "min": ordered[0],
+        "mean": sum(ordered) / len(ordered),
+        "p50": percentile(0.5),
+        "p90": percentile(0.9),
+        "p99": percentile(0.99),
+        "max": ordered[-1],
+    }
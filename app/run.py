@@ -1,10 +1,171 @@
-from llm.rag_chain import create_rag_chain
-from llm.qa_rag import get_qa_answer
-from processing.splitter import split_html_with_headers
-from ingestion.dowload_html import save_to_html
-
-if __name__=='__main__'():
-    save_to_html()
-    documents = split_html_with_headers(folder_path='./app/data/')
-    rag_chain = create_rag_chain(documents)
-    
\ No newline at end of file
+import argparse
+import sys
+from typing import List, Optional
+
+from app.utils import metrics
+
+# Тяжелые зависимости (LangChain, sentence-transformers/torch, FAISS, клиент
+# OpenAI, Playwright, aiohttp) импортируются внутри подкоманд: `--help` и
+# команды, которым они не нужны, стартуют без них.
+
+EMBEDDING_MODEL_NAME = 'all-MiniLM-L6-v2'
+LLM_MODEL_NAME = "openai/gpt-4o-mini"
+DEFAULT_DATA_DIR = './app/data/'
+DEFAULT_INDEX_DIR = "./app/index"  # как в index_store, который тянет FAISS
+
+
+def cmd_crawl(args: argparse.Namespace) -> int:
+    """
+    Скачивает страницы из PAGES_URLS и сохраняет их HTML.
+    """
+    from app.ingestion.dowload_html import save_to_html
+
+    saved = save_to_html(output_dir=args.output_dir, concurrency=args.concurrency)
+    print(f"Сохранено (изменено) страниц: {len(saved)}")
+    return 0
+
+
+def cmd_index(args: argparse.Namespace) -> int:
+    """
+    Строит индекс потоковым пайплайном: загрузка, разбиение, эмбеддинг и
+    индексация идут одновременно, без промежуточных списков всего корпуса в памяти.
+    """
+    from app.ingestion.dowload_html import get_target_urls
+    from app.pipeline import run_streaming_pipeline
+    from app.processing.embedding_cache import get_embedding_model
+
+    urls = get_target_urls()
+    if not urls:
+        print("Переменная окружения PAGES_URLS пуста: нечего индексировать.", file=sys.stderr)
+        return 1
+    embed_model = get_embedding_model(args.embedding_model)
+    _, stats = run_streaming_pipeline(
+        urls,
+        embed_model,
+        args.embedding_model,
+        output_dir=args.output_dir,
+        index_dir=args.index_dir,
+        concurrency=args.concurrency
+    )
+    print(f"Индекс построен: {stats}")
+    return 0
+
+
+def cmd_ask(args: argparse.Namespace) -> int:
+    """
+    Отвечает на вопрос по самой свежей сохраненной версии индекса,
+    печатая ответ по мере генерации.
+    """
+    from app.processing.index_store import find_latest_index
+    from app.processing.sharding import read_shards_manifest
+
+    if args.shards:
+        index_path = None
+        if not read_shards_manifest(args.index_dir, args.embedding_model):
+            print(f"В '{args.index_dir}' нет шардов для модели '{args.embedding_model}'.", file=sys.stderr)
+            return 1
+    else:
+        index_path = find_latest_index(args.index_dir, args.embedding_model)
+        if index_path is None:
+            print(f"В '{args.index_dir}' нет готового индекса для модели '{args.embedding_model}'. "
+                  f"Сначала выполните команду index.", file=sys.stderr)
+            return 1
+
+    from app.llm.qa_rag import stream_qa_answer
+    from app.llm.rag_chain import build_retriever, close_retriever, create_qa_chain
+    from app.processing.embedding_cache import get_embedding_model
+    from app.processing.index_store import load_or_build_bm25, load_vector_store
+    from app.processing.sharding import load_shards
+
+    embed_model = get_embedding_model(args.embedding_model)
+    shards = load_shards(args.index_dir, embed_model, args.embedding_model) if args.shards else None
+    vector_store = next(iter(shards.values())) if shards else load_vector_store(index_path, embed_model)
+    retriever = build_retriever(
+        vector_store,
+        embed_model,
+        bm25=load_or_build_bm25(index_path, vector_store) if args.hybrid else None,
+        rerank=args.rerank,
+        max_context_tokens=args.max_context_tokens,
+        llm_model_name=args.llm_model,
+        shards=shards
+    )
+    chain = create_qa_chain(vector_store, llm_model_name=args.llm_model, retriever=retriever)
+    try:
+        for question in args.questions:
+            for token in stream_qa_answer(chain, question):
+                print(token, end="", flush=True)
+            print()
+    finally:
+        close_retriever(retriever)
+    return 0
+
+
+def cmd_serve(args: argparse.Namespace) -> int:
+    """
+    Запускает HTTP-сервис (параметры — как у app.interface.server).
+    """
+    from app.interface.server import main as serve_main
+
+    serve_main(args.server_args)
+    return 0
+
+
+def build_parser() -> argparse.ArgumentParser:
+    parser = argparse.ArgumentParser(
+        prog="python -m app.run",
+        description="Вопросы и ответы по сайту ИТМО: загрузка страниц, индексация, ответы и HTTP-сервис."
+    )
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    crawl = subparsers.add_parser("crawl", help="Скачать страницы из PAGES_URLS.")
+    crawl.add_argument("--output-dir", default=DEFAULT_DATA_DIR)
+    crawl.add_argument("--concurrency", type=int, default=8, help="Число одновременно загружаемых страниц.")
+    crawl.set_defaults(handler=cmd_crawl)
+
+    index = subparsers.add_parser("index", help="Скачать страницы и построить индекс.")
+    index.add_argument("--output-dir", default=DEFAULT_DATA_DIR, help="Куда также сохранить HTML страниц.")
+    index.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    index.add_argument("--embedding-model", default=EMBEDDING_MODEL_NAME)
+    index.add_argument("--concurrency", type=int, default=8, help="Число одновременно загружаемых страниц.")
+    index.set_defaults(handler=cmd_index)
+
+    ask = subparsers.add_parser("ask", help="Ответить на вопросы по готовому индексу.")
+    ask.add_argument("questions", nargs="+", metavar="question")
+    ask.add_argument("--index-dir", default=DEFAULT_INDEX_DIR)
+    ask.add_argument("--embedding-model", default=EMBEDDING_MODEL_NAME)
+    ask.add_argument("--llm-model", default=LLM_MODEL_NAME)
+    ask.add_argument("--hybrid", action="store_true", help="Гибридный поиск FAISS + BM25.")
+    ask.add_argument("--rerank", action="store_true", help="Переранжирование кросс-энкодером.")
+    ask.add_argument("--shards", action="store_true", help="Искать параллельно по шардам индекса.")
+    ask.add_argument("--max-context-tokens", type=int, default=None,
+                     help="Бюджет контекста в токенах LLM (например, 2000); по умолчанию не ограничен.")
+    ask.set_defaults(handler=cmd_ask)
+
+    # Аргументы serve (включая --help) разбирает сам app.interface.server.
+    serve = subparsers.add_parser("serve", help="Запустить HTTP-сервис.", add_help=False)
+    serve.set_defaults(handler=cmd_serve)
+    return parser
+
+
+def parse_args(argv: Optional[List[str]] = None) -> argparse.Namespace:
+    parser = build_parser()
+    args, unknown = parser.parse_known_args(argv)
+    if args.command == "serve":
+        args.server_args = unknown
+    elif unknown:
+        parser.error(f"unrecognized arguments: {' '.join(unknown)}")
+    if args.command == "ask" and args.shards and args.hybrid:
+        # BM25 строится по одной версии индекса, а не по шардам.
+        parser.error("--hybrid нельзя использовать вместе с --shards")
+    return args
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    args = parse_args(argv)
+    # QA_METRICS=json печатает длительность каждого этапа строкой JSON в stderr.
+    metrics.enable_from_env()
+    return args.handler(args)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
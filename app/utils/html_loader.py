@@ -1,17 +1,17 @@
 import os
 from pathlib import Path
-from typing import List
+from typing import Iterator, List, Optional
 
-def get_file_contents_from_folder(folder_path: str) -> List[str]:
+def iter_files_in_folder(folder_path: str) -> Iterator[Path]:
     """
-    Считывает содержимое файлов из указанной папки в список строк.
+    Лениво перечисляет файлы в указанной папке в детерминированном порядке.
 
     Args:
         folder_path: Строка с путем к папке.
 
-    Returns:
-        Список, где каждый элемент - это текстовое содержимое одного файла.
-        
+    Yields:
+        Пути к файлам (поддиректории пропускаются), отсортированные по имени.
+
     Raises:
         FileNotFoundError: Если указанный путь не существует или не является папкой.
     """
@@ -22,19 +22,45 @@ def get_file_contents_from_folder(folder_path: str) -> List[str]:
     if not path.is_dir():
         raise FileNotFoundError(f"Путь '{folder_path}' не существует или не является папкой.")
 
-    file_contents = []
-    # Итерируемся по всем элементам в директории
-    for entry in path.iterdir():
+    # Сортировка делает порядок файлов (и, как следствие, чанков) воспроизводимым
+    for entry in sorted(path.iterdir()):
         # Убеждаемся, что это файл, а не поддиректория
         if entry.is_file():
-            try:
-                # Читаем содержимое файла с явным указанием кодировки UTF-8
-                # и добавляем его в список
-                content = entry.read_text(encoding='utf-8')
-                file_contents.append(content)
-            except (IOError, UnicodeDecodeError) as e:
-                # Обрабатываем возможные ошибки чтения или декодирования
-                # (например, для бинарных файлов или файлов с другой кодировкой)
-                print(f"Предупреждение: Не удалось прочитать файл '{entry.name}': {e}")
+            yield entry
+
+def read_file_content(file_path: Path) -> Optional[str]:
+    """
+    Читает текстовый файл в UTF-8.
+
+    Returns:
+        Содержимое файла или None, если файл не удалось прочитать.
+    """
+    try:
+        # Читаем содержимое файла с явным указанием кодировки UTF-8
+        return file_path.read_text(encoding='utf-8')
+    except (IOError, UnicodeDecodeError) as e:
+        # Обрабатываем возможные ошибки чтения или декодирования
+        # (например, для бинарных файлов или файлов с другой кодировкой)
+        print(f"Предупреждение: Не удалось прочитать файл '{file_path.name}': {e}")
+        return None
+
+def get_file_contents_from_folder(folder_path: str) -> List[str]:
+    """
+    Считывает содержимое файлов из указанной папки в список строк.
+
+    Args:
+        folder_path: Строка с путем к папке.
+
+    Returns:
+        Список, где каждый элемент - это текстовое содержимое одного файла.
+        
+    Raises:
+        FileNotFoundError: Если указанный путь не существует или не является папкой.
+    """
+    file_contents = []
+    for entry in iter_files_in_folder(folder_path):
+        content = read_file_content(entry)
+        if content is not None:
+            file_contents.append(content)
                 
-    return file_contents
\ No newline at end of file
+    return file_contents
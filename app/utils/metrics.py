@@ -0,0 +1,294 @@
+import contextvars
+import json
+import os
+import sys
+import threading
+import time
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional, TextIO, Tuple
+
+# Границы гистограмм длительностей, в секундах.
+DEFAULT_BUCKETS = (0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+METRICS_ENV_VAR = "QA_METRICS"
+
+LabelKey = Tuple[Tuple[str, str], ...]
+
+
+def _label_key(labels: Dict[str, object]) -> LabelKey:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
+
+
+def _escape_label(value: str) -> str:
+    return value.replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+@dataclass
+class SpanRecord:
+    """
+    Завершенный интервал: имя этапа, метки, длительность и родительский интервал.
+    """
+    name: str
+    labels: Dict[str, str]
+    start: float
+    duration: float
+    parent: Optional[str] = None
+    error: Optional[str] = None
+
+
+@dataclass
+class _Timer:
+    count: int = 0
+    total: float = 0.0
+    max: float = 0.0
+    buckets: List[int] = field(default_factory=lambda: [0] * len(DEFAULT_BUCKETS))
+
+
+class MetricsRegistry:
+    """
+    Потокобезопасное хранилище счетчиков и гистограмм длительностей.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.counters: Dict[Tuple[str, LabelKey], float] = {}
+        self.timers: Dict[Tuple[str, LabelKey], _Timer] = {}
+
+    def inc(self, name: str, value: float, labels: Dict[str, object]) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            self.counters[key] = self.counters.get(key, 0.0) + value
+
+    def observe(self, name: str, seconds: float, labels: Dict[str, object]) -> None:
+        key = (name, _label_key(labels))
+        with self._lock:
+            timer = self.timers.get(key)
+            if timer is None:
+                timer = self.timers[key] = _Timer()
+            timer.count += 1
+            timer.total += seconds
+            timer.max = max(timer.max, seconds)
+            for i, bound in enumerate(DEFAULT_BUCKETS):
+                if seconds <= bound:
+                    timer.buckets[i] += 1
+                    break
+
+    def snapshot(self) -> dict:
+        """
+        Текущие значения в виде словаря (для JSON).
+        """
+        with self._lock:
+            return {
+                "counters": [
+                    {"name": name, "labels": dict(labels), "value": value}
+                    for (name, labels), value in sorted(self.counters.items())
+                ],
+                "timers": [
+                    {
+                        "name": name,
+                        "labels": dict(labels),
+                        "count": timer.count,
+                        "sum_seconds": timer.total,
+                        "max_seconds": timer.max,
+                    }
+                    for (name, labels), timer in sorted(self.timers.items())
+                ],
+            }
+
+    def to_prometheus(self, prefix: str = "qa_") -> str:
+        """
+        Значения в текстовом формате Prometheus: счетчики — как counter,
+        длительности — как histogram в секундах.
+        """
+        def metric_name(name: str) -> str:
+            return prefix + "".join(ch if ch.isalnum() else "_" for ch in name)
+
+        def render_labels(labels: LabelKey, extra: Tuple[Tuple[str, str], ...] = ()) -> str:
+            pairs = labels + extra
+            if not pairs:
+                return ""
+            return "{" + ",".join(f'{key}="{_escape_label(value)}"' for key, value in pairs) + "}"
+
+        lines: List[str] = []
+        with self._lock:
+            declared = set()
+            for (name, labels), value in sorted(self.counters.items()):
+                metric = metric_name(name) + "_total"
+                if metric not in declared:
+                    lines.append(f"# TYPE {metric} counter")
+                    declared.add(metric)
+                lines.append(f"{metric}{render_labels(labels)} {value}")
+            for (name, labels), timer in sorted(self.timers.items()):
+                metric = metric_name(name) + "_seconds"
+                if metric not in declared:
+                    lines.append(f"# TYPE {metric} histogram")
+                    declared.add(metric)
+                cumulative = 0
+                for bound, count in zip(DEFAULT_BUCKETS, timer.buckets):
+                    cumulative += count
+                    lines.append(f"{metric}_bucket{render_labels(labels, (('le', str(bound)),))} {cumulative}")
+                lines.append(f"{metric}_bucket{render_labels(labels, (('le', '+Inf'),))} {timer.count}")
+                lines.append(f"{metric}_sum{render_labels(labels)} {timer.total}")
+                lines.append(f"{metric}_count{render_labels(labels)} {timer.count}")
+        return "\n".join(lines) + "\n"
+
+
+class SpanExporter:
+    """
+    Получатель завершенных интервалов. Реализации должны быть
+    потокобезопасными: интервалы завершаются в разных потоках и задачах.
+    """
+
+    def export(self, record: SpanRecord) -> None:
+        raise NotImplementedError
+
+
+class JsonLogExporter(SpanExporter):
+    """
+    Пишет каждый завершенный интервал строкой JSON (по умолчанию в stderr).
+    """
+
+    def __init__(self, stream: Optional[TextIO] = None):
+        self.stream = stream or sys.stderr
+        self._lock = threading.Lock()
+
+    def export(self, record: SpanRecord) -> None:
+        line = json.dumps({
+            "span": record.name,
+            "parent": record.parent,
+            "duration_ms": round(record.duration * 1000, 3),
+            "start": record.start,
+            "labels": record.labels,
+            "error": record.error,
+        }, ensure_ascii=False)
+        with self._lock:
+            self.stream.write(line + "\n")
+            self.stream.flush()
+
+
+_registry: Optional[MetricsRegistry] = None
+_exporters: Tuple[SpanExporter, ...] = ()
+_current_span: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("current_span", default=None)
+
+
+class _NoopSpan:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        return False
+
+
+_NOOP_SPAN = _NoopSpan()
+
+
+class _Span:
+    __slots__ = ("registry", "name", "labels", "started", "wall_start", "parent", "token")
+
+    def __init__(self, registry: MetricsRegistry, name: str, labels: Dict[str, object]):
+        self.registry = registry
+        self.name = name
+        self.labels = labels
+
+    def __enter__(self):
+        self.wall_start = time.time()
+        self.parent = _current_span.get()
+        self.token = _current_span.set(self.name)
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        duration = time.perf_counter() - self.started
+        try:
+            _current_span.reset(self.token)
+        except ValueError:
+            # Интервал закрыт в другом контексте (например, после yield генератора).
+            _current_span.set(self.parent)
+        labels = dict(self.labels)
+        if exc_type is not None:
+            labels["status"] = "error"
+        self.registry.observe(self.name, duration, labels)
+        if _exporters:
+            record = SpanRecord(
+                name=self.name,
+                labels={key: str(value) for key, value in labels.items()},
+                start=self.wall_start,
+                duration=duration,
+                parent=self.parent,
+                error=repr(exc) if exc is not None else None,
+            )
+            for exporter in _exporters:
+                exporter.export(record)
+        return False
+
+
+def enable(exporters: Optional[List[SpanExporter]] = None) -> MetricsRegistry:
+    """
+    Включает сбор метрик (счетчики и длительности копятся в реестре)
+    и, при необходимости, экспорт каждого интервала.
+    """
+    global _registry, _exporters
+    _registry = _registry or MetricsRegistry()
+    _exporters = tuple(exporters or ())
+    return _registry
+
+
+def disable() -> None:
+    """
+    Выключает сбор: span() и inc() снова ничего не делают.
+    """
+    global _registry, _exporters
+    _registry = None
+    _exporters = ()
+
+
+def enable_from_env() -> Optional[MetricsRegistry]:
+    """
+    Включает метрики по переменной окружения QA_METRICS: "1"/"prometheus" —
+    только реестр (например, для /metrics сервиса), "json" — еще и JSON-лог
+    интервалов в stderr. Пустое значение — метрики выключены.
+    """
+    mode = os.getenv(METRICS_ENV_VAR, "").strip().lower()
+    if not mode or mode in ("0", "false", "off"):
+        return None
+    return enable([JsonLogExporter()] if mode == "json" else None)
+
+
+def get_registry() -> Optional[MetricsRegistry]:
+    return _registry
+
+
+def span(name: str, **labels) -> object:
+    """
+    Контекстный менеджер, замеряющий длительность этапа:
+
+        with metrics.span("retrieve.search", k=4):
+            ...
+
+    Вложенные интервалы знают имя родительского (в том числе через await).
+    Когда метрики выключены, возвращается общий пустой объект, поэтому
+    инструментирование почти ничего не стоит.
+    """
+    registry = _registry
+    if registry is None:
+        return _NOOP_SPAN
+    return _Span(registry, name, labels)
+
+
+def inc(name: str, value: float = 1, **labels) -> None:
+    """
+    Увеличивает счетчик (no-op, когда метрики выключены).
+    """
+    registry = _registry
+    if registry is not None:
+        registry.inc(name, value, labels)
+
+
+def observe(name: str, seconds: float, **labels) -> None:
+    """
+    Записывает длительность, замеренную вне span() (no-op, когда метрики выключены).
+    """
+    registry = _registry
+    if registry is not None:
+        registry.observe(name, seconds, labels)
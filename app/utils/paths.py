@@ -0,0 +1,26 @@
+import re
+from urllib.parse import quote, unquote
+
+
+def model_slug(model_name: str) -> str:
+    """
+    Превращает имя модели (например, "sentence-transformers/all-MiniLM-L6-v2")
+    в безопасное имя директории.
+    """
+    return re.sub(r"[^A-Za-z0-9_.-]+", "_", model_name)
+
+
+def url_to_filename(url: str) -> str:
+    """
+    Кодирует URL в имя файла без слэшей и спецсимволов (обратимо).
+    """
+    return quote(url, safe="") + ".html"
+
+
+def filename_to_url(file_name: str) -> str:
+    """
+    Восстанавливает URL из имени файла, созданного url_to_filename.
+    """
+    if file_name.endswith(".html"):
+        file_name = file_name[:-len(".html")]
+    return unquote(file_name)
@@ -0,0 +1,80 @@
+import random
+from pathlib import Path
+from typing import Dict, List
+
+# Небольшой словарь, похожий по составу на тексты сайта: генератор
+# собирает из него предложения, поэтому корпус детерминирован по seed.
+WORDS = (
+    "магистратура программа обучение студент университет итмо искусственный интеллект "
+    "данные анализ проект курс семестр экзамен поступление абитуриент бюджет контракт "
+    "стоимость общежитие стипендия преподаватель лаборатория исследование модель "
+    "алгоритм разработка продукт карьера стажировка партнер компания диплом практика "
+    "онлайн очный формат расписание дисциплина модуль навык команда ментор портфолио"
+).split()
+BOILERPLATE = "Университет ИТМО. Все права защищены. Политика конфиденциальности. Контакты приемной комиссии."
+
+
+def _sentence(rng: random.Random, num_words: int) -> str:
+    words = [rng.choice(WORDS) for _ in range(num_words)]
+    return " ".join(words).capitalize() + "."
+
+
+def generate_page(
+    rng: random.Random,
+    page_id: int,
+    sections: int = 6,
+    paragraphs: int = 4,
+    words_per_paragraph: int = 60
+) -> str:
+    """
+    Генерирует HTML-страницу с заголовками h1-h3, абзацами и общим футером.
+    """
+    parts = [f"<html><head><title>Страница {page_id}</title></head><body>",
+             f"<h1>Программа {page_id}</h1>"]
+    for section in range(sections):
+        tag = "h2" if section % 2 == 0 else "h3"
+        parts.append(f"<{tag}>Раздел {section}: {_sentence(rng, 3)}</{tag}>")
+        for _ in range(paragraphs):
+            sentences = [_sentence(rng, 12) for _ in range(max(1, words_per_paragraph // 12))]
+            parts.append(f"<p>{' '.join(sentences)}</p>")
+    parts.append(f"<footer><p>{BOILERPLATE}</p></footer></body></html>")
+    return "\n".join(parts)
+
+
+def generate_corpus(
+    num_pages: int,
+    seed: int = 0,
+    sections: int = 6,
+    paragraphs: int = 4,
+    words_per_paragraph: int = 60
+) -> Dict[str, str]:
+    """
+    Генерирует синтетический сайт: относительный путь страницы -> HTML.
+    """
+    rng = random.Random(seed)
+    return {
+        f"program-{page_id}.html": generate_page(rng, page_id, sections, paragraphs, words_per_paragraph)
+        for page_id in range(num_pages)
+    }
+
+
+def write_corpus(corpus: Dict[str, str], root: Path) -> List[Path]:
+    """
+    Записывает страницы корпуса в директорию, которую раздает локальный сервер.
+    """
+    root = Path(root)
+    root.mkdir(parents=True, exist_ok=True)
+    paths = []
+    for name, html in corpus.items():
+        path = root / name
+        path.write_text(html, encoding="utf-8")
+        paths.append(path)
+    return paths
+
+
+def generate_queries(num_queries: int, seed: int = 1, words_per_query: int = 6) -> List[str]:
+    """
+    Генерирует вопросы из словаря корпуса (детерминированно по seed).
+    """
+    rng = random.Random(seed)
+    return [" ".join(rng.choice(WORDS) for _ in range(words_per_query)) + "?" for _ in range(num_queries)]
@@ -0,0 +1,345 @@
+"""
+Бенчмарк всего конвейера на синтетическом корпусе.
+
+Синтетический сайт раздается локальным HTTP-сервером, вместо OpenRouter
+используется локальный OpenAI-совместимый сервер с заданной задержкой.
+Замеряется пропускная способность этапов (загрузка, разбиение,
+дедупликация, эмбеддинг, сохранение/открытие индекса), recall@k и
+латентность приближенных индексов FAISS относительно точного поиска,
+латентность запросов (p50/p95/p99) и пиковый RSS. Результат пишется в JSON, который
+можно сравнить с результатом другого коммита (--baseline).
+
+Запуск:
+    python -m benchmarks.run --pages 200 --queries 50 --output bench.json
+    python -m benchmarks.run --baseline bench-main.json --output bench.json
+    python -m benchmarks.run --ann-index-types ivf hnsw sq8 ivfpq
+"""
+import argparse
+import asyncio
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+from benchmarks.corpus import generate_corpus, generate_queries, write_corpus
+from benchmarks.servers import FakeChatServer, StaticSiteServer
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+
+def percentiles(seconds: List[float]) -> Dict[str, float]:
+    """
+    Сводка латентностей в миллисекундах: mean / p50 / p95 / p99 / max.
+    """
+    if not seconds:
+        return {"count": 0}
+    ordered = sorted(value * 1000 for value in seconds)
+
+    def percentile(q: float) -> float:
+        return ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+
+    return {
+        "count": len(ordered),
+        "mean_ms": sum(ordered) / len(ordered),
+        "p50_ms": percentile(0.5),
+        "p95_ms": percentile(0.95),
+        "p99_ms": percentile(0.99),
+        "max_ms": ordered[-1],
+    }
+
+
+def peak_rss_mb() -> Dict[str, Optional[float]]:
+    """
+    Пиковый RSS процесса и его завершившихся дочерних процессов (пулы
+    разбиения и эмбеддинга), в мегабайтах. На Windows недоступен.
+    """
+    if resource is None:
+        return {"self": None, "children": None}
+    # ru_maxrss — в килобайтах на Linux и в байтах на macOS.
+    scale = 1024 * 1024 if sys.platform == "darwin" else 1024
+    return {
+        "self": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / scale,
+        "children": resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss / scale,
+    }
+
+
+def _git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def bench_crawl(site: StaticSiteServer, names: List[str], output_dir: Path, concurrency: int) -> dict:
+    from app.ingestion.crawler import crawl_and_save
+    from app.ingestion.http_fetch import FetchMetadataStore
+
+    started = time.perf_counter()
+    saved = asyncio.run(crawl_and_save(
+        [site.url(name) for name in names],
+        str(output_dir),
+        concurrency=concurrency,
+        per_host_concurrency=concurrency,
+        min_interval=0.0,
+        metadata_store=FetchMetadataStore(str(output_dir.parent / "fetch_meta.json")),
+        revalidate=lambda url: False
+    ))
+    elapsed = time.perf_counter() - started
+    total_bytes = sum(path.stat().st_size for path in saved)
+    return {
+        "pages": len(saved),
+        "seconds": elapsed,
+        "pages_per_sec": len(saved) / elapsed,
+        "mb_per_sec": total_bytes / elapsed / 1e6,
+    }
+
+
+def bench_split(output_dir: Path, workers: Optional[int], model_name: str) -> tuple:
+    from app.processing.splitter import split_html_with_headers
+
+    started = time.perf_counter()
+    documents = split_html_with_headers(str(output_dir), cache_path=None, workers=workers, tokenizer_model=model_name)
+    elapsed = time.perf_counter() - started
+    return documents, {
+        "chunks": len(documents),
+        "seconds": elapsed,
+        "chunks_per_sec": len(documents) / elapsed,
+    }
+
+
+def bench_dedup(documents: list) -> tuple:
+    from app.processing.dedup import DEFAULT_MAX_DISTANCE, deduplicate_chunks
+
+    started = time.perf_counter()
+    # С поиском почти-дублей: замеряется и стоимость SimHash.
+    unique = deduplicate_chunks(documents, max_distance=DEFAULT_MAX_DISTANCE)
+    elapsed = time.perf_counter() - started
+    return unique, {
+        "input_chunks": len(documents),
+        "kept_chunks": len(unique),
+        "seconds": elapsed,
+        "chunks_per_sec": len(documents) / elapsed if elapsed else None,
+    }
+
+
+def bench_embed(documents: list, embed_model, model_name: str, batch_size: int, workers: int) -> tuple:
+    from app.processing.embedding_engine import EmbeddingEngine
+
+    engine = EmbeddingEngine(embed_model, model_name, batch_size=batch_size, workers=workers)
+    vector_store = engine.add_documents(documents)
+    return vector_store, dict(engine.last_stats)
+
+
+def bench_index_io(vector_store, embed_model, model_name: str, index_dir: Path) -> tuple:
+    from app.processing.index_store import INDEX_FILE, load_vector_store, save_vector_store
+
+    index_path = index_dir / "bench"
+    started = time.perf_counter()
+    save_vector_store(vector_store, index_path, model_name, "bench")
+    saved = time.perf_counter()
+    loaded = load_vector_store(index_path, embed_model)
+    opened = time.perf_counter()
+    return loaded, {
+        "vectors": loaded.index.ntotal,
+        "index_bytes": (index_path / INDEX_FILE).stat().st_size,
+        "save_seconds": saved - started,
+        "load_seconds": opened - saved,
+    }
+
+
+def bench_ann(vector_store, embed_model, queries: List[str], index_types: List[str], k: int = 4) -> dict:
+    import numpy as np
+    from app.processing.ann_index import recall_latency_report
+
+    # Векторы корпуса берутся из уже построенного плоского индекса, запросы — вопросы бенчмарка.
+    vectors = vector_store.index.reconstruct_n(0, vector_store.index.ntotal)
+    query_vectors = np.asarray(embed_model.embed_documents(queries), dtype=np.float32)
+    rows = recall_latency_report(
+        vectors, {index_type: {"index_type": index_type} for index_type in index_types}, queries=query_vectors, k=k
+    )
+    return {row.pop("name"): row for row in rows}
+
+
+def bench_queries(vector_store, embed_model, queries: List[str], llm_api_base: str, concurrency: int) -> dict:
+    from app.llm.context_budget import BudgetedRetriever
+    from app.llm.qa_rag import get_qa_answer, get_qa_answers_batch, stream_qa_answer
+    from app.llm.rag_chain import create_qa_chain
+
+    # Цепочка обращается к локальному серверу вместо OpenRouter.
+    os.environ["OPENROUTER_API_KEY"] = "benchmark"
+    os.environ["OPENROUTER_BASE_URL"] = llm_api_base
+
+    retriever = BudgetedRetriever(
+        base_retriever=vector_store.as_retriever(search_kwargs={"k": 20}),
+        embeddings=embed_model,
+        vector_stores=[vector_store]
+    )
+    chain = create_qa_chain(vector_store, retriever=retriever)
+
+    # Прогрев: токенизаторы, соединения с LLM.
+    get_qa_answer(chain, queries[0])
+
+    retrieval, end_to_end, first_token = [], [], []
+    for query in queries:
+        started = time.perf_counter()
+        retriever.invoke(query)
+        retrieval.append(time.perf_counter() - started)
+
+        started = time.perf_counter()
+        get_qa_answer(chain, query)
+        end_to_end.append(time.perf_counter() - started)
+
+        answer = stream_qa_answer(chain, query)
+        for _ in answer:
+            pass
+        first_token.append(answer.time_to_first_token)
+
+    started = time.perf_counter()
+    get_qa_answers_batch(chain, queries, concurrency=concurrency)
+    batch_elapsed = time.perf_counter() - started
+
+    return {
+        "retrieval": percentiles(retrieval),
+        "end_to_end": percentiles(end_to_end),
+        "time_to_first_token": percentiles(first_token),
+        "batch": {
+            "questions": len(queries),
+            "concurrency": concurrency,
+            "seconds": batch_elapsed,
+            "questions_per_sec": len(queries) / batch_elapsed,
+        },
+    }
+
+
+def run_benchmarks(args: argparse.Namespace) -> dict:
+    """
+    Прогоняет все этапы и возвращает отчет.
+    """
+    from app.processing.embedding_cache import get_embedding_model
+    from app.utils import metrics
+
+    # Разбивка по этапам (embed.query, retrieve.search, generate, ...) из слоя метрик.
+    registry = metrics.enable() if args.metrics else None
+
+    report = {
+        "meta": {
+            "git_commit": _git_commit(),
+            "python": platform.python_version(),
+            "platform": platform.platform(),
+            "cpu_count": os.cpu_count(),
+            "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "params": {key: str(value) if isinstance(value, Path) else value
+                       for key, value in vars(args).items()},
+        },
+        "stages": {},
+        "peak_rss_mb": {},
+    }
+    stages = report["stages"]
+
+    with tempfile.TemporaryDirectory(prefix="itmo-bench-") as tmp:
+        tmp = Path(tmp)
+        corpus = generate_corpus(args.pages, seed=args.seed, sections=args.sections, paragraphs=args.paragraphs)
+        write_corpus(corpus, tmp / "site")
+        queries = generate_queries(args.queries, seed=args.seed + 1)
+
+        with StaticSiteServer(tmp / "site") as site:
+            stages["crawl"] = bench_crawl(site, list(corpus), tmp / "data", args.crawl_concurrency)
+        report["peak_rss_mb"]["crawl"] = peak_rss_mb()
+
+        documents, stages["split"] = bench_split(tmp / "data", args.split_workers, args.embedding_model)
+        report["peak_rss_mb"]["split"] = peak_rss_mb()
+
+        documents, stages["dedup"] = bench_dedup(documents)
+
+        # Без дискового кэша: замеряется сама модель, а не попадания в кэш.
+        embed_model = get_embedding_model(args.embedding_model, cache_dir=None)
+        vector_store, stages["embed"] = bench_embed(
+            documents, embed_model, args.embedding_model, args.embedding_batch_size, args.embedding_workers
+        )
+        report["peak_rss_mb"]["embed"] = peak_rss_mb()
+
+        vector_store, stages["index_io"] = bench_index_io(vector_store, embed_model, args.embedding_model, tmp / "index")
+
+        if args.ann_index_types:
+            report["ann"] = bench_ann(vector_store, embed_model, queries, args.ann_index_types)
+
+        with FakeChatServer(latency=args.llm_latency_ms / 1000, token_latency=args.llm_token_latency_ms / 1000) as llm:
+            report["query"] = bench_queries(vector_store, embed_model, queries, llm.api_base, args.query_concurrency)
+        report["peak_rss_mb"]["query"] = peak_rss_mb()
+
+    if registry is not None:
+        report["metrics"] = registry.snapshot()
+    return report
+
+
+def _flatten(report: dict, prefix: str = "") -> Dict[str, float]:
+    flat = {}
+    for key, value in report.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, dict):
+            flat.update(_flatten(value, name + "."))
+        elif isinstance(value, (int, float)) and not isinstance(value, bool):
+            flat[name] = value
+    return flat
+
+
+def compare_reports(baseline: dict, current: dict) -> List[str]:
+    """
+    Построчное сравнение числовых метрик двух отчетов (без параметров запуска).
+    """
+    old = _flatten({key: value for key, value in baseline.items() if key != "meta"})
+    new = _flatten({key: value for key, value in current.items() if key != "meta"})
+    lines = []
+    for name in sorted(old.keys() & new.keys()):
+        before, after = old[name], new[name]
+        change = f"{(after - before) / before * 100:+.1f}%" if before else "n/a"
+        lines.append(f"{name:<45} {before:>12.3f} -> {after:>12.3f}  {change}")
+    return lines
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    parser = argparse.ArgumentParser(description="Бенчмарк конвейера на синтетическом корпусе.")
+    parser.add_argument("--pages", type=int, default=200, help="Число страниц синтетического сайта.")
+    parser.add_argument("--sections", type=int, default=6, help="Разделов на странице.")
+    parser.add_argument("--paragraphs", type=int, default=4, help="Абзацев в разделе.")
+    parser.add_argument("--queries", type=int, default=50, help="Число вопросов.")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--crawl-concurrency", type=int, default=8)
+    parser.add_argument("--split-workers", type=int, default=None)
+    parser.add_argument("--embedding-model", default="all-MiniLM-L6-v2")
+    parser.add_argument("--embedding-batch-size", type=int, default=64)
+    parser.add_argument("--embedding-workers", type=int, default=1)
+    parser.add_argument("--query-concurrency", type=int, default=8)
+    parser.add_argument("--ann-index-types", nargs="*", default=["ivf", "hnsw", "sq8"],
+                        help="Типы индексов FAISS для сравнения recall@k и латентности с точным поиском.")
+    parser.add_argument("--llm-latency-ms", type=float, default=200.0, help="Задержка фейкового LLM.")
+    parser.add_argument("--llm-token-latency-ms", type=float, default=5.0, help="Задержка между токенами при стриминге.")
+    parser.add_argument("--metrics", action="store_true", help="Добавить в отчет счетчики и длительности этапов.")
+    parser.add_argument("--output", type=Path, help="Куда записать JSON-отчет.")
+    parser.add_argument("--baseline", type=Path, help="JSON-отчет другого коммита для сравнения.")
+    args = parser.parse_args(argv)
+
+    report = run_benchmarks(args)
+    text = json.dumps(report, indent=2, ensure_ascii=False)
+    if args.output:
+        args.output.write_text(text, encoding="utf-8")
+        print(f"Отчет записан в {args.output}")
+    else:
+        print(text)
+    if args.baseline:
+        print(f"\nСравнение с {args.baseline}:")
+        print("\n".join(compare_reports(json.loads(args.baseline.read_text(encoding="utf-8")), report)))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,152 @@
+import json
+import threading
+import time
+from functools import partial
+from http.server import BaseHTTPRequestHandler, SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+
+class _BackgroundServer:
+    """
+    HTTP-сервер в фоновом потоке на свободном порту 127.0.0.1.
+    Используется как контекстный менеджер.
+    """
+
+    def __init__(self, handler):
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+        self._server.daemon_threads = True
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        host, port = self._server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc_info):
+        self._server.shutdown()
+        self._server.server_close()
+        self._thread.join()
+
+
+class _QuietStaticHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+class StaticSiteServer(_BackgroundServer):
+    """
+    Раздает директорию с синтетическим сайтом. SimpleHTTPRequestHandler
+    отдает Last-Modified и отвечает 304 на If-Modified-Since, поэтому
+    условная ревалидация краулера тоже проверяется.
+    """
+
+    def __init__(self, root: Path):
+        super().__init__(partial(_QuietStaticHandler, directory=str(root)))
+
+    def url(self, name: str) -> str:
+        return f"{self.base_url}/{name}"
+
+
+class _FakeChatHandler(BaseHTTPRequestHandler):
+    latency: float = 0.0
+    token_latency: float = 0.0
+    answer: str = ""
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send_json(self, status: int, payload: dict) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_POST(self):
+        if not self.path.rstrip("/").endswith("/chat/completions"):
+            self._send_json(404, {"error": {"message": f"unknown path {self.path}"}})
+            return
+        request = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        model = request.get("model", "fake")
+        prompt_chars = sum(len(str(message.get("content", ""))) for message in request.get("messages", []))
+        time.sleep(self.latency)
+        tokens = self.answer.split(" ")
+        created = int(time.time())
+
+        if not request.get("stream"):
+            self._send_json(200, {
+                "id": "chatcmpl-bench",
+                "object": "chat.completion",
+                "created": created,
+                "model": model,
+                "choices": [{
+                    "index": 0,
+                    "message": {"role": "assistant", "content": self.answer},
+                    "finish_reason": "stop",
+                }],
+                # Грубая оценка (4 символа на токен) — для бенчмарка достаточно.
+                "usage": {
+                    "prompt_tokens": prompt_chars // 4,
+                    "completion_tokens": len(tokens),
+                    "total_tokens": prompt_chars // 4 + len(tokens),
+                },
+            })
+            return
+
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Cache-Control", "no-cache")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        for i, token in enumerate(tokens):
+            time.sleep(self.token_latency)
+            delta = {"content": token if i == 0 else " " + token}
+            if i == 0:
+                delta["role"] = "assistant"
+            self._send_event({"index": 0, "delta": delta, "finish_reason": None}, model, created)
+        self._send_event({"index": 0, "delta": {}, "finish_reason": "stop"}, model, created)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+    def _send_event(self, choice: dict, model: str, created: int) -> None:
+        chunk = {
+            "id": "chatcmpl-bench",
+            "object": "chat.completion.chunk",
+            "created": created,
+            "model": model,
+            "choices": [choice],
+        }
+        self.wfile.write(f"data: {json.dumps(chunk, ensure_ascii=False)}\n\n".encode("utf-8"))
+        self.wfile.flush()
+
+
+class FakeChatServer(_BackgroundServer):
+    """
+    Локальная замена OpenRouter: OpenAI-совместимый /v1/chat/completions
+    (обычный и потоковый ответ) с настраиваемой задержкой, чтобы замеры
+    не зависели от сети и реального LLM.
+
+    Args:
+        latency (float, optional): Задержка перед ответом, с. Defaults to 0.2.
+        token_latency (float, optional): Задержка между токенами при стриминге, с.
+        answer (str, optional): Текст ответа.
+    """
+
+    def __init__(self, latency: float = 0.2, token_latency: float = 0.005, answer: str = "Ответ " * 40):
+        handler = type("FakeChatHandler", (_FakeChatHandler,), {
+            "latency": latency,
+            "token_latency": token_latency,
+            "answer": answer.strip(),
+        })
+        super().__init__(handler)
+
+    @property
+    def api_base(self) -> str:
+        return f"{self.base_url}/v1"
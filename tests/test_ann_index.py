@@ -0,0 +1,65 @@
+import pytest
+
+faiss = pytest.importorskip("faiss")
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+
+from app.processing.ann_index import PQ_TRAINING_POINTS, build_faiss_index, recall_latency_report, set_search_params
+
+@pytest.fixture
+def vectors():
+    """
+    Фикстура: случайные векторы размерности 16.
+    """
+    return np.random.default_rng(0).standard_normal((2000, 16)).astype(np.float32)
+
+@pytest.mark.parametrize("index_type", ["flat", "ivf", "hnsw", "sqfp16", "sq8"])
+def test_build_faiss_index_finds_vector_itself(vectors, index_type):
+    """
+    Тест: индекс любого типа заполнен всеми векторами, и ближайший сосед
+    вектора корпуса — он сам.
+    """
+    index = build_faiss_index(vectors, index_type, {"nprobe": 8, "ef_search": 64})
+
+    assert index.ntotal == len(vectors)
+    _, found = index.search(vectors[:20], 1)
+    assert (found[:, 0] == np.arange(20)).mean() >= 0.9
+
+def test_set_search_params(vectors):
+    """
+    Тест: nprobe применяется к IVF, efSearch — к HNSW, а неприменимые
+    параметры игнорируются.
+    """
+    ivf = build_faiss_index(vectors, "ivf", {"nlist": 16})
+    set_search_params(ivf, nprobe=5, ef_search=100)
+    assert faiss.extract_index_ivf(ivf).nprobe == 5
+
+    hnsw = build_faiss_index(vectors, "hnsw")
+    set_search_params(hnsw, nprobe=5, ef_search=100)
+    assert hnsw.hnsw.efSearch == 100
+
+    set_search_params(build_faiss_index(vectors, "flat"), nprobe=5, ef_search=100)
+
+@pytest.mark.parametrize("index_type", ["pq", "ivfpq"])
+def test_pq_falls_back_to_flat_on_small_corpus(vectors, index_type):
+    """
+    Тест: корпуса меньше PQ_TRAINING_POINTS векторов недостаточно для
+    обучения PQ, поэтому строится точный плоский индекс.
+    """
+    assert len(vectors) < PQ_TRAINING_POINTS
+
+    index = build_faiss_index(vectors, index_type)
+
+    assert isinstance(index, faiss.IndexFlat)
+    assert index.ntotal == len(vectors)
+
+def test_recall_latency_report(vectors):
+    """
+    Тест: отчет содержит строку точного поиска с recall 1 и строки конфигураций.
+    """
+    rows = recall_latency_report(vectors, {"hnsw": {"index_type": "hnsw", "ef_search": 64}}, num_queries=20)
+
+    assert [row["name"] for row in rows] == ["flat", "hnsw"]
+    assert rows[0]["recall_at_k"] == 1.0
+    assert 0 < rows[1]["recall_at_k"] <= 1
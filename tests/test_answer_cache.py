@@ -0,0 +1,108 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from app.llm.answer_cache import AnswerCache
+
+class KeywordEmbeddings:
+    """
+    Детерминированная "модель эмбеддингов" для тестов: вектор — это
+    наличие ключевых слов в вопросе.
+    """
+    KEYWORDS = ["стоимость", "обучения", "общежитие", "магистратура", "ии"]
+
+    def __init__(self):
+        self.calls = 0
+
+    def embed_query(self, text):
+        self.calls += 1
+        words = text.lower().replace("?", "").split()
+        return [float(keyword in words) for keyword in self.KEYWORDS]
+
+@pytest.fixture
+def cache():
+    """
+    Фикстура: кэш ответов с детерминированными эмбеддингами.
+    """
+    return AnswerCache(KeywordEmbeddings(), similarity_threshold=0.99, ttl_seconds=60, max_entries=2)
+
+def test_exact_and_semantic_hits(cache):
+    """
+    Тест: точный повтор (с другим регистром) и перефразированный вопрос
+    с тем же смыслом возвращают сохраненный ответ.
+    """
+    cache.put("Стоимость обучения?", {"result": "300 000 рублей"})
+
+    assert cache.get("  стоимость   ОБУЧЕНИЯ? ")["result"] == "300 000 рублей"
+    assert cache.get("какая стоимость обучения")["result"] == "300 000 рублей"
+    assert cache.get("есть ли общежитие") is None
+
+    stats = cache.stats()
+    assert stats["exact_hits"] == 1
+    assert stats["semantic_hits"] == 1
+    assert stats["misses"] == 1
+
+def test_lru_eviction(cache):
+    """
+    Тест: при переполнении вытесняется давно не использованная запись.
+    """
+    cache.put("стоимость обучения", {"result": "1"})
+    cache.put("общежитие", {"result": "2"})
+    cache.get("стоимость обучения")
+    cache.put("магистратура ии", {"result": "3"})
+
+    assert cache.get("общежитие") is None
+    assert cache.get("стоимость обучения")["result"] == "1"
+
+def test_index_version_change_invalidates(cache):
+    """
+    Тест: смена версии индекса очищает кэш, повторная установка той же версии — нет.
+    """
+    cache.set_index_version("v1")
+    cache.put("общежитие", {"result": "да"})
+    cache.set_index_version("v1")
+    assert cache.get("общежитие") is not None
+
+    cache.set_index_version("v2")
+    assert cache.get("общежитие") is None
+
+def test_answer_of_previous_version_is_not_cached(cache):
+    """
+    Тест: ответ, найденный по старой версии индекса (запрос начался до
+    смены версии), не сохраняется в кэш новой, а запрос старой версии не
+    получает ответы новой.
+    """
+    cache.set_index_version("v1")
+    cache.set_index_version("v2")
+    cache.put("общежитие", {"result": "по старому индексу"}, index_version="v1")
+    assert cache.get("общежитие") is None
+
+    cache.put("общежитие", {"result": "да"}, index_version="v2")
+    assert cache.get("общежитие", index_version="v1") is None
+    assert cache.get("общежитие", index_version="v2")["result"] == "да"
+
+def test_ttl_expiry(monkeypatch, cache):
+    """
+    Тест: записи старше TTL не возвращаются.
+    """
+    now = [1000.0]
+    monkeypatch.setattr("app.llm.answer_cache.time.monotonic", lambda: now[0])
+    cache.put("общежитие", {"result": "да"})
+    now[0] += 61
+
+    assert cache.get("общежитие") is None
+
+def test_semantic_hits_are_off_by_default():
+    """
+    Тест: по умолчанию разные вопросы о разных программах не получают
+    чужой ответ, даже если их эмбеддинги совпадают (как у англоязычной
+    модели на русском тексте), и вопросы не эмбеддятся вовсе.
+    """
+    embed_model = KeywordEmbeddings()
+    cache = AnswerCache(embed_model)
+    cache.put("Сколько стоит обучение на программе «Искусственный интеллект»?", {"result": "599 000 рублей"})
+
+    assert cache.get("Сколько стоит обучение на программе «AI Product»?") is None
+    assert cache.get("сколько стоит обучение на программе «искусственный интеллект»?")["result"] == "599 000 рублей"
+    assert embed_model.calls == 0
@@ -0,0 +1,58 @@
+import json
+import urllib.request
+from benchmarks.corpus import generate_corpus, generate_queries, write_corpus
+from benchmarks.run import compare_reports, percentiles
+from benchmarks.servers import FakeChatServer, StaticSiteServer
+
+def test_corpus_is_deterministic():
+    """
+    Тест: один и тот же seed дает один и тот же корпус и вопросы.
+    """
+    assert generate_corpus(3, seed=7) == generate_corpus(3, seed=7)
+    assert generate_corpus(3, seed=7) != generate_corpus(3, seed=8)
+    assert generate_queries(5, seed=1) == generate_queries(5, seed=1)
+
+def test_static_site_server_serves_corpus(tmp_path):
+    """
+    Тест: локальный сервер отдает страницы синтетического сайта.
+    """
+    corpus = generate_corpus(2)
+    write_corpus(corpus, tmp_path)
+
+    with StaticSiteServer(tmp_path) as site:
+        with urllib.request.urlopen(site.url("program-1.html")) as response:
+            assert response.read().decode("utf-8") == corpus["program-1.html"]
+
+def test_fake_chat_server_speaks_openai_protocol():
+    """
+    Тест: фейковый LLM отвечает в формате chat.completions (обычном и потоковом).
+    """
+    with FakeChatServer(latency=0, token_latency=0, answer="три слова ответа") as llm:
+        def post(payload):
+            request = urllib.request.Request(
+                f"{llm.api_base}/chat/completions",
+                data=json.dumps(payload).encode("utf-8"),
+                headers={"Content-Type": "application/json"}
+            )
+            with urllib.request.urlopen(request) as response:
+                return response.read().decode("utf-8")
+
+        message = {"model": "m", "messages": [{"role": "user", "content": "Вопрос"}]}
+        body = json.loads(post(message))
+        assert body["choices"][0]["message"]["content"] == "три слова ответа"
+
+        events = [line[len("data: "):] for line in post({**message, "stream": True}).splitlines() if line]
+        assert events[-1] == "[DONE]"
+        text = "".join(json.loads(event)["choices"][0]["delta"].get("content", "") for event in events[:-1])
+        assert text == "три слова ответа"
+
+def test_percentiles_and_compare():
+    """
+    Тест: перцентили считаются в миллисекундах, сравнение показывает изменение в процентах.
+    """
+    summary = percentiles([i / 1000 for i in range(1, 101)])
+    assert summary["p50_ms"] == 51
+    assert summary["p99_ms"] == 100
+
+    lines = compare_reports({"stages": {"split": {"seconds": 2.0}}}, {"stages": {"split": {"seconds": 1.0}}})
+    assert len(lines) == 1 and lines[0].endswith("-50.0%")
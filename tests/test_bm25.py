@@ -0,0 +1,80 @@
+import pytest
+from app.processing.bm25 import BM25Index, tokenize
+
+@pytest.fixture
+def index():
+    """
+    Фикстура: небольшой BM25-индекс по описаниям программ магистратуры.
+    """
+    bm25 = BM25Index()
+    bm25.add("ai", "Программа Искусственный интеллект, направление 09.04.01, 20 бюджетных мест")
+    bm25.add("aip", "Управление ИИ-продуктами: направление 38.04.02, обучение на английском")
+    bm25.add("ds", "Наука о данных и машинное обучение в ИТМО")
+    return bm25
+
+def test_tokenize_keeps_codes_intact():
+    """
+    Тест: коды направлений с точками остаются одним токеном.
+    """
+    assert tokenize("Направление 09.04.01 (ИИ)") == ["направление", "09.04.01", "ии"]
+
+def test_exact_code_ranks_first(index):
+    """
+    Тест: запрос с кодом направления находит ровно тот документ, где он встречается.
+    """
+    results = index.search("какие экзамены на 38.04.02?", k=3)
+
+    assert results[0][0] == "aip"
+    assert len(results) == 1
+
+def test_remove_and_sync(index):
+    """
+    Тест: удаленные документы пропадают из выдачи, sync добавляет недостающие.
+    """
+    index.remove("ai")
+    assert "ai" not in index
+    assert index.search("09.04.01") == []
+
+    added, removed = index.sync({"ds": "Наука о данных", "new": "Новая программа 09.04.01"})
+
+    assert (added, removed) == (1, 1)
+    assert len(index) == 2
+    assert index.search("09.04.01")[0][0] == "new"
+    assert index.total_length == sum(index.doc_lengths.values())
+
+def test_save_and_load_roundtrip(index, tmp_path):
+    """
+    Тест: индекс, сохраненный на диск, после загрузки ранжирует так же.
+    """
+    path = tmp_path / "bm25.pkl"
+    index.save(path)
+
+    loaded = BM25Index.load(path)
+
+    assert loaded.search("машинное обучение") == index.search("машинное обучение")
+
+def test_remove_touches_only_document_terms(index):
+    """
+    Тест: удаление документа убирает его из постингов, а термины, которых
+    больше нет ни в одном документе, удаляются из словаря.
+    """
+    index.remove_many(["aip", "missing"])
+
+    assert "38.04.02" not in index.postings
+    assert "aip" not in index.doc_terms
+    assert index.postings["направление"] == {"ai": 1}
+    assert index.total_length == sum(index.doc_lengths.values())
+
+def test_load_rebuilds_term_lists_of_old_files(index, tmp_path):
+    """
+    Тест: индекс, сохраненный без списков терминов документов, после
+    загрузки поддерживает удаление.
+    """
+    path = tmp_path / "bm25.pkl"
+    del index.doc_terms
+    index.save(path)
+
+    loaded = BM25Index.load(path)
+    loaded.remove("ai")
+
+    assert loaded.search("09.04.01") == []
@@ -0,0 +1,73 @@
+import subprocess
+import sys
+import time
+from pathlib import Path
+import pytest
+from app.run import parse_args
+
+REPO_ROOT = Path(__file__).resolve().parent.parent
+HEAVY_MODULES = (
+    "langchain", "langchain_core", "langchain_community", "langchain_openai", "openai",
+    "sentence_transformers", "torch", "faiss", "playwright", "aiohttp", "tiktoken",
+)
+# С запасом на медленные CI-машины: без тяжелых зависимостей старт занимает доли секунды.
+IMPORT_BUDGET_SECONDS = 2.0
+
+def _run_python(code: str) -> subprocess.CompletedProcess:
+    return subprocess.run(
+        [sys.executable, "-c", code],
+        cwd=REPO_ROOT, capture_output=True, text=True, timeout=60
+    )
+
+def test_import_does_not_load_heavy_dependencies():
+    """
+    Тест: импорт CLI и разбор аргументов не подтягивают LangChain, torch, FAISS, Playwright и т.п.
+    """
+    result = _run_python(
+        "import sys\n"
+        "from app.run import parse_args\n"
+        "parse_args(['ask', 'вопрос'])\n"
+        f"print(sorted(m for m in {HEAVY_MODULES!r} if m in sys.modules))\n"
+    )
+
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == "[]"
+
+def test_help_fits_import_budget():
+    """
+    Тест: `python -m app.run --help` укладывается в бюджет времени старта.
+    """
+    started = time.perf_counter()
+    result = subprocess.run(
+        [sys.executable, "-m", "app.run", "--help"],
+        cwd=REPO_ROOT, capture_output=True, text=True, timeout=60
+    )
+    elapsed = time.perf_counter() - started
+
+    assert result.returncode == 0, result.stderr
+    assert "serve" in result.stdout
+    assert elapsed < IMPORT_BUDGET_SECONDS
+
+def test_serve_passes_remaining_arguments():
+    """
+    Тест: аргументы после serve передаются серверу без разбора.
+    """
+    args = parse_args(["serve", "--port", "9000", "--hybrid"])
+
+    assert args.command == "serve"
+    assert args.server_args == ["--port", "9000", "--hybrid"]
+
+def test_unknown_arguments_rejected_outside_serve():
+    """
+    Тест: лишние аргументы других подкоманд по-прежнему считаются ошибкой.
+    """
+    with pytest.raises(SystemExit):
+        parse_args(["ask", "вопрос", "--port", "9000"])
+
+def test_ask_rejects_hybrid_with_shards():
+    """
+    Тест: ask не принимает --hybrid вместе с --shards, а не игнорирует его молча.
+    """
+    with pytest.raises(SystemExit):
+        parse_args(["ask", "вопрос", "--shards", "--hybrid"])
+    assert parse_args(["ask", "вопрос", "--shards"]).shards
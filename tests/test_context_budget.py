@@ -0,0 +1,79 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+pytest.importorskip("tiktoken")
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.llm.context_budget import BudgetedRetriever, merge_adjacent_chunks
+
+def _chunk(text, part=None, source="page-1", header="Поступление"):
+    metadata = {"source": source, "Header 1": header}
+    if part is not None:
+        metadata["part"] = part
+    return Document(page_content=text, metadata=metadata)
+
+def test_adjacent_parts_are_merged_without_overlap():
+    """
+    Тест: соседние под-чанки одного раздела склеиваются, перекрытие не повторяется.
+    """
+    overlap = "вступительные испытания проводятся онлайн"
+    chunks = [
+        _chunk(f"{overlap} в июле.", part=1),
+        _chunk(f"Прием документов открыт до 20 июня, {overlap}", part=0),
+    ]
+
+    result = merge_adjacent_chunks(chunks)
+
+    assert len(result) == 1
+    assert result[0].page_content == f"Прием документов открыт до 20 июня, {overlap} в июле."
+    assert result[0].metadata["part"] == 0
+    assert result[0].metadata["part_end"] == 1
+
+def test_non_adjacent_parts_and_other_sections_stay_separate():
+    """
+    Тест: несоседние части и чанки других страниц/заголовков не склеиваются,
+    а порядок следует первому вхождению раздела.
+    """
+    chunks = [
+        _chunk("Стоимость обучения", source="page-2", header="Стоимость"),
+        _chunk("Часть первая", part=0),
+        _chunk("Часть третья", part=2),
+        _chunk("Общежитие", header="Общежитие"),
+    ]
+
+    result = merge_adjacent_chunks(chunks)
+
+    assert [document.page_content for document in result] == [
+        "Стоимость обучения", "Часть первая", "Часть третья", "Общежитие"
+    ]
+
+def test_mmr_reuses_vectors_stored_in_index():
+    """
+    Тест: при сборке контекста векторы кандидатов восстанавливаются из
+    индекса FAISS, а не эмбеддятся заново.
+    """
+    embedded = []
+
+    class RecordingEmbeddings(DeterministicFakeEmbedding):
+        def embed_documents(self, texts):
+            embedded.extend(texts)
+            return super().embed_documents(texts)
+
+    embed_model = RecordingEmbeddings(size=16)
+    vector_store = FAISS.from_texts([f"Программа {i}: стоимость обучения" for i in range(10)], embed_model)
+    retriever = BudgetedRetriever(
+        base_retriever=vector_store.as_retriever(search_kwargs={"k": 6}),
+        embeddings=embed_model,
+        vector_stores=[vector_store],
+        max_context_tokens=2000
+    )
+    embedded.clear()
+
+    documents = retriever.invoke("Сколько стоит обучение?")
+
+    assert documents
+    assert embedded == []
@@ -0,0 +1,200 @@
+import asyncio
+from types import SimpleNamespace
+import pytest
+
+httpx = pytest.importorskip("httpx")
+pytest.importorskip("playwright")
+
+from playwright.async_api import Error
+from app.ingestion import crawler
+from app.ingestion.crawler import LazyBrowserPool, PagePool
+from app.ingestion.http_fetch import FetchMetadataStore
+
+HTML = "<html><body><p>Страница программы</p></body></html>"
+
+class FakePagePool:
+    """
+    Пул "страниц" без браузера: страницы — это номера.
+    """
+    def __init__(self):
+        self.released = []
+
+    async def acquire(self):
+        return len(self.released)
+
+    async def release(self, page, broken=False):
+        self.released.append((page, broken))
+
+class FakeBrowserPool:
+    """
+    Заглушка LazyBrowserPool: отдает FakePagePool и считает запуски.
+    """
+    instances = []
+
+    def __init__(self, size):
+        self.pool = FakePagePool()
+        self.closed = 0
+        FakeBrowserPool.instances.append(self)
+
+    async def get(self):
+        return self.pool
+
+    async def close(self):
+        self.closed += 1
+
+def test_http_error_falls_back_to_browser(tmp_path, monkeypatch):
+    """
+    Тест: исключение на HTTP-пути (ошибка протокола) не пропускает
+    страницу — она скачивается браузером, а валидаторы стираются.
+    """
+    url = "https://abit.itmo.ru/program/ai"
+    store = FetchMetadataStore(str(tmp_path / "fetch_meta.json"))
+    store.update(url, etag='"old"')
+    rendered = []
+
+    async def broken_fetch_http(client, page_url, store, **kwargs):
+        raise httpx.RemoteProtocolError("сервер оборвал соединение")
+
+    async def fake_render(page, page_url, config):
+        rendered.append(page_url)
+        return HTML, SimpleNamespace(rounds=1, stop_reason="stable")
+
+    monkeypatch.setattr(crawler, "fetch_http", broken_fetch_http)
+    monkeypatch.setattr(crawler, "get_page_content_with_scroll_async", fake_render)
+    monkeypatch.setattr(crawler, "LazyBrowserPool", FakeBrowserPool)
+
+    results = asyncio.run(crawler.crawl([url], metadata_store=store, min_interval=0))
+
+    assert results == {url: HTML}
+    assert rendered == [url]
+    assert "etag" not in store.get(url)
+
+class FakeContext:
+    """
+    Контекст браузера: создает страницы и запоминает, закрыт ли он.
+    """
+    def __init__(self, browser):
+        self.browser = browser
+        self.closed = False
+
+    async def new_page(self):
+        return SimpleNamespace(context=self)
+
+    async def close(self):
+        self.closed = True
+
+class FakeBrowser:
+    """
+    Браузер без Chromium: считает созданные контексты и закрытия.
+    """
+    def __init__(self):
+        self.contexts = []
+        self.closed = 0
+
+    async def new_context(self):
+        self.contexts.append(FakeContext(self))
+        return self.contexts[-1]
+
+    async def close(self):
+        self.closed += 1
+
+def test_page_pool_bounds_concurrency():
+    """
+    Тест: одновременно используется не больше size страниц.
+    """
+    async def run():
+        pool = PagePool(FakeBrowser(), size=2)
+        await pool.start()
+        active = []
+        peak = []
+
+        async def use():
+            page = await pool.acquire()
+            active.append(page)
+            peak.append(len(active))
+            await asyncio.sleep(0.01)
+            active.remove(page)
+            await pool.release(page)
+
+        await asyncio.gather(*(use() for _ in range(6)))
+        return max(peak)
+
+    assert asyncio.run(run()) == 2
+
+def test_broken_page_is_replaced():
+    """
+    Тест: страница с ошибкой возвращается в пул новой страницей в новом
+    контексте, а старый контекст закрывается.
+    """
+    async def run():
+        browser = FakeBrowser()
+        pool = PagePool(browser, size=1)
+        await pool.start()
+        page = await pool.acquire()
+        await pool.release(page, broken=True)
+        replacement = await asyncio.wait_for(pool.acquire(), timeout=1)
+        return browser, page, replacement
+
+    browser, page, replacement = asyncio.run(run())
+
+    assert page.context.closed
+    assert replacement.context is browser.contexts[-1] and not replacement.context.closed
+
+def test_crawl_returns_page_after_render_error(tmp_path, monkeypatch):
+    """
+    Тест: ошибка Playwright при рендеринге не теряет страницу пула — она
+    возвращается как сломанная, а URL пропускается.
+    """
+    FakeBrowserPool.instances.clear()
+
+    async def failing_render(page, page_url, config):
+        raise Error("Timeout 30000ms exceeded")
+
+    monkeypatch.setattr(crawler, "get_page_content_with_scroll_async", failing_render)
+    monkeypatch.setattr(crawler, "LazyBrowserPool", FakeBrowserPool)
+    store = FetchMetadataStore(str(tmp_path / "fetch_meta.json"))
+
+    results = asyncio.run(crawler.crawl(["https://itmo.ru/a"], http_first=False, metadata_store=store, min_interval=0))
+
+    browser_pool = FakeBrowserPool.instances[-1]
+    assert results == {}
+    assert browser_pool.pool.released == [(0, True)]
+    assert browser_pool.closed == 1
+
+def test_lazy_browser_starts_and_stops_once(monkeypatch):
+    """
+    Тест: браузер запускается один раз при первой необходимости (даже при
+    одновременных запросах пула) и останавливается один раз.
+    """
+    browser = FakeBrowser()
+    launches = []
+    stops = []
+
+    async def launch(headless=True):
+        launches.append(headless)
+        return browser
+
+    async def stop():
+        stops.append(True)
+
+    playwright = SimpleNamespace(chromium=SimpleNamespace(launch=launch), stop=stop)
+
+    async def start():
+        return playwright
+
+    monkeypatch.setattr(crawler, "async_playwright", lambda: SimpleNamespace(start=start))
+
+    async def run():
+        lazy = LazyBrowserPool(size=2)
+        pools = await asyncio.gather(*(lazy.get() for _ in range(4)))
+        await lazy.close()
+        await lazy.close()
+        return pools
+
+    pools = asyncio.run(run())
+
+    assert all(pool is pools[0] for pool in pools)
+    assert launches == [True]
+    assert len(browser.contexts) == 2 and all(context.closed for context in browser.contexts)
+    assert browser.closed == 1
+    assert stops == [True]
@@ -0,0 +1,111 @@
+import pytest
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.documents import Document
+from app.processing.dedup import DEFAULT_MAX_DISTANCE, ChunkDeduplicator, deduplicate_chunks, hamming_distance, simhash
+
+@pytest.fixture
+def boilerplate_text():
+    """
+    Фикстура: шаблонный текст, который повторяется на всех страницах сайта.
+    """
+    return ("Университет ИТМО приглашает абитуриентов на дни открытых дверей "
+            "магистратуры по искусственному интеллекту и науке о данных ") * 3
+
+def test_exact_duplicates_are_removed_and_sources_merged(boilerplate_text):
+    """
+    Тест: точные дубли (с точностью до регистра и пробелов) удаляются,
+    их источники собираются дедупликатором, а метаданные канона не меняются.
+    """
+    chunks = [
+        Document(page_content=boilerplate_text, metadata={"source": "page-1"}),
+        Document(page_content="  " + boilerplate_text.upper(), metadata={"source": "page-2"}),
+    ]
+    deduplicator = ChunkDeduplicator()
+
+    result = [chunk for chunk in chunks if deduplicator.add(chunk)]
+
+    assert len(result) == 1
+    assert result[0].metadata == {"source": "page-1"}
+    assert deduplicator.sources_of(result[0]) == ["page-1", "page-2"]
+
+def test_same_text_under_different_headers_is_kept(boilerplate_text):
+    """
+    Тест: одинаковый текст под заголовками разных программ — разные чанки.
+    """
+    result = deduplicate_chunks([
+        Document(page_content=boilerplate_text, metadata={"Header 2": "Программа A", "source": "a"}),
+        Document(page_content=boilerplate_text, metadata={"Header 2": "Программа B", "source": "b"}),
+    ])
+
+    assert [chunk.metadata["Header 2"] for chunk in result] == ["Программа A", "Программа B"]
+
+def test_chunks_differing_only_in_number_are_kept(boilerplate_text):
+    """
+    Тест: даже с поиском почти-дублей чанки, отличающиеся только числом
+    (ценой, числом мест), остаются оба.
+    """
+    template = boilerplate_text + " Стоимость обучения {} рублей в год"
+    result = deduplicate_chunks([
+        Document(page_content=template.format(350000), metadata={"source": "a"}),
+        Document(page_content=template.format(390000), metadata={"source": "b"}),
+    ], max_distance=DEFAULT_MAX_DISTANCE)
+
+    assert len(result) == 2
+
+def test_near_duplicates_are_detected(boilerplate_text):
+    """
+    Тест: если поиск почти-дублей включен, почти одинаковые чанки
+    (отличаются словом) считаются дублями, а разные тексты — нет.
+    """
+    deduplicator = ChunkDeduplicator(max_distance=DEFAULT_MAX_DISTANCE)
+
+    assert deduplicator.add(Document(page_content=boilerplate_text, metadata={"source": "a"}))
+    assert not deduplicator.add(Document(page_content=boilerplate_text + " онлайн", metadata={"source": "b"}))
+    assert deduplicator.add(Document(
+        page_content="Общежития предоставляются иногородним студентам первого курса бакалавриата и магистратуры",
+        metadata={"source": "c"}
+    ))
+
+    assert deduplicator.stats["near_duplicates"] == 1
+    assert deduplicator.stats["kept_chunks"] == 2
+    assert deduplicator.stats["removed_bytes"] > 0
+
+def test_short_chunks_only_deduplicated_exactly():
+    """
+    Тест: короткие чанки не сравниваются по SimHash (слишком шумно).
+    """
+    result = deduplicate_chunks([
+        Document(page_content="Контакты приемной комиссии"),
+        Document(page_content="Контакты учебного офиса"),
+        Document(page_content="Контакты приемной комиссии"),
+    ], max_distance=DEFAULT_MAX_DISTANCE)
+
+    assert [chunk.page_content for chunk in result] == ["Контакты приемной комиссии", "Контакты учебного офиса"]
+
+def test_simhash_distance(boilerplate_text):
+    """
+    Тест: SimHash одинаковых текстов совпадает, а у близких отличается в немногих битах.
+    """
+    assert simhash(boilerplate_text) == simhash(boilerplate_text)
+    assert hamming_distance(simhash(boilerplate_text), simhash(boilerplate_text + " онлайн")) <= DEFAULT_MAX_DISTANCE
+
+def test_lookup_is_exact_for_any_threshold():
+    """
+    Тест: кандидат на расстоянии ровно max_distance находится при любом
+    пороге, а на расстоянии max_distance + 1 — нет.
+    """
+    base = 0x0123456789ABCDEF
+    for max_distance in (0, 3, 8, 12):
+        deduplicator = ChunkDeduplicator(max_distance=max_distance)
+        for table, key in enumerate(deduplicator._table_keys(base)):
+            deduplicator._tables[table].setdefault(key, []).append((base, (), "канон"))
+        # Разносим отличающиеся биты по всему SimHash, чтобы задеть разные блоки.
+        flipped = [bit * 64 // (max_distance + 1) for bit in range(max_distance + 1)]
+        near = base
+        for bit in flipped[:max_distance]:
+            near ^= 1 << bit
+
+        assert deduplicator._find_near(near) == "канон"
+        assert deduplicator._find_near(near ^ 1 << flipped[-1]) is None
@@ -0,0 +1,91 @@
+from typing import List
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+
+from langchain_core.embeddings import Embeddings
+from app.processing.embedding_cache import CachedEmbeddings
+
+class LengthEmbeddings(Embeddings):
+    """
+    "Модель" для тестов: вектор зависит от текста, вызовы считаются.
+    """
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded += len(texts)
+        return [[float(len(text)), float(sum(map(ord, text)) % 97)] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return self.embed_documents([text])[0]
+
+@pytest.fixture
+def base():
+    """
+    Фикстура: детерминированная модель эмбеддингов.
+    """
+    return LengthEmbeddings()
+
+def test_persisted_cache_is_reused(tmp_path, base):
+    """
+    Тест: после save() новый экземпляр кэша отдает векторы без обращения к модели.
+    """
+    cache = CachedEmbeddings(base, "fake", cache_dir=str(tmp_path), max_entries=4)
+    expected = cache.embed_documents(["один", "два"])
+    cache.save()
+
+    reopened = CachedEmbeddings(base, "fake", cache_dir=str(tmp_path), max_entries=4)
+
+    assert reopened.embed_documents(["один", "два"]) == expected
+    assert base.embedded == 2
+
+def test_stale_key_index_never_returns_foreign_vector(tmp_path, base):
+    """
+    Тест: если слот перезаписан после последнего save() (падение процесса или
+    другой процесс с тем же кэшем), устаревший индекс ключей дает промах,
+    а не вектор другого текста.
+    """
+    first = CachedEmbeddings(base, "fake", cache_dir=str(tmp_path), max_entries=2)
+    first.embed_documents(["альфа", "бета"])
+    first.save()
+    # Второй экземпляр вытесняет "альфа" и не сохраняет индекс ключей ("падает").
+    second = CachedEmbeddings(base, "fake", cache_dir=str(tmp_path), max_entries=2)
+    second.embed_documents(["гамма"])
+
+    third = CachedEmbeddings(base, "fake", cache_dir=str(tmp_path), max_entries=2)
+    vectors = third.lookup(["альфа", "бета"])
+
+    assert vectors[0] is None
+    assert vectors[1] == base.embed_documents(["бета"])[0]
+
+def test_save_merges_keys_of_other_processes(tmp_path, base):
+    """
+    Тест: save() одного экземпляра не теряет ключи, сохраненные другим.
+    """
+    first = CachedEmbeddings(base, "fake", cache_dir=str(tmp_path), max_entries=8)
+    second = CachedEmbeddings(base, "fake", cache_dir=str(tmp_path), max_entries=8)
+    first.embed_documents(["альфа"])
+    first.save()
+    second.embed_documents(["бета"])
+    second.save()
+
+    reopened = CachedEmbeddings(base, "fake", cache_dir=str(tmp_path), max_entries=8)
+
+    assert all(vector is not None for vector in reopened.lookup(["альфа", "бета"]))
+
+def test_embed_queries_shares_query_cache(tmp_path, base):
+    """
+    Тест: embed_queries пользуется тем же кэшем запросов, что и embed_query,
+    и не заполняет кэш документов.
+    """
+    cache = CachedEmbeddings(base, "fake", cache_dir=str(tmp_path), max_entries=8)
+    single = cache.embed_query("общежитие")
+
+    vectors = cache.embed_queries(["общежитие", "стипендия"])
+
+    assert vectors[0] == single
+    assert base.embedded == 2
+    assert cache.lookup(["общежитие", "стипендия"], kind="doc") == [None, None]
@@ -0,0 +1,62 @@
+from typing import List
+import pytest
+
+np = pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from app.processing.embedding_engine import EmbeddingEngine
+
+class RecordingEmbeddings(Embeddings):
+    """
+    "Модель" для тестов: вектор — длина текста; размеры батчей записываются.
+    """
+    def __init__(self):
+        self.batches: List[int] = []
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.batches.append(len(texts))
+        return [[float(len(text)), 1.0] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(len(text)), 1.0]
+
+def test_embed_matrix_keeps_input_order():
+    """
+    Тест: несмотря на сортировку по длине внутри батчей, строки матрицы
+    идут в порядке входных текстов, а батчи не превышают batch_size.
+    """
+    model = RecordingEmbeddings()
+    texts = ["ccc", "a", "bbbbbb", "dd", "eeeee"]
+
+    matrix = EmbeddingEngine(model, "fake", batch_size=2).embed_matrix(texts)
+
+    assert matrix[:, 0].tolist() == [len(text) for text in texts]
+    assert model.batches == [2, 2, 1]
+
+def test_add_documents_streams_batches_into_store():
+    """
+    Тест: все документы попадают в хранилище с метаданными и заданными id.
+    """
+    model = RecordingEmbeddings()
+    documents = [Document(page_content="x" * (i + 1), metadata={"n": i}) for i in range(5)]
+    progress = []
+
+    store = EmbeddingEngine(model, "fake", batch_size=2).add_documents(
+        documents, ids=[f"id{i}" for i in range(5)], on_batch=progress.append
+    )
+
+    assert store.index.ntotal == 5
+    assert store.docstore.search("id3").metadata == {"n": 3}
+    assert progress == [2, 4, 5]
+
+def test_rejects_empty_corpus_and_bad_batch_size():
+    """
+    Тест: пустой корпус без хранилища и неположительный батч — ошибки.
+    """
+    with pytest.raises(ValueError):
+        EmbeddingEngine(RecordingEmbeddings(), "fake", batch_size=0)
+    with pytest.raises(ValueError):
+        EmbeddingEngine(RecordingEmbeddings(), "fake").add_documents([])
@@ -0,0 +1,118 @@
+import asyncio
+import pytest
+
+pytest.importorskip("httpx")
+pytest.importorskip("playwright")
+pytest.importorskip("pytest_httpserver")
+
+from pytest_httpserver import HTTPServer
+from werkzeug.wrappers import Response
+from app.ingestion.crawler import crawl
+from app.ingestion.http_fetch import FetchMetadataStore, create_http_client, fetch_http, looks_js_rendered, record_validators
+
+STATIC_HTML = "<html><body><h1>Программы</h1><p>" + "Текст страницы. " * 50 + "</p></body></html>"
+SPA_HTML = '<html><body><div id="root"></div><script src="/bundle.js"></script></body></html>'
+
+def _fetch(url: str, store: FetchMetadataStore, **kwargs):
+    async def run():
+        async with create_http_client() as client:
+            return await fetch_http(client, url, store, **kwargs)
+    return asyncio.run(run())
+
+@pytest.fixture
+def store(tmp_path):
+    """
+    Фикстура: хранилище метаданных загрузки во временной папке.
+    """
+    return FetchMetadataStore(str(tmp_path / "fetch_meta.json"))
+
+def test_static_page_is_served_without_browser(httpserver: HTTPServer, store):
+    """
+    Тест: обычная HTML-страница забирается по HTTP и не требует браузера.
+    """
+    httpserver.expect_request("/static").respond_with_data(STATIC_HTML, content_type="text/html")
+
+    result = _fetch(httpserver.url_for("/static"), store)
+
+    assert result.status == 200
+    assert not result.needs_browser
+    assert "<h1>Программы</h1>" in result.html
+
+def test_conditional_request_returns_not_modified(httpserver: HTTPServer, store):
+    """
+    Тест: при повторном запросе отправляется If-None-Match, и ответ 304
+    помечает страницу как неизменившуюся.
+    """
+    def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return Response(status=304)
+        return Response(STATIC_HTML, headers={"ETag": '"v1"'}, content_type="text/html")
+
+    httpserver.expect_request("/page").respond_with_handler(handler)
+    url = httpserver.url_for("/page")
+
+    first = _fetch(url, store)
+    assert first.status == 200 and not first.not_modified
+    assert first.etag == '"v1"'
+    record_validators(store, first)
+
+    second = _fetch(url, store)
+    assert second.status == 304
+    assert second.not_modified
+    assert second.html == ""
+
+    # Без ревалидации (локальная копия потеряна) страница скачивается заново
+    third = _fetch(url, store, revalidate=False)
+    assert third.status == 200
+
+def test_js_rendered_page_escalates_to_browser(httpserver: HTTPServer, store):
+    """
+    Тест: страница-оболочка SPA требует рендеринга, и признак запоминается.
+    """
+    httpserver.expect_request("/spa").respond_with_data(SPA_HTML, content_type="text/html")
+    url = httpserver.url_for("/spa")
+
+    result = _fetch(url, store)
+
+    assert result.needs_browser
+    assert store.get(url)["needs_js"] is True
+
+def test_forced_browser_and_detection_heuristics(httpserver: HTTPServer, store):
+    """
+    Тест: force_browser отправляет в браузер даже статическую страницу;
+    эвристика не срабатывает на страницах с достаточным количеством текста.
+    """
+    httpserver.expect_request("/forced").respond_with_data(STATIC_HTML, content_type="text/html")
+
+    result = _fetch(httpserver.url_for("/forced"), store, force_browser=True)
+
+    assert result.needs_browser
+    assert not looks_js_rendered(STATIC_HTML)
+    assert looks_js_rendered(SPA_HTML)
+
+def test_validators_are_recorded_only_after_page_is_processed(httpserver: HTTPServer, store):
+    """
+    Тест: crawl запоминает ETag только после успешного on_page; если
+    обработка страницы упала, валидаторы стираются и следующий запрос
+    будет безусловным.
+    """
+    httpserver.expect_request("/page").respond_with_data(
+        STATIC_HTML, headers={"ETag": '"v1"'}, content_type="text/html"
+    )
+    url = httpserver.url_for("/page")
+
+    async def failing_on_page(page_url, html):
+        raise IOError("диск переполнен")
+
+    with pytest.raises(IOError):
+        asyncio.run(crawl([url], on_page=failing_on_page, metadata_store=store, min_interval=0))
+    assert "etag" not in store.get(url)
+
+    saved = {}
+
+    async def on_page(page_url, html):
+        saved[page_url] = html
+
+    asyncio.run(crawl([url], on_page=on_page, metadata_store=store, min_interval=0))
+    assert url in saved
+    assert store.get(url)["etag"] == '"v1"'
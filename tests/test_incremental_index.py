@@ -0,0 +1,65 @@
+from typing import List
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import Embeddings
+from app.processing.incremental_index import chunk_hash, update_incremental_index
+
+class CountingEmbeddings(Embeddings):
+    """
+    "Модель" для тестов: считает, сколько текстов было эмбеддировано.
+    """
+    def __init__(self):
+        self.embedded = 0
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        self.embedded += len(texts)
+        return [[float(len(text)), float(text.count("а"))] for text in texts]
+
+    def embed_query(self, text: str) -> List[float]:
+        return [float(len(text)), float(text.count("а"))]
+
+def _corpus(*texts):
+    return [Document(page_content=text, metadata={"source": "page"}) for text in texts]
+
+def test_chunk_hash_depends_on_text_and_metadata():
+    """
+    Тест: хэш чанка меняется и от текста, и от метаданных.
+    """
+    base = Document(page_content="текст", metadata={"source": "a"})
+
+    assert chunk_hash(base) == chunk_hash(Document(page_content="текст", metadata={"source": "a"}))
+    assert chunk_hash(base) != chunk_hash(Document(page_content="текст", metadata={"source": "b"}))
+    assert chunk_hash(base) != chunk_hash(Document(page_content="текст 2", metadata={"source": "a"}))
+
+def test_only_changed_chunks_are_embedded(tmp_path):
+    """
+    Тест: повторное обновление эмбеддит только новые чанки и удаляет исчезнувшие.
+    """
+    model = CountingEmbeddings()
+    update_incremental_index(_corpus("альфа", "бета", "гамма"), model, "fake", index_dir=str(tmp_path))
+    assert model.embedded == 3
+
+    store, stats = update_incremental_index(_corpus("альфа", "бета", "дельта"), model, "fake", index_dir=str(tmp_path))
+
+    assert stats == {"added": 1, "deleted": 1, "unchanged": 2}
+    assert model.embedded == 4
+    assert store.index.ntotal == 3
+    assert sorted(document.page_content for document in store.docstore._dict.values()) == ["альфа", "бета", "дельта"]
+
+def test_unchanged_corpus_embeds_nothing(tmp_path):
+    """
+    Тест: без изменений корпуса модель не вызывается.
+    """
+    model = CountingEmbeddings()
+    update_incremental_index(_corpus("альфа", "бета"), model, "fake", index_dir=str(tmp_path))
+
+    _, stats = update_incremental_index(_corpus("бета", "альфа"), model, "fake", index_dir=str(tmp_path))
+
+    assert stats["added"] == stats["deleted"] == 0
+    assert model.embedded == 2
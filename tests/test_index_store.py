@@ -0,0 +1,180 @@
+import os
+import time
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.processing.bm25 import BM25Index
+from app.processing.index_store import (
+    ORPHAN_MAX_AGE_SECONDS,
+    VERSIONS_DATA_DIR,
+    _build_lock,
+    content_ids,
+    corpus_fingerprint,
+    find_latest_index,
+    get_index_path,
+    index_fingerprint,
+    load_or_build_bm25,
+    load_or_build_vector_store,
+    load_vector_store,
+    prune_index_versions,
+    save_vector_store,
+)
+
+MODEL_NAME = "fake-model"
+
+class CountingEmbeddings(DeterministicFakeEmbedding):
+    """
+    Детерминированные эмбеддинги, считающие число эмбеддированных текстов.
+    """
+    embedded: int = 0
+
+    def embed_documents(self, texts):
+        self.embedded += len(texts)
+        return super().embed_documents(texts)
+
+@pytest.fixture
+def documents():
+    """
+    Фикстура: небольшой корпус чанков.
+    """
+    return [
+        Document(page_content=f"Программа {i}: описание и условия поступления", metadata={"source": f"page{i}"})
+        for i in range(5)
+    ]
+
+@pytest.fixture
+def embed_model():
+    """
+    Фикстура: модель эмбеддингов размерности 8.
+    """
+    return CountingEmbeddings(size=8)
+
+def test_roundtrip_loads_without_reembedding(tmp_path, documents, embed_model):
+    """
+    Тест: повторный запуск на том же корпусе открывает сохраненный индекс,
+    не пересчитывая эмбеддинги, и находит те же документы.
+    """
+    built = load_or_build_vector_store(documents, embed_model, MODEL_NAME, index_dir=str(tmp_path))
+    embedded = embed_model.embedded
+
+    loaded = load_or_build_vector_store(documents, embed_model, MODEL_NAME, index_dir=str(tmp_path))
+
+    assert embed_model.embedded == embedded
+    assert loaded.index.ntotal == built.index.ntotal == len(documents)
+    query = documents[2].page_content
+    assert loaded.similarity_search(query, k=1)[0].page_content == built.similarity_search(query, k=1)[0].page_content
+
+def test_changed_corpus_creates_new_version(tmp_path, documents, embed_model):
+    """
+    Тест: изменение любого документа меняет отпечаток и приводит к новой версии,
+    которая становится самой свежей.
+    """
+    load_or_build_vector_store(documents, embed_model, MODEL_NAME, index_dir=str(tmp_path))
+    changed = documents[:-1] + [Document(page_content="Новая программа", metadata={"source": "page4"})]
+
+    assert corpus_fingerprint(changed) != corpus_fingerprint(documents)
+    assert index_fingerprint(documents, "ivf") != index_fingerprint(documents)
+
+    load_or_build_vector_store(changed, embed_model, MODEL_NAME, index_dir=str(tmp_path))
+    latest = find_latest_index(str(tmp_path), MODEL_NAME)
+
+    assert latest == get_index_path(str(tmp_path), MODEL_NAME, index_fingerprint(changed))
+    assert load_vector_store(latest, embed_model).index.ntotal == len(changed)
+
+def test_resave_swaps_link_and_removes_old_data(tmp_path, documents, embed_model):
+    """
+    Тест: пересохранение версии подменяет символическую ссылку, а данные
+    прежнего содержимого удаляются.
+    """
+    vector_store = load_or_build_vector_store(documents, embed_model, MODEL_NAME, index_dir=str(tmp_path))
+    index_path = find_latest_index(str(tmp_path), MODEL_NAME)
+    old_target = index_path.resolve()
+
+    save_vector_store(vector_store, index_path, MODEL_NAME, "resaved")
+
+    assert index_path.is_symlink()
+    assert index_path.resolve() != old_target
+    assert not old_target.exists()
+    assert load_vector_store(index_path, embed_model).index.ntotal == len(documents)
+
+def test_prune_keeps_recent_versions(tmp_path, documents, embed_model):
+    """
+    Тест: после сборки остается не больше keep самых свежих версий,
+    а данные удаленных версий тоже стираются.
+    """
+    for i in range(4):
+        corpus = documents + [Document(page_content=f"Версия {i}", metadata={"source": "extra"})]
+        load_or_build_vector_store(corpus, embed_model, MODEL_NAME, index_dir=str(tmp_path), keep_versions=None)
+    latest = find_latest_index(str(tmp_path), MODEL_NAME)
+    # Время записи манифестов может совпасть: явно делаем последнюю версию самой свежей.
+    os.utime(latest / "manifest.json")
+
+    removed = prune_index_versions(str(tmp_path), MODEL_NAME, keep=2, current=latest)
+
+    model_dir = latest.parent
+    versions = [path for path in model_dir.iterdir() if not path.name.startswith(".")]
+    assert len(removed) == 2
+    assert len(versions) == 2
+    assert latest in versions
+    assert len(list((model_dir / VERSIONS_DATA_DIR).iterdir())) == 2
+
+def test_content_ids_are_stable_and_unique(documents):
+    """
+    Тест: id чанков зависят только от содержимого, а повторы получают суффикс.
+    """
+    ids = content_ids(documents + [documents[0]])
+
+    assert ids[:-1] == content_ids(documents)
+    assert len(set(ids)) == len(ids)
+
+def test_bm25_carries_over_to_new_version(tmp_path, documents, embed_model, monkeypatch):
+    """
+    Тест: BM25 новой версии индекса строится из BM25 предыдущей, и
+    индексируются только изменившиеся чанки.
+    """
+    first = load_or_build_vector_store(documents, embed_model, MODEL_NAME, index_dir=str(tmp_path))
+    load_or_build_bm25(find_latest_index(str(tmp_path), MODEL_NAME), first)
+    changed = documents[:-1] + [Document(page_content="Новая программа", metadata={"source": "page4"})]
+    second = load_or_build_vector_store(changed, embed_model, MODEL_NAME, index_dir=str(tmp_path))
+    added = []
+    original_add = BM25Index.add
+
+    def counting_add(self, doc_id, text):
+        added.append(text)
+        original_add(self, doc_id, text)
+
+    monkeypatch.setattr(BM25Index, "add", counting_add)
+
+    bm25 = load_or_build_bm25(find_latest_index(str(tmp_path), MODEL_NAME), second)
+
+    assert added == ["Новая программа"]
+    assert len(bm25) == len(changed)
+    assert bm25.search("новая программа", k=1)[0][0] in second.index_to_docstore_id.values()
+
+def test_prune_keeps_data_of_running_build(tmp_path, documents, embed_model):
+    """
+    Тест: данные сборки, которая идет дольше ORPHAN_MAX_AGE_SECONDS, не
+    удаляются, пока сборка держит блокировку; после падения сборки — удаляются.
+    """
+    load_or_build_vector_store(documents, embed_model, MODEL_NAME, index_dir=str(tmp_path))
+    data_dir = find_latest_index(str(tmp_path), MODEL_NAME).parent / VERSIONS_DATA_DIR
+    building = data_dir / "long-build"
+    building.mkdir()
+    old = time.time() - ORPHAN_MAX_AGE_SECONDS - 60
+
+    with _build_lock(building):
+        os.utime(building, (old, old))
+        prune_index_versions(str(tmp_path), MODEL_NAME)
+        assert building.is_dir()
+
+    # Упавшая сборка: файл блокировки остался, но его никто не держит.
+    (building / ".building").touch()
+    os.utime(building, (old, old))
+    prune_index_versions(str(tmp_path), MODEL_NAME)
+    assert not building.exists()
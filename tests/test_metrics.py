@@ -0,0 +1,73 @@
+import asyncio
+import io
+import json
+import pytest
+from app.utils import metrics
+
+@pytest.fixture
+def enabled_metrics():
+    """
+    Фикстура: включенные метрики с JSON-логом в память; после теста выключаются.
+    """
+    stream = io.StringIO()
+    yield metrics.enable([metrics.JsonLogExporter(stream)]), stream
+    metrics.disable()
+
+def test_disabled_metrics_are_noop():
+    """
+    Тест: при выключенных метриках span и inc ничего не записывают.
+    """
+    metrics.disable()
+    with metrics.span("retrieve"):
+        metrics.inc("fetch_pages")
+    assert metrics.get_registry() is None
+
+def test_spans_nest_and_are_exported(enabled_metrics):
+    """
+    Тест: вложенный интервал знает родителя (и через await), длительности и счетчики попадают в реестр.
+    """
+    registry, stream = enabled_metrics
+
+    async def answer():
+        with metrics.span("qa.answer"):
+            await asyncio.sleep(0)
+            with metrics.span("retrieve", k=4):
+                metrics.inc("fetch_pages", 2, result="http")
+
+    asyncio.run(answer())
+
+    records = [json.loads(line) for line in stream.getvalue().splitlines()]
+    assert [(r["span"], r["parent"]) for r in records] == [("retrieve", "qa.answer"), ("qa.answer", None)]
+    assert records[0]["labels"] == {"k": "4"}
+    snapshot = registry.snapshot()
+    assert snapshot["counters"] == [{"name": "fetch_pages", "labels": {"result": "http"}, "value": 2.0}]
+    assert {timer["name"] for timer in snapshot["timers"]} == {"qa.answer", "retrieve"}
+
+def test_errors_are_labeled(enabled_metrics):
+    """
+    Тест: интервал, завершившийся исключением, помечается status=error.
+    """
+    registry, stream = enabled_metrics
+    with pytest.raises(RuntimeError):
+        with metrics.span("generate"):
+            raise RuntimeError("LLM недоступен")
+
+    record = json.loads(stream.getvalue())
+    assert record["labels"] == {"status": "error"}
+    assert "LLM недоступен" in record["error"]
+
+def test_prometheus_format(enabled_metrics):
+    """
+    Тест: экспорт в текстовом формате Prometheus (counter и histogram).
+    """
+    registry, _ = enabled_metrics
+    metrics.inc("fetch_pages", result='say "hi"')
+    metrics.observe("embed.batch", 0.02)
+
+    text = registry.to_prometheus()
+
+    assert "# TYPE qa_fetch_pages_total counter" in text
+    assert 'qa_fetch_pages_total{result="say \\"hi\\""} 1.0' in text
+    assert 'qa_embed_batch_seconds_bucket{le="0.025"} 1' in text
+    assert 'qa_embed_batch_seconds_bucket{le="0.01"} 0' in text
+    assert "qa_embed_batch_seconds_count 1" in text
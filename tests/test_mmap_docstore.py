@@ -0,0 +1,53 @@
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_core.documents import Document
+from app.processing.mmap_docstore import MmapDocstore, write_mmap_docstore
+
+@pytest.fixture
+def documents():
+    """
+    Фикстура: чанки страниц программ с метаданными.
+    """
+    return [
+        ("a", Document(page_content="Искусственный интеллект, 09.04.01", metadata={"source": "ai.html", "Header 1": "ИИ"})),
+        ("b", Document(page_content="Управление ИИ-продуктами", metadata={"source": "aip.html", "part": 1})),
+        ("c", Document(page_content="", metadata={})),
+    ]
+
+def test_roundtrip_by_id(tmp_path, documents):
+    """
+    Тест: документы читаются по id с теми же текстом и метаданными, порядок id сохраняется.
+    """
+    assert write_mmap_docstore(tmp_path, iter(documents)) == 3
+    docstore = MmapDocstore(tmp_path)
+
+    assert docstore.ids == ["a", "b", "c"]
+    assert len(docstore) == 3
+    for doc_id, document in documents:
+        assert docstore.search(doc_id) == document
+    assert docstore.search("missing") == "ID missing not found."
+
+def test_to_in_memory(tmp_path, documents):
+    """
+    Тест: изменяемая копия в памяти содержит все документы.
+    """
+    write_mmap_docstore(tmp_path, documents)
+    in_memory = MmapDocstore(tmp_path).to_in_memory()
+
+    assert isinstance(in_memory, InMemoryDocstore)
+    assert in_memory.search("b") == documents[1][1]
+
+def test_empty_docstore(tmp_path):
+    """
+    Тест: пустой docstore открывается (mmap пустого файла невозможен).
+    """
+    write_mmap_docstore(tmp_path, [])
+    docstore = MmapDocstore(tmp_path)
+
+    assert len(docstore) == 0
+    assert "a" not in docstore
@@ -0,0 +1,66 @@
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+pytest.importorskip("langchain")
+pytest.importorskip("httpx")
+pytest.importorskip("playwright")
+pytest.importorskip("pytest_httpserver")
+
+from pytest_httpserver import HTTPServer
+from werkzeug.wrappers import Response
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.ingestion.http_fetch import FetchMetadataStore
+from app.pipeline import run_streaming_pipeline
+
+PAGE_HTML = "<html><body><h1>Программы</h1><p>" + "Условия поступления на программу. " * 30 + "</p></body></html>"
+
+@pytest.fixture
+def site(httpserver: HTTPServer):
+    """
+    Фикстура: страница с ETag, отвечающая 304 на условный запрос.
+    """
+    def handler(request):
+        if request.headers.get("If-None-Match") == '"v1"':
+            return Response(status=304)
+        return Response(PAGE_HTML, headers={"ETag": '"v1"'}, content_type="text/html")
+
+    httpserver.expect_request("/page").respond_with_handler(handler)
+    return httpserver.url_for("/page")
+
+def _run(url, tmp_path, **kwargs):
+    return run_streaming_pipeline(
+        [url],
+        DeterministicFakeEmbedding(size=8),
+        "fake-model",
+        index_dir=None,
+        max_chunk_tokens=None,
+        metadata_store=FetchMetadataStore(str(tmp_path / "fetch_meta.json")),
+        min_interval=0,
+        **kwargs
+    )
+
+def test_rerun_indexes_not_modified_pages_from_local_copy(site, tmp_path):
+    """
+    Тест: при повторном запуске страница отвечает 304, но попадает в индекс
+    из локальной копии, и индекс совпадает с первым.
+    """
+    first, first_stats = _run(site, tmp_path, output_dir=str(tmp_path / "data"))
+    second, second_stats = _run(site, tmp_path, output_dir=str(tmp_path / "data"))
+
+    assert first_stats["not_modified"] == 0
+    assert second_stats["not_modified"] == 1
+    assert second.index.ntotal == first.index.ntotal > 0
+
+def test_rerun_without_output_dir_fetches_pages_again(site, tmp_path):
+    """
+    Тест: без output_dir локальной копии нет, поэтому условные запросы не
+    отправляются и каждая страница скачивается заново.
+    """
+    first, _ = _run(site, tmp_path)
+    second, stats = _run(site, tmp_path)
+
+    assert stats["not_modified"] == 0
+    assert second.index.ntotal == first.index.ntotal > 0
@@ -0,0 +1,121 @@
+import asyncio
+from types import SimpleNamespace
+from typing import List
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_openai")
+openai = pytest.importorskip("openai")
+pytest.importorskip("tiktoken")
+httpx = pytest.importorskip("httpx")
+
+from langchain_community.vectorstores import FAISS
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.llm.qa_rag import _retrieve_batch, _with_retries
+from app.llm.rag_chain import build_retriever
+from app.processing.bm25 import BM25Index
+
+class RecordingEmbeddings(DeterministicFakeEmbedding):
+    """
+    Детерминированные эмбеддинги, запоминающие каждый эмбеддированный текст.
+    """
+    texts: List[str] = []
+
+    def embed_documents(self, texts):
+        self.texts.extend(texts)
+        return super().embed_documents(texts)
+
+    def embed_query(self, text):
+        self.texts.append(text)
+        return super().embed_query(text)
+
+@pytest.fixture
+def embed_model():
+    """
+    Фикстура: модель эмбеддингов размерности 16.
+    """
+    return RecordingEmbeddings(size=16, texts=[])
+
+@pytest.fixture
+def vector_store(embed_model):
+    """
+    Фикстура: индекс FAISS по небольшому корпусу.
+    """
+    documents = [
+        Document(page_content=f"Программа {i}: стоимость обучения {100 + i} тысяч рублей", metadata={"source": f"page{i}"})
+        for i in range(10)
+    ]
+    return FAISS.from_documents(documents, embed_model)
+
+QUESTIONS = ["Сколько стоит обучение?", "Какие экзамены сдавать?", "Есть ли общежитие?"]
+
+@pytest.mark.parametrize("hybrid", [False, True])
+def test_batch_embeds_each_question_once(vector_store, embed_model, hybrid):
+    """
+    Тест: на цепочке с бюджетом контекста поверх FAISS или гибридного
+    поиска каждый вопрос эмбеддится ровно один раз, и больше ничего.
+    """
+    bm25 = None
+    if hybrid:
+        bm25 = BM25Index()
+        for doc_id in vector_store.index_to_docstore_id.values():
+            bm25.add(doc_id, vector_store.docstore.search(doc_id).page_content)
+    retriever = build_retriever(vector_store, embed_model, bm25=bm25, max_context_tokens=2000)
+    embed_model.texts.clear()
+
+    contexts = asyncio.run(_retrieve_batch(SimpleNamespace(retriever=retriever), QUESTIONS))
+
+    assert len(contexts) == len(QUESTIONS)
+    assert all(contexts)
+    # Векторы кандидатов для MMR берутся из индекса: эмбеддятся только вопросы.
+    assert sorted(embed_model.texts) == sorted(QUESTIONS)
+
+class PrefixedEmbeddings(DeterministicFakeEmbedding):
+    """
+    Асимметричная модель: запросы эмбеддятся с префиксом, как у e5/bge.
+    """
+    def embed_query(self, text):
+        return super().embed_query(f"query: {text}")
+
+def test_batch_retrieval_matches_single(vector_store):
+    """
+    Тест: пакетный поиск эмбеддит вопросы как запросы и находит те же
+    документы, что и поиск по одному вопросу.
+    """
+    embed_model = PrefixedEmbeddings(size=16)
+    store = FAISS(embed_model, vector_store.index, vector_store.docstore, vector_store.index_to_docstore_id)
+    retriever = build_retriever(store, embed_model)
+
+    contexts = asyncio.run(_retrieve_batch(SimpleNamespace(retriever=retriever), QUESTIONS))
+
+    for question, documents in zip(QUESTIONS, contexts):
+        expected = retriever.invoke(question)
+        assert [document.page_content for document in documents] == [document.page_content for document in expected]
+
+def test_only_transient_errors_are_retried():
+    """
+    Тест: ошибка соединения повторяется, а ошибка ключа (401)
+    пробрасывается сразу, без повторов.
+    """
+    request = httpx.Request("POST", "https://api.example/v1/chat/completions")
+    calls = []
+
+    async def flaky():
+        calls.append("flaky")
+        if len(calls) == 1:
+            raise openai.APIConnectionError(request=request)
+        return "ok"
+
+    async def unauthorized():
+        calls.append("unauthorized")
+        raise openai.AuthenticationError("bad key", response=httpx.Response(401, request=request), body=None)
+
+    assert asyncio.run(_with_retries(flaky, max_retries=3, base_delay=0)) == "ok"
+    with pytest.raises(openai.AuthenticationError):
+        asyncio.run(_with_retries(unauthorized, max_retries=3, base_delay=0))
+    assert calls == ["flaky", "flaky", "unauthorized"]
@@ -0,0 +1,55 @@
+from typing import List
+import pytest
+
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.documents import Document
+from langchain_core.retrievers import BaseRetriever
+from app.llm import reranker
+from app.llm.reranker import RerankingRetriever
+
+class StaticRetriever(BaseRetriever):
+    """
+    Ретривер-заглушка: всегда возвращает одни и те же кандидаты.
+    """
+    documents: List[Document]
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        return self.documents
+
+class OverlapCrossEncoder:
+    """
+    "Кросс-энкодер" для тестов: оценка — число общих с вопросом слов.
+    """
+    def __init__(self):
+        self.pairs = 0
+
+    def predict(self, pairs, batch_size=32, show_progress_bar=False):
+        self.pairs += len(pairs)
+        return [len(set(query.lower().split()) & set(text.lower().split())) for query, text in pairs]
+
+def test_rerank_keeps_top_n_and_caches_scores(monkeypatch):
+    """
+    Тест: остаются top_n лучших по оценке кросс-энкодера, повторный вопрос
+    не пересчитывает оценки.
+    """
+    model = OverlapCrossEncoder()
+    monkeypatch.setattr(reranker, "get_cross_encoder", lambda model_name: model)
+    candidates = [
+        Document(page_content="общежитие для студентов", metadata={"source": "a"}),
+        Document(page_content="стоимость обучения в магистратуре", metadata={"source": "b"}),
+        Document(page_content="стоимость обучения и скидки", metadata={"source": "c"}),
+    ]
+    retriever = RerankingRetriever(base_retriever=StaticRetriever(documents=candidates), top_n=2)
+
+    result = retriever.invoke("Стоимость обучения в магистратуре")
+
+    assert [document.metadata["source"] for document in result] == ["b", "c"]
+    assert result[0].metadata["rerank_score"] == 4.0
+    assert "rerank_score" not in candidates[1].metadata
+
+    retriever.invoke("стоимость  обучения в магистратуре")
+    assert model.pairs == 3
+    assert retriever.score_cache.stats()["hits"] == 3
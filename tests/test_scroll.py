@@ -0,0 +1,61 @@
+from app.ingestion.scroll import ScrollConfig, ScrollTracker, resolve_scroll_config
+
+def test_static_page_stops_after_stable_window():
+    """
+    Тест: на статической странице прокрутка прекращается через окно стабильности,
+    а не через фиксированное число раундов.
+    """
+    config = ScrollConfig(poll_interval_ms=100, stable_window_ms=300, min_rounds=3, max_rounds=30)
+    tracker = ScrollTracker(config, start_ms=0, initial_height=1000)
+
+    now = 0
+    stopped = False
+    while not stopped:
+        now += 100
+        stopped = tracker.observe(height=1000, in_flight=0, now_ms=now)
+
+    assert tracker.stop_reason == "stable"
+    assert tracker.rounds == 3
+
+def test_growing_page_and_network_reset_window():
+    """
+    Тест: рост высоты или незавершенные запросы сбрасывают окно стабильности.
+    """
+    config = ScrollConfig(poll_interval_ms=100, stable_window_ms=200, min_rounds=1, max_rounds=30)
+    tracker = ScrollTracker(config, start_ms=0, initial_height=1000)
+
+    assert not tracker.observe(height=2000, in_flight=0, now_ms=100)
+    assert not tracker.observe(height=2000, in_flight=2, now_ms=200)
+    assert not tracker.observe(height=2000, in_flight=0, now_ms=300)
+    assert tracker.observe(height=2000, in_flight=0, now_ms=400)
+    assert tracker.rounds == 4
+
+def test_hard_limits():
+    """
+    Тест: бесконечная лента останавливается по max_rounds или max_duration_ms.
+    """
+    by_rounds = ScrollTracker(ScrollConfig(max_rounds=5, max_duration_ms=10**6), 0, 0)
+    height = 0
+    for i in range(1, 6):
+        height += 100
+        stopped = by_rounds.observe(height=height, in_flight=0, now_ms=i * 100)
+    assert stopped and by_rounds.stop_reason == "max_rounds"
+
+    by_time = ScrollTracker(ScrollConfig(max_rounds=100, max_duration_ms=250), 0, 0)
+    assert not by_time.observe(height=100, in_flight=0, now_ms=100)
+    assert by_time.observe(height=200, in_flight=0, now_ms=300)
+    assert by_time.stop_reason == "max_duration"
+
+def test_per_url_overrides_use_longest_prefix():
+    """
+    Тест: для URL выбирается правило с самым длинным совпавшим префиксом.
+    """
+    default = ScrollConfig()
+    site = ScrollConfig(max_rounds=10)
+    feed = ScrollConfig(max_rounds=50)
+    overrides = {"https://abit.itmo.ru": site, "https://abit.itmo.ru/news": feed}
+
+    assert resolve_scroll_config("https://abit.itmo.ru/news/1", overrides, default) is feed
+    assert resolve_scroll_config("https://abit.itmo.ru/program", overrides, default) is site
+    assert resolve_scroll_config("https://example.com", overrides, default) is default
+    assert resolve_scroll_config("https://example.com", None, default) is default
@@ -0,0 +1,114 @@
+import asyncio
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+pytest.importorskip("langchain")
+pytest.importorskip("langchain_openai")
+pytest.importorskip("openai")
+pytest.importorskip("tiktoken")
+pytest.importorskip("httpx")
+pytest.importorskip("aiohttp")
+
+from aiohttp.test_utils import TestClient, TestServer
+from app.interface import server
+from app.interface.server import LoadedIndex, QAService, create_app
+
+class FakeService(QAService):
+    """
+    Сервис без модели и индекса: "загрузка" — это подмена текущей версии
+    заглушкой, которую тест выполняет вручную.
+    """
+    def __init__(self):
+        super().__init__("fake-model")
+        self.loaded = asyncio.Event()
+
+    async def start(self, index_path=None):
+        await self.loaded.wait()
+        self.embed_model = object()
+        self.current = LoadedIndex(path=None, version="v1", vector_store=None, chain="chain-v1", loaded_at=0.0)
+
+def run_with_client(check, monkeypatch):
+    """
+    Запускает приложение на тестовом сервере и выполняет проверки.
+    """
+    async def fake_answer(chain, question, cache=None, index_version=None):
+        assert index_version == chain.split("-")[-1]
+        return f"{chain}: {question}"
+
+    async def fake_batch(chain, questions, concurrency=8, cache=None, index_version=None):
+        assert index_version == chain.split("-")[-1]
+        return [f"{chain}: {question}" for question in questions]
+
+    monkeypatch.setattr(server, "aget_qa_answer", fake_answer)
+    monkeypatch.setattr(server, "aget_qa_answers_batch", fake_batch)
+
+    async def run():
+        service = FakeService()
+        async with TestClient(TestServer(create_app(service))) as client:
+            await check(service, client)
+
+    asyncio.run(run())
+
+def test_not_ready_until_warm(monkeypatch):
+    """
+    Тест: до загрузки индекса /ready и /ask отвечают 503, /health — 200.
+    """
+    async def check(service, client):
+        assert (await client.get("/health")).status == 200
+        assert (await client.get("/ready")).status == 503
+        assert (await client.post("/ask", json={"question": "Сколько мест?"})).status == 503
+
+        service.loaded.set()
+        await asyncio.sleep(0.01)
+
+        response = await client.get("/ready")
+        assert response.status == 200
+        assert (await response.json())["index_version"] == "v1"
+
+    run_with_client(check, monkeypatch)
+
+def test_ask_and_batch(monkeypatch):
+    """
+    Тест: /ask и /ask/batch возвращают ответы и версию индекса, неверный ввод — 400.
+    """
+    async def check(service, client):
+        service.loaded.set()
+        await asyncio.sleep(0.01)
+
+        response = await client.post("/ask", json={"question": "Сколько мест?"})
+        assert await response.json() == {"answer": "chain-v1: Сколько мест?", "index_version": "v1"}
+
+        response = await client.post("/ask/batch", json={"questions": ["a", "b"]})
+        assert (await response.json())["answers"] == ["chain-v1: a", "chain-v1: b"]
+
+        assert (await client.post("/ask", json={"question": ""})).status == 400
+        assert (await client.post("/ask/batch", json={"questions": "a"})).status == 400
+
+    run_with_client(check, monkeypatch)
+
+def test_reload_rejects_client_paths(monkeypatch, tmp_path):
+    """
+    Тест: /admin/reload не принимает путь к индексу от клиента, а
+    неизвестная версия дает 404, и сервис не перезагружается.
+    """
+    reloaded = []
+
+    async def check(service, client):
+        service.loaded.set()
+        await asyncio.sleep(0.01)
+        service.index_dir = str(tmp_path)
+
+        async def fake_reload(index_path=None):
+            reloaded.append(index_path)
+
+        service.reload = fake_reload
+
+        assert (await client.post("/admin/reload", json={"index_path": "/tmp/x"})).status == 400
+        assert (await client.post("/admin/reload", json={"index_version": "../../tmp/x"})).status == 404
+        assert (await client.post("/admin/reload", json={"index_version": 1})).status == 400
+        assert reloaded == []
+
+    run_with_client(check, monkeypatch)
@@ -0,0 +1,134 @@
+import pytest
+
+pytest.importorskip("faiss")
+pytest.importorskip("numpy")
+pytest.importorskip("langchain_core")
+pytest.importorskip("langchain_community")
+
+from langchain_core.documents import Document
+from langchain_core.embeddings import DeterministicFakeEmbedding
+from app.llm.sharded_retriever import merge_top_k
+from app.processing.sharding import (
+    UNKNOWN_SHARD,
+    get_shard_index_dir,
+    group_by_shard,
+    load_or_build_shards,
+    load_shards,
+    read_shards_manifest,
+    shard_key,
+)
+
+PREFIXES = ["https://abit.itmo.ru/program/master/", "https://abit.itmo.ru/program/master/ai"]
+
+def test_shard_key_by_host():
+    """
+    Тест: по умолчанию шард — хост страницы; страницы без адреса попадают в отдельный шард.
+    """
+    assert shard_key("https://abit.itmo.ru/program/master/ai") == "abit.itmo.ru"
+    assert shard_key("https://itmo.ru/ru/") == "itmo.ru"
+    assert shard_key(None) == UNKNOWN_SHARD
+
+def test_shard_key_by_longest_prefix():
+    """
+    Тест: при шардировании по префиксам выбирается самый длинный подходящий,
+    а страницы вне префиксов уходят в шард своего хоста.
+    """
+    assert shard_key("https://abit.itmo.ru/program/master/ai", "prefix", PREFIXES) == PREFIXES[1]
+    assert shard_key("https://abit.itmo.ru/program/master/ai_product", "prefix", PREFIXES) == PREFIXES[1]
+    assert shard_key("https://abit.itmo.ru/program/master/ds", "prefix", PREFIXES) == PREFIXES[0]
+    assert shard_key("https://itmo.ru/ru/", "prefix", PREFIXES) == "itmo.ru"
+
+def test_shard_key_rejects_unknown_mode():
+    """
+    Тест: неизвестный способ шардирования — ошибка.
+    """
+    with pytest.raises(ValueError):
+        shard_key("https://itmo.ru/", "path")
+
+def test_group_by_shard_keeps_order():
+    """
+    Тест: чанки раскладываются по сайтам без изменения порядка внутри шарда.
+    """
+    documents = [
+        Document(page_content="1", metadata={"source": "https://abit.itmo.ru/a"}),
+        Document(page_content="2", metadata={"source": "https://itmo.ru/b"}),
+        Document(page_content="3", metadata={"source": "https://abit.itmo.ru/c"}),
+    ]
+
+    groups = group_by_shard(documents)
+
+    assert list(groups) == ["abit.itmo.ru", "itmo.ru"]
+    assert [document.page_content for document in groups["abit.itmo.ru"]] == ["1", "3"]
+
+def test_merge_top_k_across_shards():
+    """
+    Тест: выдачи шардов сливаются в общий top-k (для L2 — меньшие расстояния,
+    для скалярного произведения — большие оценки).
+    """
+    a, b, c, d = (Document(page_content=text) for text in "abcd")
+    results = [[(a, 0.1), (b, 0.7)], [(c, 0.3), (d, 0.9)]]
+
+    assert [doc.page_content for doc, _ in merge_top_k(results, 3)] == ["a", "c", "b"]
+    assert [doc.page_content for doc, _ in merge_top_k(results, 2, higher_is_better=True)] == ["d", "b"]
+
+MODEL_NAME = "fake-model"
+BOILERPLATE = "Университет ИТМО приглашает абитуриентов на дни открытых дверей магистратуры"
+
+def _site(host, texts):
+    return [
+        Document(page_content=text, metadata={"source": f"https://{host}/page{i}"})
+        for i, text in enumerate(texts)
+    ]
+
+def _snapshot(directory):
+    return {str(path): path.lstat().st_mtime_ns for path in directory.rglob("*")}
+
+@pytest.fixture
+def embed_model():
+    """
+    Фикстура: модель эмбеддингов размерности 8.
+    """
+    return DeterministicFakeEmbedding(size=8)
+
+def test_rebuilding_one_shard_leaves_others_untouched(tmp_path, embed_model):
+    """
+    Тест: изменение страниц одного сайта (включая общий с другим сайтом
+    шаблонный текст) пересобирает только его шард; файлы другого шарда
+    не меняются, а поиск идет по всем шардам из списка.
+    """
+    index_dir = str(tmp_path)
+    other = _site("itmo.ru", [BOILERPLATE, "Общежития для иногородних студентов"])
+    abit = _site("abit.itmo.ru", [BOILERPLATE, "Стоимость обучения"])
+    load_or_build_shards(abit + other, embed_model, MODEL_NAME, index_dir)
+    before = read_shards_manifest(index_dir, MODEL_NAME)
+    other_files = _snapshot(get_shard_index_dir(index_dir, "itmo.ru"))
+
+    shards = load_or_build_shards(
+        _site("abit.itmo.ru", ["Стоимость обучения изменилась"]) + other, embed_model, MODEL_NAME, index_dir
+    )
+    after = read_shards_manifest(index_dir, MODEL_NAME)
+
+    assert after["itmo.ru"] == before["itmo.ru"]
+    assert after["abit.itmo.ru"] != before["abit.itmo.ru"]
+    assert _snapshot(get_shard_index_dir(index_dir, "itmo.ru")) == other_files
+    assert shards["itmo.ru"].index.ntotal == 2
+    assert set(shards) == set(load_shards(index_dir, embed_model, MODEL_NAME))
+
+def test_missing_shards_are_pruned(tmp_path, embed_model):
+    """
+    Тест: сайт, пропавший из корпуса, удаляется из списка шардов вместе с
+    версиями индекса; с prune_missing=False остальные шарды сохраняются.
+    """
+    index_dir = str(tmp_path)
+    abit = _site("abit.itmo.ru", ["Стоимость обучения"])
+    load_or_build_shards(abit + _site("itmo.ru", ["Общежития"]), embed_model, MODEL_NAME, index_dir)
+
+    shards = load_or_build_shards(
+        _site("itmo.ru", ["Общежития и стипендии"]), embed_model, MODEL_NAME, index_dir, prune_missing=False
+    )
+    assert set(shards) == {"abit.itmo.ru", "itmo.ru"}
+
+    shards = load_or_build_shards(abit, embed_model, MODEL_NAME, index_dir)
+    assert set(shards) == set(read_shards_manifest(index_dir, MODEL_NAME)) == {"abit.itmo.ru"}
+    model_dir = get_shard_index_dir(index_dir, "itmo.ru") / MODEL_NAME
+    assert not [path for path in model_dir.iterdir() if not path.name.startswith(".")]
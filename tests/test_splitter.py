@@ -1,6 +1,13 @@
+import inspect
+import subprocess
+import sys
+from functools import partial
 import pytest
 from langchain.docstore.document import Document
+from app.processing import splitter, token_splitter
 from app.processing.splitter import split_html_with_headers
+from app.utils.html_loader import iter_files_in_folder
+from app.utils.paths import url_to_filename
 
 @pytest.fixture
 def sample_html_data():
@@ -98,4 +105,133 @@ def test_custom_headers_parameter(sample_html_data):
     assert chunks[1].metadata == {"Title": "Главный заголовок"}
     # Проверим, что контент H2 и H3 теперь внутри чанка H1
     assert "Раздел 1: Введение" in chunks[1].page_content
-    assert "Подраздел 1.1: Детали" in chunks[1].page_content
\ No newline at end of file
+    assert "Подраздел 1.1: Детали" in chunks[1].page_content
+
+def test_split_cache_depends_on_split_params(tmp_path):
+    """
+    Тест: запись кэша разбиения действительна только для тех же параметров:
+    другие заголовки для разбиения приводят к повторному разбору файла.
+    """
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    (pages / url_to_filename("https://abit.itmo.ru/program")).write_text(
+        "<html><body><h1>Программа</h1><h2>Стоимость</h2><p>Обучение платное.</p></body></html>",
+        encoding="utf-8"
+    )
+    cache_path = str(tmp_path / "split_cache.json")
+
+    split = partial(split_html_with_headers, str(pages), cache_path=cache_path, workers=1, max_chunk_tokens=None)
+    by_h2 = split()
+    by_h1 = split(headers_to_split_on=[("h1", "Header 1")])
+
+    assert any("Header 2" in chunk.metadata for chunk in by_h2)
+    assert not any("Header 2" in chunk.metadata for chunk in by_h1)
+
+def test_splitter_does_not_import_transformers():
+    """
+    Тест: модуль разбиения импортируется без transformers; токенизатор
+    загружается, только когда нужен бюджет токенов.
+    """
+    code = "import sys, app.processing.splitter; assert 'transformers' not in sys.modules"
+    subprocess.run([sys.executable, "-c", code], check=True)
+
+@pytest.fixture
+def pages_dir(tmp_path):
+    """
+    Фикстура: папка с несколькими сохраненными страницами.
+    """
+    pages = tmp_path / "pages"
+    pages.mkdir()
+    for i in range(5):
+        (pages / url_to_filename(f"https://abit.itmo.ru/program/{i}")).write_text(
+            f"<html><body><h1>Программа {i}</h1><p>Описание {i}.</p>"
+            f"<h2>Стоимость</h2><p>{300 + i} тысяч рублей.</p></body></html>",
+            encoding="utf-8"
+        )
+    return pages
+
+def test_parallel_split_matches_serial(pages_dir):
+    """
+    Тест: разбиение в пуле процессов дает те же чанки в том же порядке, что и в одном процессе.
+    """
+    split = partial(split_html_with_headers, str(pages_dir), cache_path=None, max_chunk_tokens=None)
+
+    serial = split(workers=1)
+    parallel = split(workers=2, dispatch_chunksize=2)
+
+    assert [(chunk.page_content, chunk.metadata) for chunk in parallel] == \
+        [(chunk.page_content, chunk.metadata) for chunk in serial]
+    assert len(serial) == 10
+
+def test_dispatch_chunksize_is_passed_to_pool(pages_dir, monkeypatch):
+    """
+    Тест: файлы отправляются воркерам порциями по dispatch_chunksize.
+    """
+    chunksizes = []
+
+    class InlineExecutor:
+        """
+        Пул, выполняющий задачи в текущем процессе и запоминающий chunksize.
+        """
+        def __init__(self, max_workers):
+            self.max_workers = max_workers
+
+        def __enter__(self):
+            return self
+
+        def __exit__(self, *exc_info):
+            return False
+
+        def map(self, func, items, chunksize=1):
+            chunksizes.append(chunksize)
+            return map(func, items)
+
+    monkeypatch.setattr(splitter, "ProcessPoolExecutor", InlineExecutor)
+
+    chunks = split_html_with_headers(str(pages_dir), cache_path=None, workers=4, dispatch_chunksize=3, max_chunk_tokens=None)
+
+    assert chunksizes == [3]
+    assert len(chunks) == 10
+
+def test_files_are_listed_lazily_and_cached_files_not_read(pages_dir, tmp_path, monkeypatch):
+    """
+    Тест: файлы перечисляются генератором, а файлы из кэша разбиения не читаются.
+    """
+    assert inspect.isgenerator(iter_files_in_folder(str(pages_dir)))
+    cache_path = str(tmp_path / "split_cache.json")
+    split = partial(split_html_with_headers, str(pages_dir), cache_path=cache_path, workers=1, max_chunk_tokens=None)
+    split()
+    read = []
+    original_read = splitter.read_file_content
+
+    def counting_read(file_path):
+        read.append(file_path.name)
+        return original_read(file_path)
+
+    monkeypatch.setattr(splitter, "read_file_content", counting_read)
+    changed = sorted(pages_dir.iterdir())[0]
+    changed.write_text("<html><body><h1>Новая программа</h1><p>Текст.</p></body></html>", encoding="utf-8")
+
+    chunks = split()
+
+    assert read == [changed.name]
+    assert len(chunks) == 9
+
+def test_each_chunk_is_tokenized_once(pages_dir, monkeypatch):
+    """
+    Тест: длина чанка в токенах считается один раз и используется и для
+    решения о разбиении, и для статистики длин.
+    """
+    counted = []
+
+    def fake_count_tokens(text, model_name=token_splitter.DEFAULT_TOKENIZER_MODEL):
+        counted.append(text)
+        return len(text.split())
+
+    monkeypatch.setattr(token_splitter, "count_tokens", fake_count_tokens)
+    monkeypatch.setattr(token_splitter, "_get_token_splitter", lambda *args: None)
+
+    entry = splitter._split_file(sorted(pages_dir.iterdir())[0], max_chunk_tokens=100)
+
+    assert len(counted) == len(entry["chunks"])
+    assert entry["tokens"] == [len(content.split()) for content, _ in entry["chunks"]]